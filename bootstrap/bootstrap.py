@@ -98,11 +98,33 @@ def replace_project_name(project_dir, project_name, rename_name):
             r"ml_service/pipelines/diabetes_regression_build_train_pipeline_with_r_on_dbricks.py",  # NOQA: E501
             r"ml_service/pipelines/diabetes_regression_build_train_pipeline_with_r.py",  # NOQA: E501
             r"ml_service/pipelines/diabetes_regression_build_train_pipeline.py",  # NOQA: E501
+            r"ml_service/pipelines/run_parallel_batchscore_pipeline.py",
+            r"ml_service/util/batchscore_tuner.py",
+            r"ml_service/util/benchmark.py",
+            r"ml_service/util/canary.py",
             r"ml_service/util/create_scoring_image.py",
+            r"ml_service/util/env_variables.py",
+            r"ml_service/util/local_pipeline.py",
+            r"ml_service/util/replay_requests.py",
+            r"ml_service/util/startup_profile.py",
             r"diabetes_regression/conda_dependencies.yml",
             r"diabetes_regression/evaluate/evaluate_model.py",
             r"diabetes_regression/register/register_model.py",
-            r"diabetes_regression/training/test_train.py"]
+            r"diabetes_regression/scoring/test_score.py",
+            r"diabetes_regression/training/test_train.py",
+            r"diabetes_regression/training/test_train_cache.py",
+            r"diabetes_regression/util/test_bulk_scoring.py",
+            r"diabetes_regression/util/test_data_validation.py",
+            r"diabetes_regression/util/test_dataset_fingerprint.py",
+            r"diabetes_regression/util/test_feature_schema.py",
+            r"diabetes_regression/util/test_model_artifact.py",
+            r"diabetes_regression/util/test_model_stack.py",
+            r"diabetes_regression/util/test_output_conversion.py",
+            r"diabetes_regression/util/test_request_capture.py",
+            r"diabetes_regression/util/test_shadow_scoring.py",
+            r"diabetes_regression/util/test_prediction_cache.py",
+            r"diabetes_regression/util/test_scoring_checkpoint.py",
+            r"diabetes_regression/util/test_sharded_output.py"]
 
     for file in files:
         path = os.path.join(project_dir, os.path.normpath(file))
@@ -28,9 +28,9 @@ import os
 import sys
 import argparse
 import traceback
-import joblib
 from azureml.core import Run, Experiment, Workspace, Dataset
 from azureml.core.model import Model as AMLModel
+from util.model_artifact import verify_artifact
 
 
 def main():
@@ -106,10 +106,15 @@ def main():
         except KeyError:
             print(f"Could not find {tag} metric on parent run.")
 
-    # load the model
-    print("Loading model from " + model_path)
+    # verify the model artifact header and content hash without loading it
+    print("Verifying model artifact from " + model_path)
     model_file = os.path.join(model_path, model_name)
-    model = joblib.load(model_file)
+    try:
+        model = verify_artifact(model_file)
+        model_tags["sha256"] = model["sha256"]
+    except (OSError, ValueError) as e:
+        print(f"Invalid model artifact: {e}")
+        model = None
     parent_tags = run.parent.get_tags()
     try:
         build_id = parent_tags["BuildId"]
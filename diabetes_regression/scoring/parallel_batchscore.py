@@ -25,14 +25,28 @@ POSSIBILITY OF SUCH DAMAGE.
 """
 
 import numpy as np
+import os
 import pandas as pd
-import joblib
 import sys
 from typing import List
 from util.model_helper import get_model
+from util.feature_schema import get_validator
+from util.model_artifact import load_model
+from util.model_stack import ModelStack
+from util.output_conversion import write_columns
+from util.prediction_cache import create_cache
+from util.scoring_checkpoint import ScoringCheckpoint
+from util.sharded_output import ShardWriter, get_partition
 from azureml.core import Model
 
 model = None
+model_dtype = np.float64
+score_columns = ["score"]
+checkpoint = None
+shard_writer = None
+columns_dir = None
+cache = None
+validator = None
 
 
 def parse_args() -> List[str]:
@@ -99,6 +113,45 @@ def parse_args() -> List[str]:
     return [model_name, model_version, model_tag_name, model_tag_value]
 
 
+def parse_optional_args(names: List[str]) -> List[str]:
+    """
+    Parses optional arguments the same way as parse_args. Blank values
+    are returned as None.
+
+    :param names: Argument names, e.g. --checkpoint_dir
+
+    :returns: Value of each argument, or None
+    """
+    values = []
+    for name in names:
+        param = [
+            sys.argv[idx + 1]
+            for idx, itm in enumerate(sys.argv[:-1])
+            if itm == name
+        ]
+        values.append(
+            None if len(param) < 1 or len(param[0].strip()) == 0
+            else param[0]
+        )
+    return values
+
+
+def parse_model_list(models: str) -> List[List[str]]:
+    """
+    Parses a comma separated list of name[:version] model filters, e.g.
+    "diabetes_model:3,diabetes_model_challenger".
+
+    :returns: List of [model name, model version or None]
+    """
+    filters = []
+    for itm in (models or "").split(","):
+        if len(itm.strip()) == 0:
+            continue
+        name, _, version = itm.strip().partition(":")
+        filters.append([name, version if len(version) > 0 else None])
+    return filters
+
+
 def init():
     """
     Initializer called once per node that runs the scoring job. Parse command
@@ -115,16 +168,83 @@ def init():
             tag_name=model_filter[2],
             tag_value=model_filter[3])
 
-        # Load the model using name/version found
-        global model
-        modelpath = Model.get_model_path(
-            model_name=amlmodel.name, version=amlmodel.version)
-        model = joblib.load(modelpath)
-        print("Loaded model {}".format(model_filter[0]))
+        (additional_models, checkpoint_dir, checkpoint_id, output_layout,
+         partition_by, cache_size, cache_ttl) = parse_optional_args([
+             "--additional_models", "--checkpoint_dir", "--checkpoint_id",
+             "--output_layout", "--partition_by",
+             "--prediction_cache_size", "--prediction_cache_ttl_seconds"])
+
+        # Models scored alongside the first one, e.g. a challenger, each
+        # adding its own score column
+        amlmodels = [amlmodel] + [
+            get_model(model_name=name, model_version=version)
+            for (name, version) in parse_model_list(additional_models)]
+
+        # Load the models using name/version found, once per worker
+        global model, model_dtype, score_columns
+        models = []
+        for m in amlmodels:
+            modelpath = Model.get_model_path(
+                model_name=m.name, version=m.version)
+            models.append(load_model(modelpath))
+            print("Loaded model {}:{}".format(m.name, m.version))
+        score_columns = ["score"] + [
+            "score_{}_{}".format(m.name, m.version) for m in amlmodels[1:]]
+        model = ModelStack(models, score_columns)
+        model_dtype = model.dtype
+
+        # Match mini-batch columns to the training feature schema by name,
+        # leaving any other columns, such as ids, in the output only
+        global validator
+        validator = get_validator(
+            models[0], dtype=model_dtype, allow_extra=True)
+
+        # Resume from the partitions a previous attempt of the same job
+        # already scored with these models
+        model_id = ",".join(
+            "{}:{}".format(m.name, m.version) for m in amlmodels)
+        if checkpoint_dir is not None and checkpoint_id is not None:
+            global checkpoint
+            checkpoint = ScoringCheckpoint(
+                os.path.join(checkpoint_dir, checkpoint_id), model_id)
+            print("Checkpointing to {} ({} partitions already scored)".format(
+                checkpoint.checkpoint_dir, len(checkpoint.entries())))
+
+        # Rows repeated across the mini-batches of this worker are only
+        # predicted once
+        global cache
+        cache = create_cache(model_id, cache_size, cache_ttl)
+
+        # Each worker writes its own shards to the step output directory
+        if output_layout == "sharded":
+            from azureml_user.parallel_run import EntryScript
+
+            global shard_writer
+            partition = get_partition(
+                [k.strip() for k in (partition_by or "").split(",")
+                 if k.strip()],
+                model_id)
+            shard_writer = ShardWriter(EntryScript().output_dir, partition)
+            print("Writing shards to {}/{}".format(
+                shard_writer.output_dir, shard_writer.partition_path))
+        else:
+            from azureml_user.parallel_run import EntryScript
+
+            # append_row output has no header, the column names are written
+            # next to it for the copy step to convert the output with
+            global columns_dir
+            columns_dir = EntryScript().output_dir
     except Exception as ex:
         print("Error: {}".format(ex))
 
 
+def record_columns(scored: pd.DataFrame):
+    global columns_dir
+    if columns_dir is not None:
+        write_columns(columns_dir, scored.columns)
+        columns_dir = None
+
+
 def run(mini_batch: pd.DataFrame) -> pd.DataFrame:
     """
     The run method is called multiple times by the runtime. Each time
@@ -138,20 +258,44 @@ def run(mini_batch: pd.DataFrame) -> pd.DataFrame:
     """
 
     try:
-        result = None
-
-        for _, sample in mini_batch.iterrows():
-            # prediction
-            pred = model.predict(sample.values.reshape(1, -1))
-            result = (
-                np.array(pred) if result is None else np.vstack((result, pred))
-            )  # NOQA: E501
-
-        return (
-            []
-            if result is None
-            else mini_batch.join(pd.DataFrame(result, columns=["score"]))
+        if len(mini_batch) == 0:
+            return []
+
+        if checkpoint is not None:
+            key = checkpoint.partition_key(mini_batch)
+            if checkpoint.is_complete(key):
+                print("Partition {} already scored, skipping".format(key))
+                scored = checkpoint.load(key)
+                if shard_writer is not None:
+                    shard_writer.write(scored)
+                record_columns(scored)
+                return scored
+
+        # predict the whole mini-batch against every model at once, in the
+        # precision the models were trained in
+        if validator is not None:
+            X = validator.validate(mini_batch)
+        else:
+            X = mini_batch.to_numpy(dtype=model_dtype)
+        if cache is not None:
+            result = cache.predict(X, model.predict)
+            print(cache.stats())
+        else:
+            result = model.predict(X)
+        scored = mini_batch.join(
+            pd.DataFrame(
+                result, columns=score_columns, index=mini_batch.index)
         )
 
+        if checkpoint is not None:
+            entry = checkpoint.mark_complete(key, scored)
+            print("Partition {} scored, {} rows".format(key, entry["rows"]))
+
+        if shard_writer is not None:
+            shard_writer.write(scored)
+        record_columns(scored)
+
+        return scored
+
     except Exception as ex:
         print(ex)
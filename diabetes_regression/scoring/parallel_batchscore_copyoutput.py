@@ -24,10 +24,12 @@ ARISING IN ANY WAY OUT OF THE USE OF THE SOFTWARE CODE, EVEN IF ADVISED OF THE
 POSSIBILITY OF SUCH DAMAGE.
 """
 
-from azure.storage.blob import ContainerClient
+from azure.storage.blob import BlobBlock, ContainerClient
 from datetime import datetime, date, timezone
 import argparse
+import json
 import os
+from util.output_conversion import COLUMNS_FILE, convert_stream
 
 
 def parse_args():
@@ -37,6 +39,8 @@ def parse_args():
     parser.add_argument("--score_container", type=str, default=None)
     parser.add_argument("--scoring_datastore_key", type=str, default=None)
     parser.add_argument("--scoring_output_filename", type=str, default=None)
+    parser.add_argument("--output_layout", type=str, default="append_row")
+    parser.add_argument("--output_format", type=str, default="txt")
 
     return parser.parse_args()
 
@@ -61,20 +65,40 @@ def copy_output(args):
         .replace(".", "_")
     )  # noqa E501
     destfilenameparts = args.scoring_output_filename.split(".")
+    # A converted output takes the extension of its format
+    extension = (
+        destfilenameparts[1] if args.output_format == "txt"
+        else args.output_format
+    )
     destblobname = "{}/{}_{}.{}".format(
-        destfolder, destfilenameparts[0], filetime, destfilenameparts[1]
+        destfolder, destfilenameparts[0], filetime, extension
     )
 
     destblobclient = containerclient.get_blob_client(destblobname)
     with open(
         os.path.join(args.output_path, "parallel_run_step.txt"), "rb"
     ) as scorefile:  # noqa E501
-        destblobclient.upload_blob(scorefile, blob_type="BlockBlob")
+        if args.output_format == "txt":
+            destblobclient.upload_blob(scorefile, blob_type="BlockBlob")
+            return
+
+        # Convert while uploading, staging the converted chunks as blocks
+        with open(os.path.join(args.output_path, COLUMNS_FILE)) as f:
+            columns = json.load(f)
+        result = convert_stream(
+            scorefile, columns, args.output_format,
+            lambda block_id, data: destblobclient.stage_block(block_id, data))
+        destblobclient.commit_block_list(
+            [BlobBlock(block_id=i) for i in result["block_ids"]])
+        print("Wrote {} rows as {} to {}".format(
+            result["rows"], args.output_format, destblobname))
 
 
 if __name__ == "__main__":
     args = parse_args()
-    if (
+    if args.output_layout == "sharded":
+        print("Sharded output is already on the output datastore -- Not going to copy inferences, see the run manifest") # NOQA E501
+    elif (
         args.scoring_datastore is None
         or args.scoring_datastore.strip() == ""
         or args.score_container is None
@@ -23,46 +23,139 @@ IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
 ARISING IN ANY WAY OUT OF THE USE OF THE SOFTWARE CODE, EVEN IF ADVISED OF THE
 POSSIBILITY OF SUCH DAMAGE.
 """
+import itertools
+import json
 import numpy
-import joblib
 import os
+import time
 from azureml.core.model import Model
-from inference_schema.schema_decorators \
-    import input_schema, output_schema
-from inference_schema.parameter_types.numpy_parameter_type \
-    import NumpyParameterType
+from azureml.contrib.services.aml_request import AMLRequest, rawhttp
+from azureml.contrib.services.aml_response import AMLResponse
+from util.feature_schema import SchemaError, get_validator
+from util.model_artifact import load_model
+from util.prediction_cache import create_cache
+from util.request_capture import RequestCapture
+from util.shadow_scoring import JsonlRecorder, ShadowScorer
+from util.bulk_scoring import (
+    BINARY_CONTENT_TYPE, NDJSON_CONTENT_TYPE, iter_binary_chunks,
+    iter_ndjson_chunks, score_binary, score_ndjson)
+
+# Rows scored at a time in bulk mode, which bounds the memory used by a
+# request however large its body is
+BULK_CHUNK_ROWS = int(os.getenv("BULK_CHUNK_ROWS", 10000))
+
+# Predictions of recently seen rows are reused when a cache size is set
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", 0))
+PREDICTION_CACHE_TTL_SECONDS = float(
+    os.getenv("PREDICTION_CACHE_TTL_SECONDS", 0))
+
+# JSON requests are also scored against a shadow model, given as
+# name[:version] and packaged with the primary model, in background workers.
+# Both predictions and latencies are written to SHADOW_LOG_PATH, or to the
+# traces if it is not set.
+SHADOW_MODEL = os.getenv("SHADOW_MODEL", "")
+SHADOW_QUEUE_SIZE = int(os.getenv("SHADOW_QUEUE_SIZE", 100))
+SHADOW_WORKERS = int(os.getenv("SHADOW_WORKERS", 1))
+SHADOW_LOG_PATH = os.getenv("SHADOW_LOG_PATH", "")
+
+# A sample of the JSON requests is written to the CAPTURE_DIR directory in
+# the background, for replay with ml_service/util/replay_requests.py. Bulk
+# requests are streamed and not captured.
+CAPTURE_DIR = os.getenv("CAPTURE_DIR", "")
+CAPTURE_SAMPLE_RATE = float(os.getenv("CAPTURE_SAMPLE_RATE", 1.0))
+
+cache = None
+shadow = None
+capture = None
 
 
 def init():
     # load the model from file into a global object
-    global model
+    global model, model_dtype, validator
+
+    # With a single model, AZUREML_MODEL_DIR is an environment variable
+    # created during deployment. It is the path to the model folder
+    # (./azureml-models/$MODEL_NAME/$VERSION). When a shadow model is
+    # packaged too, it is the folder of all models, and the primary model is
+    # given by SCORING_MODEL as name:version.
+    if os.getenv("SCORING_MODEL"):
+        model_name, model_version = os.getenv("SCORING_MODEL").split(":")
+        model_path = Model.get_model_path(
+            model_name, version=int(model_version))
+    else:
+        model_name, model_version = os.getenv(
+            "AZUREML_MODEL_DIR").split('/')[-2:]
+        model_path = Model.get_model_path(model_name)
+
+    model = load_model(model_path)
+
+    # Score in the precision the model was trained in, so a float32 model
+    # is not handed float64 inputs
+    model_dtype = getattr(model, "coef_", numpy.empty(0)).dtype
+
+    # Validate inputs against the feature schema captured at training, if
+    # the model was saved with one
+    validator = get_validator(model)
+
+    global cache
+    cache = create_cache(
+        "{}:{}".format(model_name, model_version),
+        PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL_SECONDS)
+
+    if SHADOW_MODEL:
+        init_shadow("{}:{}".format(model_name, model_version))
+
+    if CAPTURE_DIR:
+        global capture
+        capture = RequestCapture(CAPTURE_DIR, CAPTURE_SAMPLE_RATE)
+        print("Capturing {:.0%} of requests to {}".format(
+            CAPTURE_SAMPLE_RATE, capture.path))
+
+
+def init_shadow(primary_id: str):
+    global shadow
+    shadow_name, _, shadow_version = SHADOW_MODEL.partition(":")
+    shadow_model = load_model(Model.get_model_path(
+        shadow_name,
+        version=int(shadow_version) if shadow_version else None))
+    shadow_dtype = getattr(shadow_model, "coef_", numpy.empty(0)).dtype
+    shadow_validator = get_validator(shadow_model)
 
-    # we assume that we have just one model
-    # AZUREML_MODEL_DIR is an environment variable created during deployment.
-    # It is the path to the model folder
-    # (./azureml-models/$MODEL_NAME/$VERSION)
-    model_path = Model.get_model_path(
-        os.getenv("AZUREML_MODEL_DIR").split('/')[-2])
+    # Validated against the schema of the shadow model, which may differ
+    # from the primary one, on the worker threads
+    def shadow_predict(data):
+        if shadow_validator is not None:
+            X = shadow_validator.validate(data)
+        else:
+            X = numpy.asarray(data, dtype=shadow_dtype)
+        return shadow_model.predict(X)
 
-    model = joblib.load(model_path)
+    models = {"primary_model": primary_id, "shadow_model": SHADOW_MODEL}
+    if SHADOW_LOG_PATH:
+        recorder = JsonlRecorder(SHADOW_LOG_PATH)
 
+        def record(r):
+            recorder(dict(r, **models))
+    else:
+        def record(r):
+            print(json.dumps(dict(r, **models, Shadow=True)))
+    shadow = ShadowScorer(
+        shadow_predict, record, max_queue=SHADOW_QUEUE_SIZE,
+        workers=SHADOW_WORKERS)
+    print("Shadow scoring against {}".format(SHADOW_MODEL))
 
-input_sample = numpy.array([
-    [1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0, 9.0, 10.0],
-    [10.0, 9.0, 8.0, 7.0, 6.0, 5.0, 4.0, 3.0, 2.0, 1.0]])
-output_sample = numpy.array([
-    5021.509689995557,
-    3693.645386402646])
 
+def predict(data):
+    if validator is not None:
+        X = validator.validate(data)
+    else:
+        X = numpy.asarray(data, dtype=model_dtype)
+    if cache is not None:
+        return cache.predict(X, model.predict)
+    return model.predict(X)
 
-# Inference_schema generates a schema for your web service
-# It then creates an OpenAPI (Swagger) specification for the web service
-# at http://<scoring_base_url>/swagger.json
-@input_schema('data', NumpyParameterType(input_sample))
-@output_schema(NumpyParameterType(output_sample))
-def run(data, request_headers):
-    result = model.predict(data)
 
+def log_request(request_headers, number_of_predictions):
     # Demonstrate how we can log custom data into the Application Insights
     # traces collection.
     # The 'X-Ms-Request-id' value is generated internally and can be used to
@@ -72,19 +165,134 @@ def run(data, request_headers):
     # and can be used to correlate the request to external systems.
     print(('{{"RequestId":"{0}", '
            '"TraceParent":"{1}", '
-           '"NumberOfPredictions":{2}}}'
+           '"NumberOfPredictions":{2}{3}}}'
            ).format(
                request_headers.get("X-Ms-Request-Id", ""),
                request_headers.get("Traceparent", ""),
-               len(result)
+               number_of_predictions,
+               worker_metrics()
     ))
 
-    return {"result": result.tolist()}
+
+def worker_metrics() -> str:
+    # Cumulative prediction cache, shadow scoring and request capture
+    # metrics of this worker, appended to the request traces
+    stats = {}
+    for component in (cache, shadow, capture):
+        if component is not None:
+            stats.update(component.stats())
+    return "".join(
+        ', "{}":{}'.format(k, v) for (k, v) in stats.items())
+
+
+def run_bulk(request: AMLRequest, content_type: str) -> AMLResponse:
+    """
+    Streams the scores of a newline-delimited JSON or packed binary body
+    back while the body is being read, BULK_CHUNK_ROWS rows at a time.
+    """
+    if content_type == NDJSON_CONTENT_TYPE:
+        chunks = iter_ndjson_chunks(
+            request.stream, BULK_CHUNK_ROWS, model_dtype)
+        score_chunks = score_ndjson
+    else:
+        n_features = request.headers.get("X-Feature-Count")
+        if n_features is None:
+            return AMLResponse(
+                "X-Feature-Count header is required for binary bulk "
+                "scoring", 400)
+        try:
+            n_features = int(n_features)
+        except ValueError:
+            n_features = 0
+        if n_features <= 0:
+            return AMLResponse(
+                "X-Feature-Count must be a positive integer", 400)
+        chunks = iter_binary_chunks(
+            request.stream, n_features, BULK_CHUNK_ROWS, model_dtype)
+
+        def score_chunks(chunks, predict):
+            return score_binary(chunks, predict, model_dtype)
+
+    # The status is sent with the first scores, so the first chunk is
+    # scored before answering: a body that cannot be read or does not fit
+    # the model, e.g. a wrong X-Feature-Count, is answered with a 400, and
+    # later errors end the stream
+    try:
+        first = next(chunks, None)
+        first_scores = None if first is None else predict(first)
+    except (ValueError, TypeError) as e:
+        # SchemaError is a ValueError
+        return AMLResponse("Invalid bulk request: {}".format(e), 400)
+    if first is not None:
+        chunks = itertools.chain([first], chunks)
+
+    def predict_chunk(X):
+        # The first chunk is not predicted twice
+        return first_scores if X is first else predict(X)
+
+    body = score_chunks(chunks, predict_chunk)
+
+    def counted(body):
+        n_chunks = 0
+        for part in body:
+            n_chunks += 1
+            yield part
+        print('{{"RequestId":"{0}", "BulkChunks":{1}{2}}}'.format(
+            request.headers.get("X-Ms-Request-Id", ""), n_chunks,
+            worker_metrics()))
+
+    return AMLResponse(
+        counted(body), 200, {"Content-Type": content_type})
+
+
+# The raw request is needed to read bulk bodies as a stream. JSON bodies
+# of the form {"data": [[...], ...]} are answered with {"result": [...]}
+# as before. The inference_schema decorators cannot describe a raw request,
+# so the OpenAPI (Swagger) specification at
+# http://<scoring_base_url>/swagger.json is served from swagger2.json in the
+# source directory instead of being generated.
+@rawhttp
+def run(request: AMLRequest) -> AMLResponse:
+    arrival = time.time()
+    if request.method != "POST":
+        return AMLResponse("Method not allowed", 405)
+
+    content_type = request.headers.get(
+        "Content-Type", "").split(";")[0].strip()
+    if content_type in (NDJSON_CONTENT_TYPE, BINARY_CONTENT_TYPE):
+        return run_bulk(request, content_type)
+
+    body = request.get_data()
+    if capture is not None:
+        capture.capture(body, request.headers, arrival)
+    try:
+        data = json.loads(body)["data"]
+    except (ValueError, KeyError, TypeError) as e:
+        return AMLResponse(
+            'Expected a JSON body of the form {{"data": [[...], ...]}}: '
+            '{}'.format(e), 400)
+    start = time.perf_counter()
+    try:
+        result = predict(data)
+    except SchemaError as e:
+        return AMLResponse(str(e), 400)
+    except (ValueError, TypeError) as e:
+        # Rows that are not numeric or not all of the same length
+        return AMLResponse("Invalid data: {}".format(e), 400)
+    if shadow is not None:
+        # Only queues the request, the response does not wait for the
+        # shadow model
+        shadow.submit(data, result, (time.perf_counter() - start) * 1000,
+                      request.headers.get("X-Ms-Request-Id", ""))
+    log_request(request.headers, len(result))
+    return AMLResponse(
+        json.dumps({"result": result.tolist()}), 200, json_str=True)
 
 
 if __name__ == "__main__":
     # Test scoring
     init()
-    test_row = '{"data":[[1,2,3,4,5,6,7,8,9,10],[10,9,8,7,6,5,4,3,2,1]]}'
-    prediction = run(test_row, {})
-    print("Test result: ", prediction)
+    test_row = [[1, 2, 3, 4, 5, 6, 7, 8, 9, 10],
+                [10, 9, 8, 7, 6, 5, 4, 3, 2, 1]]
+    prediction = predict(test_row)
+    print("Test result: ", {"result": prediction.tolist()})
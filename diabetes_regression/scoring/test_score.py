@@ -0,0 +1,177 @@
+import json
+import os
+
+import numpy as np
+import pytest
+from diabetes_regression.training.train import split_data, train_model
+from diabetes_regression.util.feature_schema import infer_schema
+from diabetes_regression.util.model_artifact import save_model
+from diabetes_regression.util.request_capture import read_trace
+from ml_service.pipelines.load_sample_data import (
+    TARGET, generate_sample_data)
+from ml_service.util.local_pipeline import load_script
+
+SCORING_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+NDJSON = {"Content-Type": "application/x-ndjson"}
+
+
+@pytest.fixture(scope="module")
+def score(tmp_path_factory):
+    df = next(generate_sample_data(1000, seed=1))
+    model_path = str(tmp_path_factory.mktemp("model") / "model.pkl")
+    save_model(train_model(split_data(df), {"alpha": 0.4}), model_path,
+               [c for c in df.columns if c != TARGET],
+               metadata={"feature_schema": infer_schema(df)})
+
+    score = load_script(
+        "score", os.path.join(SCORING_DIRECTORY, "score.py"),
+        os.path.dirname(SCORING_DIRECTORY))
+    # As score.init(), without a cache, shadow model or capture
+    score.model = score.load_model(model_path)
+    score.model_dtype = score.model.coef_.dtype
+    score.validator = score.get_validator(score.model)
+    score.X = df.drop(columns=TARGET).to_numpy()[:7]
+    return score
+
+
+def post(score, body, headers=None, method="POST"):
+    if not isinstance(body, bytes):
+        body = json.dumps(body).encode("utf-8")
+    response = score.run(score.AMLRequest(
+        body, method=method,
+        headers=headers or {"Content-Type": "application/json"}))
+    return (response.status_code, response.get_data())
+
+
+def ndjson(rows):
+    return b"".join(json.dumps(r).encode("utf-8") + b"\n" for r in rows)
+
+
+def binary(X, n_features=None):
+    return {"Content-Type": "application/octet-stream",
+            "X-Feature-Count": str(n_features or X.shape[1])}
+
+
+def test_json_request_is_scored(score):
+    (status, body) = post(score, {"data": score.X.tolist()})
+
+    assert status == 200
+    np.testing.assert_allclose(
+        json.loads(body)["result"], score.model.predict(score.X))
+
+
+def test_swagger_describes_the_json_requests(score):
+    with open(os.path.join(
+            os.path.dirname(SCORING_DIRECTORY), "swagger2.json")) as f:
+        definitions = json.load(f)["definitions"]
+    rows = definitions["ServiceInput"]["properties"]["data"]["items"]
+
+    assert rows["minItems"] == rows["maxItems"] == len(score.validator.names)
+    (status, body) = post(score, definitions["ServiceInput"]["example"])
+    assert status == 200
+    assert set(json.loads(body)) == set(
+        definitions["ServiceOutput"]["properties"])
+
+
+def test_only_post_is_allowed(score):
+    (status, _) = post(score, {"data": score.X.tolist()}, method="GET")
+
+    assert status == 405
+
+
+@pytest.mark.parametrize("body", [
+    b"not json", {"rows": [[1.0] * 10]}, [[1.0] * 10]])
+def test_malformed_json_is_a_bad_request(score, body):
+    (status, message) = post(score, body)
+
+    assert status == 400
+    assert message.startswith(b"Expected a JSON body")
+
+
+@pytest.mark.parametrize("data", [
+    [[1.0] * 3], [["a"] * 10], [[1.0] * 10, [1.0] * 9]])
+def test_data_the_model_cannot_score_is_a_bad_request(score, data):
+    (status, _) = post(score, {"data": data})
+
+    assert status == 400
+
+
+def test_ndjson_is_streamed_in_chunks(score, monkeypatch, capsys):
+    monkeypatch.setattr(score, "BULK_CHUNK_ROWS", 3)
+
+    (status, body) = post(score, ndjson(score.X.tolist()), NDJSON)
+
+    assert status == 200
+    np.testing.assert_allclose(
+        [float(v) for v in body.split()], score.model.predict(score.X))
+    assert '"BulkChunks":3' in capsys.readouterr().out
+
+
+def test_binary_is_streamed_in_chunks(score, monkeypatch):
+    monkeypatch.setattr(score, "BULK_CHUNK_ROWS", 3)
+
+    (status, body) = post(score, score.X.tobytes(), binary(score.X))
+
+    assert status == 200
+    np.testing.assert_allclose(
+        np.frombuffer(body), score.model.predict(score.X))
+
+
+@pytest.mark.parametrize("headers", [
+    {"Content-Type": "application/octet-stream"},
+    {"Content-Type": "application/octet-stream", "X-Feature-Count": "ten"},
+    {"Content-Type": "application/octet-stream", "X-Feature-Count": "0"},
+])
+def test_binary_needs_a_feature_count(score, headers):
+    (status, message) = post(score, np.ones((3, 10)).tobytes(), headers)
+
+    assert status == 400
+    assert b"X-Feature-Count" in message
+
+
+def test_first_chunk_that_does_not_fit_the_model_is_a_bad_request(score):
+    X = np.ones((3, 10))
+
+    # 30 values read as 10 rows of 3 features
+    (status, message) = post(score, X.tobytes(), binary(X, 3))
+    assert status == 400
+    assert b"Expected rows of 10 features" in message
+
+    (status, message) = post(score, ndjson([[1.0] * 3]), NDJSON)
+    assert status == 400
+    assert b"Expected rows of 10 features" in message
+
+    (status, _) = post(score, X.tobytes()[:-1], binary(X))
+    assert status == 400
+
+
+def test_later_bad_chunk_ends_the_stream(score, monkeypatch):
+    monkeypatch.setattr(score, "BULK_CHUNK_ROWS", 2)
+    rows = score.X[:4].tolist()
+    rows[3] = rows[3][:3]
+
+    (status, body) = post(score, ndjson(rows), NDJSON)
+
+    assert status == 200
+    lines = body.splitlines()
+    np.testing.assert_allclose(
+        [float(v) for v in lines[:2]], score.model.predict(score.X[:2]))
+    assert "error" in json.loads(lines[-1])
+
+
+def test_only_json_requests_are_captured(score, monkeypatch, tmp_path):
+    capture = score.RequestCapture(str(tmp_path))
+    monkeypatch.setattr(score, "capture", capture)
+    headers = {"Content-Type": "application/json", "X-Api-Version": "blue",
+               "Authorization": "Bearer key"}
+
+    post(score, {"data": score.X.tolist()}, headers)
+    post(score, ndjson(score.X.tolist()), NDJSON)
+    post(score, score.X.tobytes(), binary(score.X))
+    capture.close()
+
+    trace = read_trace(str(tmp_path))
+    assert len(trace) == 1
+    assert trace[0]["headers"] == {
+        "Content-Type": "application/json", "X-Api-Version": "blue"}
+    assert json.loads(trace[0]["body"]) == {"data": score.X.tolist()}
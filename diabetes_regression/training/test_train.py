@@ -1,5 +1,47 @@
+import tracemalloc
 import numpy as np
-from diabetes_regression.training.train import train_model, get_model_metrics
+import pandas as pd
+from sklearn.model_selection import train_test_split
+from diabetes_regression.training.train import (
+    split_data, train_model, get_model_metrics, check_precision_parity)
+
+
+def make_frame(n_rows, n_features):
+    rng = np.random.RandomState(0)
+    df = pd.DataFrame(
+        rng.rand(n_rows, n_features),
+        columns=["x{}".format(i) for i in range(n_features)])
+    df['Y'] = rng.rand(n_rows)
+    return df
+
+
+def test_split_data_matches_train_test_split():
+    df = make_frame(50, 3)
+    X_train, X_test, y_train, y_test = train_test_split(
+        df.drop('Y', axis=1).values, df['Y'].values,
+        test_size=0.2, random_state=0)
+
+    data = split_data(df)
+
+    np.testing.assert_array_equal(data["train"]["X"], X_train)
+    np.testing.assert_array_equal(data["test"]["X"], X_test)
+    np.testing.assert_array_equal(data["train"]["y"], y_train)
+    np.testing.assert_array_equal(data["test"]["y"], y_test)
+    assert data["train"]["X"].base is data["test"]["X"].base
+    assert data["train"]["X"].flags["C_CONTIGUOUS"]
+
+
+def test_split_data_peak_memory():
+    df = make_frame(20000, 100)
+    data_size = df.drop('Y', axis=1).memory_usage(index=False).sum()
+
+    tracemalloc.start()
+    data = split_data(df)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert data["train"]["X"].dtype == np.float64
+    assert peak < 1.25 * data_size
 
 
 def test_train_model():
@@ -30,3 +72,15 @@ def test_get_model_metrics():
     assert 'mse' in metrics
     mse = metrics['mse']
     np.testing.assert_almost_equal(mse, 0.029843893480257067)
+
+
+def test_check_precision_parity_float32():
+    df = make_frame(500, 10)
+
+    parity, passed = check_precision_parity(
+        df, {"alpha": 0.5}, np.float32, 0.01)
+
+    assert passed
+    assert parity["mse_delta"] < 0.01
+    assert "mse_float32" in parity
+    assert split_data(df, np.float32)["train"]["X"].dtype == np.float32
@@ -0,0 +1,47 @@
+import ast
+import os
+from diabetes_regression.training.train_cache import (
+    TRAINING_CODE_FILES, get_cache_key, get_code_hash)
+
+
+def test_get_cache_key_ignores_parameter_order():
+    key = get_cache_key("ds", {"alpha": 0.4, "solver": "auto"}, "code")
+
+    assert key == get_cache_key("ds", {"solver": "auto", "alpha": 0.4}, "code")
+    assert key != get_cache_key("ds", {"alpha": 0.5, "solver": "auto"}, "code")
+    assert key != get_cache_key(
+        "ds2", {"alpha": 0.4, "solver": "auto"}, "code")
+    assert key != get_cache_key("ds", {"alpha": 0.4, "solver": "auto"}, "new")
+
+
+def test_get_code_hash_tracks_file_content(tmp_path):
+    (tmp_path / "train.py").write_text("alpha = 1")
+    first = get_code_hash(str(tmp_path), ["train.py"])
+
+    (tmp_path / "train.py").write_text("alpha = 2")
+
+    assert get_code_hash(str(tmp_path), ["train.py"]) != first
+
+
+def test_get_code_hash_covers_training_code():
+    sources_dir = os.path.dirname(os.path.dirname(__file__))
+
+    assert len(get_code_hash(sources_dir)) == 64
+
+
+def test_training_code_covers_the_modules_train_aml_imports():
+    sources_dir = os.path.dirname(os.path.dirname(__file__))
+    with open(os.path.join(sources_dir, "training", "train_aml.py")) as f:
+        tree = ast.parse(f.read())
+
+    imported = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.module is not None:
+            if node.module.startswith("util."):
+                imported.add(os.path.join(
+                    *node.module.split(".")) + ".py")
+            elif node.module.startswith("train"):
+                imported.add(os.path.join("training", node.module + ".py"))
+
+    assert imported
+    assert imported <= set(TRAINING_CODE_FILES)
@@ -25,21 +25,39 @@ POSSIBILITY OF SUCH DAMAGE.
 """
 
 import os
+import numpy as np
 import pandas as pd
 from sklearn.linear_model import Ridge
 from sklearn.metrics import mean_squared_error
 from sklearn.model_selection import train_test_split
 
 
-# Split the dataframe into test and train data
-def split_data(df):
-    X = df.drop('Y', axis=1).values
-    y = df['Y'].values
-
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=0)
-    data = {"train": {"X": X_train, "y": y_train},
-            "test": {"X": X_test, "y": y_test}}
+# Copy the feature columns of the dataframe into one contiguous matrix,
+# optionally reordering the rows, without materialising any intermediate
+# frame or array of the same size
+def get_feature_matrix(df, order=None, dtype=np.float64):
+    columns = [c for c in df.columns if c != 'Y']
+    n_rows = len(df) if order is None else len(order)
+    X = np.empty((n_rows, len(columns)), dtype=dtype)
+    for j, column in enumerate(columns):
+        values = df[column].to_numpy()
+        X[:, j] = values if order is None else values[order]
+    return X
+
+
+# Split the dataframe into test and train data. The rows are laid out in
+# train-then-test order in a single matrix so both sets are views into it.
+def split_data(df, dtype=np.float64):
+    train_idx, test_idx = train_test_split(
+        np.arange(len(df)), test_size=0.2, random_state=0)
+    order = np.concatenate((train_idx, test_idx))
+    n_train = len(train_idx)
+
+    X = get_feature_matrix(df, order, dtype)
+    y = df['Y'].to_numpy(dtype=dtype)[order]
+
+    data = {"train": {"X": X[:n_train], "y": y[:n_train]},
+            "test": {"X": X[n_train:], "y": y[n_train:]}}
     return data
 
 
@@ -58,6 +76,25 @@ def get_model_metrics(model, data):
     return metrics
 
 
+# Train a float64 baseline and a model at the requested precision on the
+# same split and compare their test MSE. The reduced precision model is
+# only acceptable when the relative MSE delta is within max_mse_delta.
+def check_precision_parity(df, ridge_args, dtype, max_mse_delta):
+    baseline_data = split_data(df)
+    baseline_model = train_model(baseline_data, ridge_args)
+    baseline_mse = get_model_metrics(baseline_model, baseline_data)["mse"]
+
+    data = split_data(df, dtype)
+    model = train_model(data, ridge_args)
+    mse = get_model_metrics(model, data)["mse"]
+
+    mse_delta = abs(float(mse) - float(baseline_mse)) / float(baseline_mse)
+    parity = {"mse_float64": float(baseline_mse),
+              "mse_" + np.dtype(dtype).name: float(mse),
+              "mse_delta": mse_delta}
+    return parity, mse_delta <= max_mse_delta
+
+
 def main():
     print("Running train.py")
 
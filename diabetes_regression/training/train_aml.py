@@ -24,12 +24,19 @@ ARISING IN ANY WAY OUT OF THE USE OF THE SOFTWARE CODE, EVEN IF ADVISED OF THE
 POSSIBILITY OF SUCH DAMAGE.
 """
 from azureml.core.run import Run
-from azureml.core import Dataset, Datastore, Workspace
+from azureml.core import Dataset, Datastore, Experiment, Workspace
 import os
 import argparse
-import joblib
 import json
-from train import split_data, train_model, get_model_metrics
+import shutil
+import tempfile
+import numpy as np
+from train import (
+    split_data, train_model, get_model_metrics, check_precision_parity)
+from train_cache import CACHE_KEY_PROPERTY, get_cache_key, get_code_hash
+from util.dataset_fingerprint import table_fingerprint
+from util.feature_schema import infer_schema
+from util.model_artifact import save_model, verify_artifact
 
 
 def register_dataset(
@@ -39,14 +46,42 @@ def register_dataset(
     file_path: str
 ) -> Dataset:
     datastore = Datastore.get(aml_workspace, datastore_name)
+
+    # Fingerprint the file content so that re-registering an unchanged file
+    # returns the existing dataset version instead of creating a new one
+    with tempfile.TemporaryDirectory() as download_dir:
+        files = Dataset.File.from_files(path=(datastore, file_path)).download(
+            target_path=download_dir)
+        fingerprint = table_fingerprint(files[0])
+    print(f"Dataset fingerprint: {fingerprint}")
+
+    try:
+        latest = Dataset.get_by_name(aml_workspace, dataset_name)
+    except Exception:
+        latest = None
+    if latest is not None and latest.tags.get("fingerprint") == fingerprint:
+        print(f"Dataset {dataset_name} version {latest.version} has the "
+              "same content, skipping registration")
+        return latest
+
     dataset = Dataset.Tabular.from_delimited_files(path=(datastore, file_path))
     dataset = dataset.register(workspace=aml_workspace,
                                name=dataset_name,
+                               tags={"fingerprint": fingerprint},
                                create_new_version=True)
 
     return dataset
 
 
+def get_cached_run(experiment: Experiment, cache_key: str) -> Run:
+    runs = Run.list(
+        experiment,
+        properties={CACHE_KEY_PROPERTY: cache_key},
+        status="Completed",
+        include_children=True)
+    return next(iter(runs), None)
+
+
 def main():
     print("Running train_aml.py")
 
@@ -91,6 +126,14 @@ def main():
               rather than the one used while the pipeline creation")
     )
 
+    parser.add_argument(
+        "--use_cache",
+        type=str,
+        help=("Set this to false to always retrain, even when a previous run "
+              "trained on the same data, parameters and code"),
+        default="true",
+    )
+
     args = parser.parse_args()
 
     print("Argument [model_name]: %s" % args.model_name)
@@ -99,12 +142,14 @@ def main():
     print("Argument [data_file_path]: %s" % args.data_file_path)
     print("Argument [caller_run_id]: %s" % args.caller_run_id)
     print("Argument [dataset_name]: %s" % args.dataset_name)
+    print("Argument [use_cache]: %s" % args.use_cache)
 
     model_name = args.model_name
     step_output_path = args.step_output
     dataset_version = args.dataset_version
     data_file_path = args.data_file_path
     dataset_name = args.dataset_name
+    use_cache = args.use_cache.lower() == "true"
 
     run = Run.get_context()
 
@@ -125,6 +170,16 @@ def main():
         run.log(k, v)
         run.parent.log(k, v)
 
+    # Load the precision settings. Anything other than float64 is opt-in
+    # and must pass a parity check against a float64 baseline.
+    try:
+        precision_args = pars["precision"]
+    except KeyError:
+        print("Could not load precision values from file")
+        precision_args = {}
+    dtype = np.dtype(precision_args.get("dtype", "float64"))
+    max_mse_delta = precision_args.get("max_mse_delta", 0.01)
+
     # Get the dataset
     if (dataset_name):
         if (data_file_path == 'none'):
@@ -143,29 +198,77 @@ def main():
     run.input_datasets['training_data'] = dataset
     run.parent.tag("dataset_id", value=dataset.id)
 
-    # Split the data into test/train
-    df = dataset.to_pandas_dataframe()
-    data = split_data(df)
-
-    # Train the model
-    model = train_model(data, train_args)
-
-    # Evaluate and log the metrics returned from the train function
-    metrics = get_model_metrics(model, data)
-    for (k, v) in metrics.items():
-        run.log(k, v)
-        run.parent.log(k, v)
+    # Look for a completed run that trained on the same data with the
+    # same parameters and code, and reuse its model and metrics if found.
+    # Datasets registered without a content fingerprint fall back to their
+    # id.
+    sources_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    cache_key = get_cache_key(
+        dataset.tags.get("fingerprint", dataset.id),
+        {"training": train_args, "precision": precision_args},
+        get_code_hash(sources_dir))
+    print(f"Training cache key: {cache_key}")
+    cached_run = (
+        get_cached_run(run.experiment, cache_key) if use_cache else None
+    )
 
-    # Pass model file to next step
     os.makedirs(step_output_path, exist_ok=True)
     model_output_path = os.path.join(step_output_path, model_name)
-    joblib.dump(value=model, filename=model_output_path)
+
+    if cached_run is not None:
+        print(f"Reusing model trained by run {cached_run.id}")
+        cached_run.download_file(
+            "outputs/" + model_name, output_file_path=model_output_path)
+        verify_artifact(model_output_path)
+
+        # Replay the metrics of the cached run
+        for (k, v) in cached_run.get_metrics().items():
+            if k not in train_args:
+                run.log(k, v)
+                run.parent.log(k, v)
+        run.tag("cached_from", value=cached_run.id)
+    else:
+        df = dataset.to_pandas_dataframe()
+
+        if dtype != np.float64:
+            parity, passed = check_precision_parity(
+                df, train_args, dtype, max_mse_delta)
+            for (k, v) in parity.items():
+                run.log(k, v)
+            if not passed:
+                print(f"{dtype.name} MSE delta {parity['mse_delta']} "
+                      f"exceeds {max_mse_delta}, falling back to float64")
+                dtype = np.dtype(np.float64)
+        print(f"Training precision: {dtype.name}")
+        run.log("precision", dtype.name)
+        run.parent.log("precision", dtype.name)
+
+        # Split the data into test/train
+        data = split_data(df, dtype)
+
+        # Train the model
+        model = train_model(data, train_args)
+
+        # Evaluate and log the metrics returned from the train function
+        metrics = get_model_metrics(model, data)
+        for (k, v) in metrics.items():
+            run.log(k, v)
+            run.parent.log(k, v)
+
+        # Pass model file to next step, along with the feature schema the
+        # scoring scripts validate their input against
+        feature_names = [c for c in df.columns if c != 'Y']
+        header = save_model(
+            model, model_output_path, feature_names,
+            metadata={"feature_schema": infer_schema(df)})
+        print(f"Saved model artifact with sha256 {header['sha256']}")
 
     # Also upload model file to run outputs for history
     os.makedirs('outputs', exist_ok=True)
     output_path = os.path.join('outputs', model_name)
-    joblib.dump(value=model, filename=output_path)
+    shutil.copyfile(model_output_path, output_path)
 
+    run.add_properties({CACHE_KEY_PROPERTY: cache_key})
     run.tag("run_type", value="train")
     print(f"tags now present for run: {run.tags}")
 
@@ -0,0 +1,63 @@
+"""
+Copyright (C) Microsoft Corporation. All rights reserved.​
+ ​
+Microsoft Corporation (“Microsoft”) grants you a nonexclusive, perpetual,
+royalty-free right to use, copy, and modify the software code provided by us
+("Software Code"). You may not sublicense the Software Code or any use of it
+(except to your affiliates and to vendors to perform work on your behalf)
+through distribution, network access, service agreement, lease, rental, or
+otherwise. This license does not purport to express any claim of ownership over
+data you may have shared with Microsoft in the creation of the Software Code.
+Unless applicable law gives you more rights, Microsoft reserves all other
+rights not expressly granted herein, whether by implication, estoppel or
+otherwise. ​
+ ​
+THE SOFTWARE CODE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+MICROSOFT OR ITS LICENSORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+ARISING IN ANY WAY OUT OF THE USE OF THE SOFTWARE CODE, EVEN IF ADVISED OF THE
+POSSIBILITY OF SUCH DAMAGE.
+"""
+import hashlib
+import json
+import os
+
+# Property set on train runs so later runs can find them by cache key
+CACHE_KEY_PROPERTY = "train_cache_key"
+
+# Files whose content determines the trained model, relative to the
+# sources directory
+TRAINING_CODE_FILES = [
+    os.path.join("training", "train.py"),
+    os.path.join("training", "train_aml.py"),
+    os.path.join("training", "train_cache.py"),
+    os.path.join("util", "dataset_fingerprint.py"),
+    os.path.join("util", "feature_schema.py"),
+    os.path.join("util", "model_artifact.py"),
+]
+
+
+# Hash the training code so that any change to it invalidates the cache
+def get_code_hash(sources_dir, files=TRAINING_CODE_FILES):
+    sha = hashlib.sha256()
+    for name in files:
+        sha.update(name.replace(os.sep, "/").encode("utf-8") + b"\0")
+        with open(os.path.join(sources_dir, name), "rb") as f:
+            sha.update(hashlib.sha256(f.read()).digest())
+    return sha.hexdigest()
+
+
+# Combine the dataset fingerprint, training parameters and code hash into
+# a single content address for the trained model
+def get_cache_key(dataset_fingerprint, parameters, code_hash):
+    content = json.dumps(
+        {"dataset": dataset_fingerprint,
+         "parameters": parameters,
+         "code": code_hash},
+        sort_keys=True)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
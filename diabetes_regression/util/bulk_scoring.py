@@ -0,0 +1,128 @@
+"""
+bulk_scoring.py
+
+Streaming bulk scoring for the web service. The request body is read and
+scored in chunks of at most chunk_rows rows while it is still being
+uploaded, and the scores of each chunk are written back before the next
+chunk is read, so memory use does not depend on the size of the request.
+
+Two body formats are supported:
+
+    application/x-ndjson      one JSON array of feature values per line,
+                              answered with one score per line
+    application/octet-stream  rows of little-endian floats in the model
+                              dtype (X-Feature-Count values per row),
+                              answered with the scores in the same dtype
+"""
+import json
+from typing import Callable, Iterable, Iterator
+
+import numpy as np
+
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+BINARY_CONTENT_TYPE = "application/octet-stream"
+CHUNK_ROWS = 10000
+
+
+def iter_ndjson_chunks(
+    stream,
+    chunk_rows: int = CHUNK_ROWS,
+    dtype=np.float64,
+) -> Iterator[np.ndarray]:
+    """
+    Reads newline-delimited JSON rows from a binary stream.
+
+    Parameters:
+    stream: file-like object yielding lines of bytes
+    (optional) chunk_rows (int): maximum rows per chunk
+    (optional) dtype: dtype of the returned arrays
+
+    Return:
+    Iterator of 2D arrays of at most chunk_rows rows.
+    """
+    lines = []
+    for line in stream:
+        line = line.strip()
+        if len(line) == 0:
+            continue
+        lines.append(line.decode("utf-8"))
+        if len(lines) == chunk_rows:
+            yield np.array(json.loads("[" + ",".join(lines) + "]"), dtype)
+            lines = []
+    if len(lines) > 0:
+        yield np.array(json.loads("[" + ",".join(lines) + "]"), dtype)
+
+
+def iter_binary_chunks(
+    stream,
+    n_features: int,
+    chunk_rows: int = CHUNK_ROWS,
+    dtype=np.float64,
+) -> Iterator[np.ndarray]:
+    """
+    Reads packed rows of n_features values from a binary stream.
+
+    Parameters:
+    stream: file-like object with a read(size) method
+    n_features (int): values per row
+    (optional) chunk_rows (int): maximum rows per chunk
+    (optional) dtype: dtype of the values in the stream
+
+    Return:
+    Iterator of 2D arrays of at most chunk_rows rows.
+    """
+    dtype = np.dtype(dtype).newbyteorder("<")
+    row_bytes = n_features * dtype.itemsize
+    chunk_bytes = chunk_rows * row_bytes
+    while True:
+        buffer = bytearray()
+        while len(buffer) < chunk_bytes:
+            data = stream.read(chunk_bytes - len(buffer))
+            if not data:
+                break
+            buffer.extend(data)
+        if len(buffer) == 0:
+            return
+        if len(buffer) % row_bytes != 0:
+            raise ValueError(
+                "Body is not a whole number of {} byte rows".format(
+                    row_bytes))
+        yield np.frombuffer(buffer, dtype).reshape(-1, n_features)
+        if len(buffer) < chunk_bytes:
+            return
+
+
+def score_ndjson(
+    chunks: Iterable[np.ndarray],
+    predict: Callable,
+) -> Iterator[bytes]:
+    """
+    Scores each chunk and yields its scores, one per line. A chunk that
+    cannot be scored ends the response with an {"error": ...} line, as the
+    status code has already been sent.
+    """
+    try:
+        for X in chunks:
+            result = predict(X)
+            yield ("\n".join(map(repr, result.tolist())) + "\n").encode()
+    except (ValueError, TypeError) as e:
+        yield (json.dumps({"error": str(e)}) + "\n").encode()
+
+
+def score_binary(
+    chunks: Iterable[np.ndarray],
+    predict: Callable,
+    dtype=np.float64,
+) -> Iterator[bytes]:
+    """
+    Scores each chunk and yields its scores as packed little-endian values.
+    A chunk that cannot be scored ends the response early, as the status
+    code has already been sent, so the client receives fewer scores than it
+    sent rows.
+    """
+    dtype = np.dtype(dtype).newbyteorder("<")
+    try:
+        for X in chunks:
+            yield np.asarray(predict(X), dtype).tobytes()
+    except (ValueError, TypeError) as e:
+        print("Binary bulk scoring ended early: {}".format(e))
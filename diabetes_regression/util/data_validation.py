@@ -0,0 +1,77 @@
+"""
+data_validation.py
+
+Checks of the training data and the baseline profile of its columns, run
+by validate/validate_data.py alongside training. The profile records the
+distribution the model was trained on, so later batches can be compared
+against it.
+"""
+import numpy as np
+import pandas as pd
+
+
+def profile_data(df: pd.DataFrame) -> dict:
+    """
+    Profiles every column of a DataFrame in one vectorized pass.
+
+    Parameters:
+    df (DataFrame): data to profile
+
+    Return:
+    JSON-serializable profile: row count, and per column the dtype, missing
+    value count and, for numeric columns, mean, standard deviation, min and
+    max.
+    """
+    missing = df.isna().sum()
+    numeric = df.select_dtypes(include=[np.number])
+    stats = numeric.agg(["mean", "std", "min", "max"])
+    columns = {}
+    for name in df.columns:
+        column = {
+            "dtype": str(df[name].dtype),
+            "missing": int(missing[name]),
+        }
+        if name in stats.columns:
+            column.update(
+                {k: float(v) for (k, v) in stats[name].items()})
+        columns[str(name)] = column
+    return {"rows": int(len(df)), "columns": columns}
+
+
+def validate_data(
+    df: pd.DataFrame,
+    target: str = "Y",
+    min_rows: int = 1,
+    max_missing_fraction: float = 0.0
+) -> list:
+    """
+    Checks the training data.
+
+    Parameters:
+    df (DataFrame): training data
+    (optional) target (str): label column
+    (optional) min_rows (int): fewest rows to train on
+    (optional) max_missing_fraction (float): largest fraction of missing
+    values allowed in a column
+
+    Return:
+    Description of every problem found, empty if the data is valid.
+    """
+    problems = []
+    if len(df) < min_rows:
+        problems.append(
+            "{} rows, at least {} required".format(len(df), min_rows))
+    if target not in df.columns:
+        problems.append("Target column {} is missing".format(target))
+    non_numeric = [
+        str(c) for c in df.columns
+        if not pd.api.types.is_numeric_dtype(df[c])
+    ]
+    if non_numeric:
+        problems.append("Non-numeric columns {}".format(non_numeric))
+    if len(df):
+        missing = df.isna().mean()
+        too_sparse = missing[missing > max_missing_fraction]
+        for (name, fraction) in too_sparse.items():
+            problems.append("{:.1%} of {} is missing".format(fraction, name))
+    return problems
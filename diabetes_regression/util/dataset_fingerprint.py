@@ -0,0 +1,76 @@
+"""
+dataset_fingerprint.py
+
+Streaming content fingerprints for dataset files. Both fingerprints are
+computed in a single pass over the data in fixed size chunks, so memory use
+does not grow with the size of the file.
+"""
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+
+CHUNK_SIZE = 1 << 20
+ROWS_PER_CHUNK = 100000
+_MASK = (1 << 64) - 1
+
+
+def file_fingerprint(path: str, chunk_size: int = CHUNK_SIZE) -> str:
+    """
+    Returns the SHA-256 of the raw bytes of a file, read in chunks.
+
+    Parameters:
+    path (str): file to hash
+    (optional) chunk_size (int): bytes read per chunk
+
+    Return:
+    Hex digest of the file content.
+    """
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def table_fingerprint(
+    path: str,
+    rows_per_chunk: int = ROWS_PER_CHUNK,
+    **read_csv_args
+) -> str:
+    """
+    Returns a fingerprint of the parsed content of a delimited file that
+    does not depend on the order of its rows. Each row is hashed and the
+    row hashes are combined with order-insensitive operations, together
+    with the column names and the row count. Numeric columns are hashed as
+    float64 so that the per-chunk type inference of read_csv does not
+    change the result.
+
+    Parameters:
+    path (str): delimited file to fingerprint
+    (optional) rows_per_chunk (int): rows parsed per chunk
+    (optional) read_csv_args: extra arguments passed to pandas.read_csv
+
+    Return:
+    Hex digest of the table content.
+    """
+    columns = None
+    n_rows = 0
+    hash_sum = 0
+    hash_xor = 0
+    for chunk in pd.read_csv(path, chunksize=rows_per_chunk, **read_csv_args):
+        if columns is None:
+            columns = [str(c) for c in chunk.columns]
+        numeric = chunk.select_dtypes("number").columns
+        chunk = chunk.astype({c: np.float64 for c in numeric})
+        hashes = pd.util.hash_pandas_object(chunk, index=False).to_numpy(
+            dtype=np.uint64)
+        n_rows += len(hashes)
+        hash_sum = (hash_sum + int(hashes.sum(dtype=np.uint64))) & _MASK
+        hash_xor ^= int(np.bitwise_xor.reduce(hashes, initial=0))
+
+    content = json.dumps(
+        {"columns": columns, "rows": n_rows, "sum": hash_sum, "xor": hash_xor},
+        sort_keys=True)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
@@ -0,0 +1,125 @@
+"""
+feature_schema.py
+
+Feature schema of a model: the names, order, dtypes and observed value
+bounds of its input columns, captured from the training data and stored in
+the model artifact. A schema is compiled once per model into a
+SchemaValidator, which checks a whole batch with a few vectorized
+operations and returns the feature matrix in training column order.
+"""
+import numpy as np
+import pandas as pd
+
+
+class SchemaError(ValueError):
+    """
+    Raised when a batch does not match the feature schema of the model.
+    """
+
+
+def infer_schema(df: pd.DataFrame, target: str = "Y") -> dict:
+    """
+    Captures the feature schema of a training DataFrame.
+
+    Parameters:
+    df (DataFrame): training data
+    (optional) target (str): label column, excluded from the schema
+
+    Return:
+    JSON-serializable schema.
+    """
+    columns = []
+    for name in df.columns:
+        if name == target:
+            continue
+        values = df[name]
+        columns.append({
+            "name": str(name),
+            "dtype": str(values.dtype),
+            "min": float(values.min()),
+            "max": float(values.max()),
+        })
+    return {"columns": columns}
+
+
+class SchemaValidator:
+    """
+    Validator compiled from a feature schema. Column lookups and bounds are
+    prepared once, so validating a batch costs a column selection, one
+    conversion to the model dtype and two vectorized comparisons.
+
+    Values outside the training bounds are counted per column in
+    out_of_bounds, and rejected when strict_bounds is set.
+    """
+
+    def __init__(self, schema: dict, dtype=np.float64,
+                 strict_bounds: bool = False, allow_extra: bool = False):
+        self.names = [c["name"] for c in schema["columns"]]
+        self.dtype = np.dtype(dtype)
+        self.lower = np.array([c["min"] for c in schema["columns"]])
+        self.upper = np.array([c["max"] for c in schema["columns"]])
+        self.strict_bounds = strict_bounds
+        self.allow_extra = allow_extra
+        self.out_of_bounds = np.zeros(len(self.names), dtype=np.int64)
+
+    def _select(self, df: pd.DataFrame) -> pd.DataFrame:
+        labels = {str(c): c for c in df.columns}
+        if list(labels) == self.names:
+            return df
+        missing = [n for n in self.names if n not in labels]
+        if missing:
+            raise SchemaError("Missing feature columns {}".format(missing))
+        extra = [c for c in labels if c not in set(self.names)]
+        if extra and not self.allow_extra:
+            raise SchemaError("Unexpected columns {}".format(extra))
+        return df[[labels[n] for n in self.names]]
+
+    def validate(self, data) -> np.ndarray:
+        """
+        Validates a batch and returns its feature matrix.
+
+        Parameters:
+        data: DataFrame, whose columns are matched by name and reordered,
+        or a 2D array-like already in schema column order
+
+        Return:
+        2D array in the validator dtype, columns in schema order.
+        """
+        try:
+            X = data
+            if isinstance(data, pd.DataFrame):
+                X = self._select(data).to_numpy(dtype=self.dtype)
+            X = np.ascontiguousarray(X, dtype=self.dtype)
+        except (TypeError, ValueError) as e:
+            if isinstance(e, SchemaError):
+                raise
+            raise SchemaError("Features are not numeric: {}".format(e))
+
+        if X.ndim != 2 or X.shape[1] != len(self.names):
+            raise SchemaError(
+                "Expected rows of {} features, got shape {}".format(
+                    len(self.names), X.shape))
+        if not np.isfinite(X).all():
+            raise SchemaError("Features contain NaN or infinite values")
+
+        out_of_bounds = ((X < self.lower) | (X > self.upper)).sum(axis=0)
+        self.out_of_bounds += out_of_bounds
+        if self.strict_bounds and out_of_bounds.any():
+            raise SchemaError("Values outside the training range in {}".format(
+                [n for (n, k) in zip(self.names, out_of_bounds) if k]))
+        return X
+
+
+def get_validator(model, dtype=None, **validator_args):
+    """
+    Returns a SchemaValidator for the feature schema stored in a model
+    artifact, or None for models saved without one. Features are converted
+    to dtype, the precision of the model by default.
+    """
+    header = getattr(model, "header", None) or {}
+    schema = header.get("metadata", {}).get("feature_schema")
+    if schema is None:
+        return None
+    if dtype is None:
+        dtype = getattr(model, "coef_", np.empty(0)).dtype
+    return SchemaValidator(schema, dtype, **validator_args)
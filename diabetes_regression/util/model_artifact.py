@@ -0,0 +1,217 @@
+"""
+model_artifact.py
+
+Compact, versioned file format for linear models. An artifact is laid out as
+
+    magic (8 bytes) | format version (uint16) | header length (uint32)
+    | JSON header | payload
+
+The header holds the model type, hyperparameters, feature schema, array
+shapes and dtype, and a SHA-256 of the payload. The payload is the raw
+coefficient and intercept arrays. Nothing in the file is unpickled, so an
+artifact can be inspected and verified without executing arbitrary code.
+"""
+import hashlib
+import json
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b"DRMODEL\0"
+FORMAT_VERSION = 1
+_PREFIX = struct.Struct("<8sHI")
+
+
+class LinearModel:
+    """
+    Linear model restored from an artifact. Exposes the same coef_,
+    intercept_ and predict() surface as the scikit-learn estimator it was
+    saved from.
+    """
+
+    def __init__(self, coef, intercept, feature_names=None, header=None):
+        self.coef_ = coef
+        self.intercept_ = intercept
+        self.feature_names = feature_names
+        self.header = header if header is not None else {}
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=self.coef_.dtype)
+        return X @ self.coef_.T + self.intercept_
+
+
+def _json_params(model) -> dict:
+    params = {}
+    get_params = getattr(model, "get_params", None)
+    if get_params is None:
+        return params
+    for (k, v) in get_params().items():
+        try:
+            json.dumps(v)
+        except TypeError:
+            continue
+        params[k] = v
+    return params
+
+
+def save_model(
+    model,
+    path: str,
+    feature_names: list = None,
+    metadata: dict = None
+) -> dict:
+    """
+    Writes a fitted linear model to path in the artifact format.
+
+    Parameters:
+    model: fitted estimator exposing coef_ and intercept_
+    path (str): file to write
+    (optional) feature_names (list): ordered input column names
+    (optional) metadata (dict): extra JSON-serializable values for the header
+
+    Return:
+    The header that was written.
+    """
+    if not hasattr(model, "coef_") or not hasattr(model, "intercept_"):
+        raise ValueError(
+            "Only fitted linear models with coef_ and intercept_ can be saved")
+
+    coef = np.ascontiguousarray(model.coef_)
+    intercept = np.ascontiguousarray(
+        np.asarray(model.intercept_, dtype=coef.dtype))
+    payload = coef.tobytes() + intercept.tobytes()
+
+    header = {
+        "format_version": FORMAT_VERSION,
+        "model_type": type(model).__name__,
+        "params": _json_params(model),
+        "feature_names": (
+            None if feature_names is None else [str(f) for f in feature_names]
+        ),
+        "dtype": coef.dtype.str,
+        "coef_shape": list(coef.shape),
+        "intercept_shape": list(intercept.shape),
+        "payload_size": len(payload),
+        "sha256": hashlib.sha256(payload).hexdigest(),
+        "metadata": metadata if metadata is not None else {},
+    }
+    header_bytes = json.dumps(header, sort_keys=True).encode("utf-8")
+
+    with open(path, "wb") as f:
+        f.write(_PREFIX.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        f.write(payload)
+
+    return header
+
+
+def _parse_header(prefix: bytes, read) -> dict:
+    if len(prefix) < _PREFIX.size:
+        raise ValueError("File is too short to be a model artifact")
+    magic, version, header_size = _PREFIX.unpack(prefix)
+    if magic != MAGIC:
+        raise ValueError("File is not a model artifact")
+    if version > FORMAT_VERSION:
+        raise ValueError(
+            "Unsupported model artifact version {}".format(version))
+    header_bytes = read(header_size)
+    if len(header_bytes) != header_size:
+        raise ValueError("Model artifact header is truncated")
+    header = json.loads(header_bytes.decode("utf-8"))
+    header["header_size"] = _PREFIX.size + header_size
+    return header
+
+
+def is_model_artifact(path: str) -> bool:
+    """
+    Returns True if the file at path starts with the artifact magic bytes.
+    """
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def read_header(path: str) -> dict:
+    """
+    Reads and validates the header of an artifact without loading the
+    payload. Checks the magic bytes, format version and that the file size
+    matches the payload size recorded in the header.
+
+    Parameters:
+    path (str): artifact file
+
+    Return:
+    The artifact header.
+    """
+    with open(path, "rb") as f:
+        header = _parse_header(f.read(_PREFIX.size), f.read)
+        file_size = os.fstat(f.fileno()).st_size
+    if file_size != header["header_size"] + header["payload_size"]:
+        raise ValueError("Model artifact payload size does not match header")
+    return header
+
+
+def verify_artifact(path: str) -> dict:
+    """
+    Validates the header of an artifact and checks the payload against the
+    content hash recorded in it.
+
+    Parameters:
+    path (str): artifact file
+
+    Return:
+    The artifact header.
+    """
+    header = read_header(path)
+    with open(path, "rb") as f:
+        f.seek(header["header_size"])
+        digest = hashlib.sha256(f.read(header["payload_size"])).hexdigest()
+    if digest != header["sha256"]:
+        raise ValueError("Model artifact content hash mismatch")
+    return header
+
+
+def load_model(path: str, verify: bool = False):
+    """
+    Loads a model from path. Artifacts are restored as a LinearModel.
+    Anything else is assumed to be a legacy joblib pickle.
+
+    Parameters:
+    path (str): model file
+    (optional) verify (bool): check the payload against the content hash
+
+    Return:
+    The loaded model.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        import joblib
+        return joblib.load(path)
+
+    offset = [_PREFIX.size]
+
+    def read(size):
+        chunk = data[offset[0]:offset[0] + size]
+        offset[0] += size
+        return chunk
+
+    header = _parse_header(data[:_PREFIX.size], read)
+    payload = memoryview(data)[header["header_size"]:]
+    if len(payload) != header["payload_size"]:
+        raise ValueError("Model artifact payload size does not match header")
+    if verify and hashlib.sha256(payload).hexdigest() != header["sha256"]:
+        raise ValueError("Model artifact content hash mismatch")
+
+    dtype = np.dtype(header["dtype"])
+    coef_shape = tuple(header["coef_shape"])
+    n_coef = int(np.prod(coef_shape))
+    coef = np.frombuffer(payload, dtype=dtype, count=n_coef).reshape(
+        coef_shape)
+    intercept = np.frombuffer(
+        payload, dtype=dtype, offset=n_coef * dtype.itemsize).reshape(
+        tuple(header["intercept_shape"]))
+    if intercept.ndim == 0:
+        intercept = intercept[()]
+
+    return LinearModel(coef, intercept, header["feature_names"], header)
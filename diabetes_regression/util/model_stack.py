@@ -0,0 +1,47 @@
+"""
+model_stack.py
+
+Scores a batch against several models at once. When every model is linear
+with the same number of features, their coefficients are stacked into one
+(features x models) matrix so the whole batch is scored by a single matrix
+product instead of one pass per model.
+"""
+import numpy as np
+
+
+class ModelStack:
+    """
+    Models scored together, each producing one output column.
+    """
+
+    def __init__(self, models: list, names: list):
+        if len(models) == 0 or len(models) != len(names):
+            raise ValueError("Expected one name per model")
+        self.models = models
+        self.names = names
+        self.coef_ = None
+        self.intercept_ = None
+
+        coefs = [getattr(m, "coef_", None) for m in models]
+        if all(c is not None and np.ndim(c) == 1 for c in coefs) \
+                and len({len(c) for c in coefs}) == 1:
+            self.dtype = np.result_type(*coefs)
+            self.coef_ = np.column_stack(coefs).astype(self.dtype)
+            self.intercept_ = np.array(
+                [m.intercept_ for m in models], dtype=self.dtype)
+        else:
+            self.dtype = np.result_type(
+                *[c for c in coefs if c is not None], np.float64)
+
+    @property
+    def is_stacked(self) -> bool:
+        return self.coef_ is not None
+
+    def predict(self, X) -> np.ndarray:
+        """
+        Returns a (rows x models) array of predictions.
+        """
+        X = np.asarray(X, dtype=self.dtype)
+        if self.is_stacked:
+            return X @ self.coef_ + self.intercept_
+        return np.column_stack([m.predict(X) for m in self.models])
@@ -0,0 +1,225 @@
+"""
+output_conversion.py
+
+Streaming conversion of the batch scoring output. With the append_row
+output action, ParallelRunStep writes every scored row to
+parallel_run_step.txt as space separated values without a header. The
+conversion reads that file in chunks of chunk_rows rows, encodes each chunk
+as CSV with a header, JSON lines or a Parquet row group, and hands the
+encoded chunks to stage_block as numbered blocks, several at a time, so a
+block blob is written in parallel while the next chunk is read. Only
+max_concurrency blocks are in flight at once, so memory use does not depend
+on the size of the output.
+
+The column names are not in the output file. The scoring workers write
+them next to it, in COLUMNS_FILE.
+"""
+import io
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, Iterator, List
+
+import pandas as pd
+
+COLUMNS_FILE = "parallel_run_step.columns.json"
+OUTPUT_FORMATS = ("csv", "jsonl", "parquet")
+CHUNK_ROWS = 100000
+
+
+def write_columns(output_dir: str, columns: List[str]):
+    """
+    Writes the output column names once per output directory. Every worker
+    writes the same names, so the first complete file wins.
+    """
+    path = os.path.join(output_dir, COLUMNS_FILE)
+    if os.path.exists(path):
+        return
+    tmp = "{}.{}.tmp".format(path, os.getpid())
+    with open(tmp, "w") as f:
+        json.dump([str(c) for c in columns], f)
+    os.replace(tmp, path)
+
+
+class IterStream(io.RawIOBase):
+    """
+    Readable binary stream over an iterable of byte chunks, e.g. the chunks
+    of a blob download.
+    """
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._buffer = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._buffer:
+            self._buffer = next(self._chunks, None)
+            if self._buffer is None:
+                self._buffer = b""
+                return 0
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
+def iter_append_row_chunks(
+    stream,
+    columns: List[str],
+    chunk_rows: int = CHUNK_ROWS,
+) -> Iterator[pd.DataFrame]:
+    """
+    Reads append_row output from a binary stream.
+
+    Parameters:
+    stream: file-like object with the space separated rows
+    columns (list): column names
+    (optional) chunk_rows (int): maximum rows per chunk
+
+    Return:
+    Iterator of DataFrames of at most chunk_rows rows.
+    """
+    return pd.read_csv(stream, sep=" ", header=None, names=columns,
+                       chunksize=chunk_rows)
+
+
+class _CsvEncoder:
+    def __init__(self):
+        self.header = True
+
+    def encode(self, df: pd.DataFrame) -> bytes:
+        data = df.to_csv(index=False, header=self.header)
+        self.header = False
+        return data.encode("utf-8")
+
+    def finish(self) -> bytes:
+        return b""
+
+
+class _JsonlEncoder:
+    def encode(self, df: pd.DataFrame) -> bytes:
+        data = df.to_json(orient="records", lines=True)
+        if data and not data.endswith("\n"):
+            data += "\n"
+        return data.encode("utf-8")
+
+    def finish(self) -> bytes:
+        return b""
+
+
+class _BlockSink(io.RawIOBase):
+    # Collects what the Parquet writer wrote since the last drain, while
+    # reporting the total file position the writer records offsets with
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b) -> int:
+        self._parts.append(bytes(b))
+        self._position += len(b)
+        return len(b)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+class _ParquetEncoder:
+    def __init__(self):
+        try:
+            import pyarrow  # NOQA: F401
+        except ImportError:
+            raise ImportError(
+                "Parquet output requires pyarrow, pip install pyarrow")
+        self.sink = _BlockSink()
+        self.writer = None
+
+    def encode(self, df: pd.DataFrame) -> bytes:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self.writer is None:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            self.writer = pq.ParquetWriter(self.sink, table.schema)
+        else:
+            table = pa.Table.from_pandas(
+                df, schema=self.writer.schema, preserve_index=False)
+        self.writer.write_table(table)
+        return self.sink.drain()
+
+    def finish(self) -> bytes:
+        if self.writer is not None:
+            self.writer.close()
+        return self.sink.drain()
+
+
+def get_encoder(output_format: str):
+    encoders = {
+        "csv": _CsvEncoder,
+        "jsonl": _JsonlEncoder,
+        "parquet": _ParquetEncoder,
+    }
+    if output_format not in encoders:
+        raise ValueError("Unknown output format {}, expected one of {}".format(
+            output_format, OUTPUT_FORMATS))
+    return encoders[output_format]()
+
+
+def convert_stream(
+    stream,
+    columns: List[str],
+    output_format: str,
+    stage_block: Callable[[str, bytes], object],
+    chunk_rows: int = CHUNK_ROWS,
+    max_concurrency: int = 4,
+) -> dict:
+    """
+    Converts append_row output to output_format, block by block.
+
+    Parameters:
+    stream: binary file-like object with the append_row output
+    columns (list): column names
+    output_format (str): csv, jsonl or parquet
+    stage_block (callable): called with the id and content of each block,
+    from several threads
+    (optional) chunk_rows (int): rows per block
+    (optional) max_concurrency (int): blocks staged at once
+
+    Return:
+    Ids of the blocks in order, to commit, and the number of rows.
+    """
+    encoder = get_encoder(output_format)
+    block_ids = []
+    rows = 0
+    in_flight = set()
+    with ThreadPoolExecutor(max_concurrency) as pool:
+        def submit(data: bytes):
+            if not data:
+                return
+            # Block ids of a blob must all have the same length
+            block_id = "{:08d}".format(len(block_ids))
+            block_ids.append(block_id)
+            while len(in_flight) >= max_concurrency:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    in_flight.discard(future)
+                    future.result()
+            in_flight.add(pool.submit(stage_block, block_id, data))
+
+        for chunk in iter_append_row_chunks(stream, columns, chunk_rows):
+            rows += len(chunk)
+            submit(encoder.encode(chunk))
+        submit(encoder.finish())
+        for future in in_flight:
+            future.result()
+    return {"block_ids": block_ids, "rows": rows}
@@ -0,0 +1,215 @@
+"""
+prediction_cache.py
+
+Bounded cache of predictions for repeated feature rows. Rows are keyed by a
+64-bit hash of their values, seeded with the model id so that a new model
+version never returns the scores of the previous one. Hashes are computed
+for the whole batch at once; the batch is then split into cached rows and
+rows that still need to be predicted, and only the latter are passed to the
+model. Entries are evicted least recently used first once the cache is full,
+and expire after an optional time to live.
+
+Predictions, hashes, expiry times and last use are kept in arrays indexed
+by slot, with the hashes also sorted, so a batch is looked up with a binary
+search of its sorted hashes, and lookup, expiry, eviction and LRU updates
+are all array operations rather than a loop over rows. Last use is tracked
+per batch rather than per row.
+"""
+import hashlib
+import time
+from typing import Callable, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+
+class PredictionCache:
+    """
+    LRU/TTL cache of predictions for a single model.
+    """
+
+    def __init__(self, model_id: str, max_entries: int = 100000,
+                 ttl_seconds: float = None, clock: Callable = time.monotonic):
+        self.model_id = model_id
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._seed = np.uint64(int.from_bytes(
+            hashlib.sha256(model_id.encode("utf-8")).digest()[:8], "little"))
+        # Slots 0 to _size - 1 are in use, _index_keys are their hashes
+        # sorted and _index_slots the slot of each
+        self._size = 0
+        self._keys = np.empty(0, np.uint64)
+        self._index_keys = np.empty(0, np.uint64)
+        self._index_slots = np.empty(0, np.int64)
+        self._values = None
+        self._expires = np.empty(0)
+        self._used = np.empty(0, np.int64)
+        self._batches = 0
+        self.hits = 0
+        self.misses = 0
+        self.predicted_rows = 0
+        self.predict_seconds = 0.0
+
+    def row_hashes(self, X) -> np.ndarray:
+        """
+        Returns a uint64 hash of each row of X.
+        """
+        hashes = pd.util.hash_pandas_object(
+            pd.DataFrame(np.asarray(X)), index=False).to_numpy(dtype=np.uint64)
+        return hashes ^ self._seed
+
+    def _lookup(self, hashes: np.ndarray) -> np.ndarray:
+        # Slot of each hash, -1 if it is not cached. Searching for the
+        # hashes in sorted order is several times faster.
+        slots = np.full(len(hashes), -1, np.int64)
+        if self._size == 0 or len(hashes) == 0:
+            return slots
+        order = np.argsort(hashes)
+        wanted = hashes[order]
+        found = np.minimum(np.searchsorted(self._index_keys, wanted),
+                           self._size - 1)
+        match = self._index_keys[found] == wanted
+        slots[order[match]] = self._index_slots[found[match]]
+        return slots
+
+    def predict(self, X, predict: Callable) -> np.ndarray:
+        """
+        Returns the predictions for X, calling predict only for the rows
+        that are not cached, and caches their results.
+
+        Parameters:
+        X: 2D array of feature rows
+        predict (Callable): model prediction function
+
+        Return:
+        Predictions for every row of X, in order.
+        """
+        X = np.asarray(X)
+        hashes = self.row_hashes(X)
+        now = self._clock()
+        self._batches += 1
+        slots = self._lookup(hashes)
+        hit = slots >= 0
+        hit[hit] = self._expires[slots[hit]] > now
+        hit_slots = slots[hit]
+        self._used[hit_slots] = self._batches
+
+        n_hits = len(hit_slots)
+        self.hits += n_hits
+        self.misses += len(X) - n_hits
+        if n_hits == len(X):
+            return self._values[hit_slots] if n_hits else np.empty(0)
+        # Read before storing the misses, which may evict them
+        cached = self._values[hit_slots] if n_hits else None
+
+        miss = ~hit
+        start = time.perf_counter()
+        predicted = np.asarray(predict(X[miss]))
+        self.predict_seconds += time.perf_counter() - start
+        self.predicted_rows += len(predicted)
+        self._store(hashes[miss], slots[miss], predicted, now)
+
+        if n_hits == 0:
+            return predicted
+        result = np.empty((len(X),) + predicted.shape[1:], predicted.dtype)
+        result[miss] = predicted
+        result[hit] = cached
+        return result
+
+    def _store(self, hashes: np.ndarray, slots: np.ndarray,
+               values: np.ndarray, now: float):
+        # slots are those of expired entries the rows are stored in again,
+        # -1 for new rows. Rows repeated in the batch are stored once, and
+        # a batch larger than the cache keeps its last rows.
+        order = np.argsort(hashes)
+        repeated = hashes[order][1:] == hashes[order][:-1]
+        first = np.sort(order[np.concatenate([[True], ~repeated])])
+        first = first[-self.max_entries:]
+        (hashes, slots, values) = (hashes[first], slots[first], values[first])
+        new = slots < 0
+        n_new = int(new.sum())
+        size = self._size
+        n_appended = min(n_new, self.max_entries - size)
+        n_evicted = n_new - n_appended
+
+        evicted = np.empty(0, np.int64)
+        if n_evicted:
+            # Expired entries first, then the least recently used, but not
+            # the expired entries that are stored again
+            priority = np.where(
+                self._expires[:size] <= now, -1, self._used[:size])
+            priority[slots[~new]] = np.iinfo(np.int64).max
+            evicted = np.argpartition(priority, n_evicted - 1)[:n_evicted]
+        self._reserve(size + n_appended, values)
+        slots[new] = np.concatenate(
+            [np.arange(size, size + n_appended), evicted])
+        self._size = size + n_appended
+
+        self._keys[slots] = hashes
+        self._values[slots] = values
+        self._expires[slots] = np.inf if self.ttl_seconds is None \
+            else now + self.ttl_seconds
+        self._used[slots] = self._batches
+        self._index_slots = np.argsort(self._keys[:self._size])
+        self._index_keys = self._keys[self._index_slots]
+
+    def _reserve(self, size: int, values: np.ndarray):
+        # Grows the slot arrays geometrically, up to max_entries
+        capacity = len(self._keys)
+        if self._values is not None and size <= capacity:
+            return
+        capacity = min(self.max_entries, max(size, 2 * capacity, 1024))
+        grown = np.empty((capacity,) + values.shape[1:], values.dtype)
+        if self._values is not None:
+            grown[:len(self._values)] = self._values
+        self._values = grown
+        for name in ("_keys", "_expires", "_used"):
+            old = getattr(self, name)
+            array = np.empty(capacity, old.dtype)
+            array[:len(old)] = old
+            setattr(self, name, array)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def stats(self) -> dict:
+        """
+        Returns the hit rate and an estimate of the prediction time saved,
+        based on the measured time per predicted row.
+        """
+        lookups = self.hits + self.misses
+        seconds_per_row = self.predict_seconds / max(self.predicted_rows, 1)
+        return {
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+            "cache_hit_rate": self.hits / lookups if lookups else 0.0,
+            "cache_entries": self._size,
+            "cache_saved_seconds": self.hits * seconds_per_row,
+        }
+
+
+def create_cache(
+    model_id: str,
+    max_entries: Union[int, str, None],
+    ttl_seconds: Union[float, str, None] = None,
+) -> Optional[PredictionCache]:
+    """
+    Creates the prediction cache configured by a scoring script's settings,
+    which may be given as strings, e.g. command line arguments.
+
+    Parameters:
+    model_id (str): id of the model(s) the predictions are cached for
+    max_entries: entries cached at most, none or 0 disables the cache
+    (optional) ttl_seconds: time to live of an entry, none or 0 keeps
+    entries until they are evicted
+
+    Return:
+    PredictionCache, or None if the cache is disabled.
+    """
+    if not max_entries or int(max_entries) <= 0:
+        return None
+    return PredictionCache(
+        model_id,
+        max_entries=int(max_entries),
+        ttl_seconds=float(ttl_seconds or 0) or None)
@@ -0,0 +1,176 @@
+"""
+request_capture.py
+
+Captures a sample of the JSON requests to the scoring service, with their
+arrival times, so production traffic can be replayed against a new version
+of the service, see ml_service/util/replay_requests.py. Bulk requests are
+not captured: their bodies are streamed rather than read into memory, and
+may be binary, so captures and replays only cover JSON traffic.
+
+RequestCapture.capture only samples the request and puts it on a bounded
+queue; a background thread compresses and writes it, so capturing adds no
+I/O to the request path, and requests that find the queue full are dropped
+from the capture. Every scoring process appends to its own file in the
+capture directory, as gzip compressed JSON lines. The records are written
+in batches, each a complete gzip member, so a file can be read while it is
+being written and a crash loses at most the batch being collected.
+
+A record has the arrival time of the request in seconds since the epoch
+("t"), the headers that affect scoring ("headers") and the body ("body").
+"""
+import glob
+import gzip
+import json
+import os
+import queue
+import random
+import socket
+import threading
+import time
+from typing import Dict, Iterator, List
+
+CAPTURED_HEADERS = ("Content-Type", "X-Api-Version")
+FILE_PATTERN = "requests-*.jsonl.gz"
+
+
+class RequestCapture:
+    """
+    Sampled request capture with a background writer.
+
+    Parameters:
+    directory (str): directory the capture file is written to
+    (optional) sample_rate (float): fraction of requests captured
+    (optional) max_queue (int): requests waiting to be written, at most
+    (optional) batch_size (int): records per compressed batch, at most
+    (optional) flush_seconds (float): longest time a record waits for its
+    batch to be written
+    """
+
+    def __init__(self, directory: str, sample_rate: float = 1.0,
+                 max_queue: int = 1000, batch_size: int = 100,
+                 flush_seconds: float = 1.0, seed: int = None):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, FILE_PATTERN.replace(
+            "*", "{}-{}".format(socket.gethostname(), os.getpid())))
+        self.sample_rate = sample_rate
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._random = random.Random(seed)
+        self._queue = queue.Queue(max_queue)
+        self._lock = threading.Lock()
+        self.captured = 0
+        self.dropped = 0
+        self.written = 0
+        self._writer = threading.Thread(
+            target=self._write, daemon=True, name="request-capture")
+        self._writer.start()
+
+    def capture(self, body: bytes, headers, arrival: float = None) -> bool:
+        """
+        Samples a request and queues it to be written, without waiting.
+
+        Parameters:
+        body (bytes): request body
+        headers: request headers, only CAPTURED_HEADERS are kept
+        (optional) arrival (float): arrival time, now by default
+
+        Return:
+        Whether the request was queued.
+        """
+        if self._random.random() >= self.sample_rate:
+            return False
+        kept = {h: headers.get(h) for h in CAPTURED_HEADERS
+                if headers.get(h) is not None}
+        try:
+            self._queue.put_nowait((
+                time.time() if arrival is None else arrival, kept, body))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.captured += 1
+        return True
+
+    def _write(self):
+        batch = []
+        deadline = None
+        stopping = False
+        while not stopping:
+            timeout = None if deadline is None else max(
+                0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                stopping = True
+            elif item:
+                (arrival, headers, body) = item
+                batch.append(json.dumps({
+                    "t": arrival, "headers": headers,
+                    "body": body.decode("utf-8", errors="replace")}))
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_seconds
+            if batch and (stopping or len(batch) >= self.batch_size
+                          or time.monotonic() >= deadline):
+                self._flush(batch)
+                batch = []
+                deadline = None
+
+    def _flush(self, batch: List[str]):
+        data = gzip.compress(("\n".join(batch) + "\n").encode("utf-8"))
+        try:
+            with open(self.path, "ab") as f:
+                f.write(data)
+        except OSError as e:
+            print("Request capture failed: {}".format(e))
+            return
+        with self._lock:
+            self.written += len(batch)
+
+    def close(self):
+        """Writes the queued requests and stops the writer."""
+        self._queue.put(None)
+        self._writer.join()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Return:
+        Requests captured, dropped because the queue was full, and written.
+        """
+        with self._lock:
+            return {
+                "capture_captured": self.captured,
+                "capture_dropped": self.dropped,
+                "capture_written": self.written,
+            }
+
+
+def read_trace(path: str) -> List[dict]:
+    """
+    Reads captured requests, from a capture file or from every capture file
+    in a directory. Files not ending in .gz are read as plain JSON lines.
+
+    Parameters:
+    path (str): capture file or directory
+
+    Return:
+    Records in order of arrival.
+    """
+    paths = sorted(glob.glob(os.path.join(path, FILE_PATTERN))) \
+        if os.path.isdir(path) else [path]
+    records = [r for p in paths for r in _read_records(p)]
+    return sorted(records, key=lambda r: r["t"])
+
+
+def _read_records(path: str) -> Iterator[dict]:
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt") as f:
+        try:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        except EOFError:
+            # A batch still being written
+            return
@@ -0,0 +1,101 @@
+"""
+scoring_checkpoint.py
+
+Checkpoints for batch scoring. Each scored mini-batch (partition) is saved
+under a key derived from its content and the model that scored it, along
+with a manifest entry recording its row count and output location. When a
+failed job is resubmitted with the same checkpoint directory, partitions
+that already have an entry are returned from the checkpoint instead of
+being scored again.
+
+Every partition has its own manifest entry file, so workers on different
+nodes never write to the same file.
+"""
+import hashlib
+import json
+import os
+import time
+
+import pandas as pd
+
+
+class ScoringCheckpoint:
+    """
+    Manifest of completed partitions stored under a directory, typically
+    a mounted datastore path that outlives the pipeline run.
+    """
+
+    def __init__(self, checkpoint_dir: str, model_id: str):
+        self.checkpoint_dir = checkpoint_dir
+        self.model_id = model_id
+        self.manifest_dir = os.path.join(checkpoint_dir, "manifest")
+        self.output_dir = os.path.join(checkpoint_dir, "partitions")
+        os.makedirs(self.manifest_dir, exist_ok=True)
+        os.makedirs(self.output_dir, exist_ok=True)
+
+    def partition_key(self, mini_batch: pd.DataFrame) -> str:
+        """
+        Returns the key of a mini-batch: a hash of its columns, its rows
+        in order, and the model id.
+        """
+        sha = hashlib.sha256(self.model_id.encode("utf-8"))
+        sha.update(json.dumps([str(c) for c in mini_batch.columns]).encode())
+        sha.update(
+            pd.util.hash_pandas_object(mini_batch, index=False)
+            .to_numpy()
+            .tobytes())
+        return sha.hexdigest()[:32]
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.manifest_dir, key + ".json")
+
+    def is_complete(self, key: str) -> bool:
+        return os.path.exists(self._entry_path(key))
+
+    def load(self, key: str) -> pd.DataFrame:
+        """
+        Returns the saved scores of a completed partition.
+        """
+        with open(self._entry_path(key)) as f:
+            entry = json.load(f)
+        return pd.read_csv(
+            os.path.join(self.checkpoint_dir, entry["output_file"]))
+
+    def mark_complete(self, key: str, result: pd.DataFrame) -> dict:
+        """
+        Saves the scores of a partition, then records it in the manifest.
+        Both files are written under a temporary name and renamed, so a
+        worker that dies mid-write never leaves a partial entry behind.
+
+        Return:
+        The manifest entry.
+        """
+        output_file = os.path.join("partitions", key + ".csv")
+        output_path = os.path.join(self.checkpoint_dir, output_file)
+        result.to_csv(output_path + ".tmp", index=False)
+        os.replace(output_path + ".tmp", output_path)
+
+        entry = {
+            "key": key,
+            "model_id": self.model_id,
+            "rows": len(result),
+            "output_file": output_file,
+            "output_bytes": os.path.getsize(output_path),
+            "completed_at": time.time(),
+        }
+        entry_path = self._entry_path(key)
+        with open(entry_path + ".tmp", "w") as f:
+            json.dump(entry, f)
+        os.replace(entry_path + ".tmp", entry_path)
+        return entry
+
+    def entries(self) -> list:
+        """
+        Returns the manifest entries of all completed partitions.
+        """
+        entries = []
+        for name in sorted(os.listdir(self.manifest_dir)):
+            if name.endswith(".json"):
+                with open(os.path.join(self.manifest_dir, name)) as f:
+                    entries.append(json.load(f))
+        return entries
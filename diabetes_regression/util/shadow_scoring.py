@@ -0,0 +1,182 @@
+"""
+shadow_scoring.py
+
+Scores requests against a shadow model in the background, so a candidate
+model sees production traffic before it gets any weight. The scoring script
+answers each request with the primary model and then hands the request
+data, the primary predictions and their latency to ShadowScorer.submit,
+which only puts them on a bounded queue and returns. Worker threads take
+requests off the queue, score them against the shadow model and record both
+predictions and latencies, e.g. as JSON lines. When the workers fall behind
+and the queue is full, requests are dropped from shadow scoring and counted
+instead of waiting, so the shadow model never delays a response.
+"""
+import json
+import queue
+import threading
+import time
+from typing import Callable
+
+import numpy as np
+
+
+def compare_predictions(primary, shadow) -> dict:
+    """
+    Compares the predictions of the primary and shadow models for the same
+    rows.
+
+    Parameters:
+    primary: predictions of the primary model
+    shadow: predictions of the shadow model
+
+    Return:
+    Largest and mean absolute difference.
+    """
+    diff = np.abs(np.asarray(primary, dtype=np.float64)
+                  - np.asarray(shadow, dtype=np.float64))
+    if diff.size == 0:
+        return {"max_abs_diff": 0.0, "mean_abs_diff": 0.0}
+    return {"max_abs_diff": float(diff.max()),
+            "mean_abs_diff": float(diff.mean())}
+
+
+class JsonlRecorder:
+    """
+    Appends records to a JSON lines file. Called from the shadow workers,
+    so the file is written off the request path.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a")
+
+    def __call__(self, record: dict):
+        line = json.dumps(record) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class ShadowScorer:
+    """
+    Background shadow scoring with a bounded queue.
+
+    Parameters:
+    predict (callable): shadow prediction function, called with the request
+    data
+    record (callable): called with the record of each shadow scored request
+    (optional) max_queue (int): requests waiting for a worker, at most
+    (optional) workers (int): worker threads
+    """
+
+    def __init__(self, predict: Callable, record: Callable[[dict], None],
+                 max_queue: int = 100, workers: int = 1):
+        self._predict = predict
+        self._record = record
+        self._queue = queue.Queue(max_queue)
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.dropped = 0
+        self.scored = 0
+        self.failed = 0
+        self._workers = [
+            threading.Thread(target=self._work, daemon=True,
+                             name="shadow-scoring-{}".format(i))
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, data, primary, primary_ms: float,
+               request_id: str = "") -> bool:
+        """
+        Queues a request for shadow scoring without waiting.
+
+        Parameters:
+        data: request data, as passed to the primary model
+        primary: predictions of the primary model
+        primary_ms (float): primary prediction latency in ms
+        (optional) request_id (str): id to correlate the record with
+
+        Return:
+        False if the queue was full and the request was dropped.
+        """
+        try:
+            self._queue.put_nowait(
+                (data, primary, primary_ms, request_id, time.time()))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.submitted += 1
+        return True
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                self._score(*item)
+            finally:
+                self._queue.task_done()
+
+    def _score(self, data, primary, primary_ms: float, request_id: str,
+               received: float):
+        record = {
+            "request_id": request_id,
+            "received": received,
+            "primary_ms": primary_ms,
+            "primary": np.asarray(primary).tolist(),
+        }
+        start = time.perf_counter()
+        try:
+            shadow = self._predict(data)
+        except Exception as e:
+            record["error"] = "{}: {}".format(type(e).__name__, e)
+            with self._lock:
+                self.failed += 1
+        else:
+            record["shadow_ms"] = (time.perf_counter() - start) * 1000
+            record["shadow"] = np.asarray(shadow).tolist()
+            record.update(compare_predictions(primary, shadow))
+            with self._lock:
+                self.scored += 1
+        # Recording is best effort, a failing recorder must not stop the
+        # worker
+        try:
+            self._record(record)
+        except Exception as e:
+            print("Shadow record failed: {}".format(e))
+
+    def join(self):
+        """Waits until every queued request has been shadow scored."""
+        self._queue.join()
+
+    def close(self):
+        """Shadow scores the queued requests and stops the workers."""
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+
+    def stats(self) -> dict:
+        """
+        Return:
+        Requests submitted, dropped because the queue was full, scored and
+        failed, and the current queue length.
+        """
+        with self._lock:
+            return {
+                "shadow_submitted": self.submitted,
+                "shadow_dropped": self.dropped,
+                "shadow_scored": self.scored,
+                "shadow_failed": self.failed,
+                "shadow_queued": self._queue.qsize(),
+            }
@@ -0,0 +1,113 @@
+"""
+sharded_output.py
+
+Partitioned output layout for batch scoring. Each scoring worker writes its
+mini-batch results to its own shard file, optionally under hive style
+partition directories (for example date=2024-01-31/model=diabetes-3), and
+records the shard in a manifest entry next to it:
+
+    <output_dir>/<partition>/part-<worker>-<sequence>.csv
+    <output_dir>/_manifest/part-<worker>-<sequence>.json
+
+Workers never share a file, so no locking or concatenation is needed and
+consumers can read the shards listed in the manifest in parallel.
+"""
+import json
+import os
+import re
+import socket
+from datetime import date
+
+MANIFEST_DIR = "_manifest"
+PARTITION_KEYS = ("date", "model")
+
+
+def get_partition(partition_by: list, model_id: str, day: date = None) -> dict:
+    """
+    Returns the partition values for the requested partition keys.
+
+    Parameters:
+    partition_by (list): any of "date" and "model"
+    model_id (str): name and version of the scoring model
+    (optional) day (date): scoring date, today if not provided
+
+    Return:
+    Ordered mapping of partition key to value.
+    """
+    values = {
+        "date": (day or date.today()).isoformat(),
+        "model": re.sub(r"[^A-Za-z0-9_.-]", "-", model_id),
+    }
+    partition = {}
+    for key in partition_by:
+        if key not in values:
+            raise ValueError(
+                "Unknown partition key {}, expected one of {}".format(
+                    key, PARTITION_KEYS))
+        partition[key] = values[key]
+    return partition
+
+
+class ShardWriter:
+    """
+    Writes the mini-batch results of one worker process as separate shards.
+    """
+
+    def __init__(self, output_dir: str, partition: dict = None,
+                 worker_id: str = None):
+        self.output_dir = output_dir
+        self.partition = partition if partition is not None else {}
+        self.partition_path = "/".join(
+            "{}={}".format(k, v) for (k, v) in self.partition.items())
+        self.worker_id = worker_id or "{}-{}".format(
+            socket.gethostname(), os.getpid())
+        self._sequence = 0
+        os.makedirs(
+            os.path.join(output_dir, self.partition_path), exist_ok=True)
+        os.makedirs(os.path.join(output_dir, MANIFEST_DIR), exist_ok=True)
+
+    def write(self, result) -> dict:
+        """
+        Writes a scored DataFrame to a new shard and adds it to the
+        manifest. The shard is written under a temporary name and renamed
+        so readers never see a partial file.
+
+        Return:
+        The manifest entry of the shard.
+        """
+        name = "part-{}-{:05d}".format(self.worker_id, self._sequence)
+        self._sequence += 1
+        shard = "/".join(p for p in [self.partition_path, name + ".csv"] if p)
+        shard_path = os.path.join(self.output_dir, shard)
+        result.to_csv(shard_path + ".tmp", index=False)
+        os.replace(shard_path + ".tmp", shard_path)
+
+        entry = {
+            "path": shard,
+            "rows": len(result),
+            "bytes": os.path.getsize(shard_path),
+            "columns": [str(c) for c in result.columns],
+            "partition": self.partition,
+        }
+        entry_path = os.path.join(
+            self.output_dir, MANIFEST_DIR, name + ".json")
+        with open(entry_path + ".tmp", "w") as f:
+            json.dump(entry, f)
+        os.replace(entry_path + ".tmp", entry_path)
+        return entry
+
+
+def read_manifest(output_dir: str) -> dict:
+    """
+    Collects the manifest entries of every shard under output_dir.
+
+    Return:
+    Manifest with the list of shards and the total row count.
+    """
+    manifest_dir = os.path.join(output_dir, MANIFEST_DIR)
+    shards = []
+    for name in sorted(os.listdir(manifest_dir)):
+        if name.endswith(".json"):
+            with open(os.path.join(manifest_dir, name)) as f:
+                shards.append(json.load(f))
+    return {"shards": shards, "rows": sum(s["rows"] for s in shards)}
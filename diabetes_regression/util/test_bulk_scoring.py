@@ -0,0 +1,60 @@
+import io
+import json
+
+import numpy as np
+import pytest
+from diabetes_regression.util.bulk_scoring import (
+    iter_binary_chunks, iter_ndjson_chunks, score_binary, score_ndjson)
+
+
+def predict(X):
+    return X.sum(axis=1)
+
+
+def test_ndjson_is_scored_in_bounded_chunks():
+    rows = [[float(i), 1.0] for i in range(7)]
+    body = io.BytesIO(
+        b"\n".join(json.dumps(r).encode() for r in rows) + b"\n\n")
+
+    chunks = list(iter_ndjson_chunks(body, chunk_rows=3))
+    assert [len(c) for c in chunks] == [3, 3, 1]
+
+    output = b"".join(score_ndjson(iter(chunks), predict))
+    assert [float(v) for v in output.split()] == [r[0] + 1 for r in rows]
+
+
+def test_ndjson_error_is_reported_in_stream():
+    body = io.BytesIO(b"[1.0, 2.0]\n[1.0]\n")
+
+    output = b"".join(score_ndjson(iter_ndjson_chunks(body), predict))
+
+    assert "error" in json.loads(output.splitlines()[-1])
+
+
+def test_binary_round_trip():
+    X = np.arange(20, dtype=np.float32).reshape(10, 2)
+    body = io.BytesIO(X.tobytes())
+
+    chunks = list(iter_binary_chunks(body, 2, chunk_rows=4, dtype=np.float32))
+    assert [len(c) for c in chunks] == [4, 4, 2]
+
+    output = b"".join(score_binary(iter(chunks), predict, np.float32))
+    np.testing.assert_array_equal(
+        np.frombuffer(output, np.float32), predict(X))
+
+    with pytest.raises(ValueError):
+        list(iter_binary_chunks(io.BytesIO(X.tobytes()[:-1]), 2))
+
+
+def test_binary_error_ends_the_stream():
+    X = np.arange(8, dtype=np.float64).reshape(4, 2)
+    chunks = [X[:2], X[2:, :1]]
+
+    def predict_two_features(X):
+        if X.shape[1] != 2:
+            raise ValueError("Expected rows of 2 features")
+        return predict(X)
+
+    output = b"".join(score_binary(iter(chunks), predict_two_features))
+
+    np.testing.assert_array_equal(np.frombuffer(output), predict(X[:2]))
@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+from diabetes_regression.util.data_validation import (
+    profile_data, validate_data)
+
+
+def make_data():
+    return pd.DataFrame({
+        "age": [0.1, 0.3, 0.2],
+        "bmi": [-0.2, 0.2, 0.0],
+        "Y": [100, 150, 120],
+    })
+
+
+def test_profile_data():
+    profile = profile_data(make_data())
+
+    assert profile["rows"] == 3
+    assert profile["columns"]["bmi"] == {
+        "dtype": "float64", "missing": 0,
+        "mean": 0.0, "std": 0.2, "min": -0.2, "max": 0.2}
+
+
+def test_validate_data_accepts_valid_data():
+    assert validate_data(make_data(), min_rows=3) == []
+
+
+def test_validate_data_reports_every_problem():
+    df = make_data().drop(columns="Y")
+    df["sex"] = ["m", "f", "m"]
+    df.loc[0, "age"] = np.nan
+
+    problems = validate_data(df, min_rows=10)
+
+    assert len(problems) == 4
+    assert problems[0] == "3 rows, at least 10 required"
+    assert problems[-1] == "33.3% of age is missing"
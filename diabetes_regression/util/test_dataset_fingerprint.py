@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+from diabetes_regression.util.dataset_fingerprint import (
+    file_fingerprint, table_fingerprint)
+
+
+def write_frame(df, path):
+    df.to_csv(path, index=False)
+    return str(path)
+
+
+def make_frame():
+    rng = np.random.RandomState(0)
+    df = pd.DataFrame(rng.rand(50, 3), columns=["a", "b", "c"])
+    df["Y"] = rng.randint(0, 300, size=50)
+    return df
+
+
+def test_table_fingerprint_ignores_row_order_and_chunking(tmp_path):
+    df = make_frame()
+    original = write_frame(df, tmp_path / "original.csv")
+    shuffled = write_frame(
+        df.sample(frac=1, random_state=1), tmp_path / "shuffled.csv")
+
+    fingerprint = table_fingerprint(original)
+
+    assert table_fingerprint(shuffled, rows_per_chunk=7) == fingerprint
+    assert file_fingerprint(shuffled) != file_fingerprint(original)
+
+
+def test_table_fingerprint_detects_changes(tmp_path):
+    df = make_frame()
+    original = write_frame(df, tmp_path / "original.csv")
+    df.loc[3, "a"] += 1
+    changed = write_frame(df, tmp_path / "changed.csv")
+
+    assert table_fingerprint(changed) != table_fingerprint(original)
+
+
+def test_file_fingerprint_matches_across_chunk_sizes(tmp_path):
+    path = write_frame(make_frame(), tmp_path / "data.csv")
+
+    assert file_fingerprint(path, chunk_size=10) == file_fingerprint(path)
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+from diabetes_regression.util.feature_schema import (
+    SchemaError, SchemaValidator, get_validator, infer_schema)
+from diabetes_regression.util.model_artifact import LinearModel
+
+
+def make_schema():
+    df = pd.DataFrame({"age": [0.1, 0.3], "bmi": [-0.2, 0.2], "Y": [1, 2]})
+    return infer_schema(df)
+
+
+def test_infer_schema():
+    schema = make_schema()
+
+    assert [c["name"] for c in schema["columns"]] == ["age", "bmi"]
+    assert schema["columns"][1] == {
+        "name": "bmi", "dtype": "float64", "min": -0.2, "max": 0.2}
+
+
+def test_validate_reorders_columns():
+    validator = SchemaValidator(make_schema())
+    batch = pd.DataFrame({"bmi": [0.1, 0.0], "age": [0.2, 0.3]})
+
+    X = validator.validate(batch)
+
+    np.testing.assert_array_equal(X, [[0.2, 0.1], [0.3, 0.0]])
+    assert X.flags["C_CONTIGUOUS"]
+
+
+def test_validate_rejects_bad_batches():
+    validator = SchemaValidator(make_schema())
+
+    with pytest.raises(SchemaError):
+        validator.validate(pd.DataFrame({"age": [0.2]}))
+    with pytest.raises(SchemaError):
+        validator.validate(pd.DataFrame({"age": [0.2], "bmi": [0], "x": [1]}))
+    with pytest.raises(SchemaError):
+        validator.validate(pd.DataFrame({"age": ["a"], "bmi": [0.0]}))
+    with pytest.raises(SchemaError):
+        validator.validate([[0.2, 0.1, 0.0]])
+    with pytest.raises(SchemaError):
+        validator.validate([[0.2, np.nan]])
+
+
+def test_out_of_bounds_values():
+    validator = SchemaValidator(make_schema())
+    validator.validate([[0.2, 0.1], [5.0, 0.1], [0.0, 0.1]])
+    assert validator.out_of_bounds.tolist() == [2, 0]
+
+    strict = SchemaValidator(make_schema(), strict_bounds=True)
+    with pytest.raises(SchemaError):
+        strict.validate([[5.0, 0.1]])
+
+
+def test_get_validator_from_artifact_header():
+    header = {"metadata": {"feature_schema": make_schema()}}
+    model = LinearModel(np.ones(2, dtype=np.float32), 0.0, header=header)
+
+    assert get_validator(model).dtype == np.float32
+    assert get_validator(LinearModel(np.ones(2), 0.0)) is None
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from sklearn.linear_model import Ridge
+from diabetes_regression.util.model_artifact import (
+    load_model, read_header, save_model, verify_artifact)
+
+
+def fit_model(dtype=np.float64):
+    rng = np.random.RandomState(0)
+    X = rng.rand(40, 3).astype(dtype)
+    y = rng.rand(40).astype(dtype)
+    return Ridge(alpha=0.5).fit(X, y), X
+
+
+@pytest.mark.parametrize("dtype", [np.float64, np.float32])
+def test_save_and_load_model(tmp_path, dtype):
+    model, X = fit_model(dtype)
+    path = str(tmp_path / "model.pkl")
+
+    save_model(model, path, ["a", "b", "c"])
+    loaded = load_model(path, verify=True)
+
+    assert loaded.coef_.dtype == dtype
+    assert loaded.feature_names == ["a", "b", "c"]
+    np.testing.assert_allclose(
+        loaded.predict(X), model.predict(X), rtol=1e-6)
+
+
+def test_verify_artifact_detects_corruption(tmp_path):
+    model, _ = fit_model()
+    path = str(tmp_path / "model.pkl")
+    header = save_model(model, path)
+
+    assert read_header(path)["sha256"] == header["sha256"]
+    assert verify_artifact(path)["model_type"] == "Ridge"
+
+    with open(path, "r+b") as f:
+        f.seek(-1, 2)
+        f.write(b"\xff")
+    with pytest.raises(ValueError):
+        verify_artifact(path)
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+from diabetes_regression.util.model_artifact import LinearModel
+from diabetes_regression.util.model_stack import ModelStack
+from sklearn.tree import DecisionTreeRegressor
+
+
+def test_stacked_predictions_match_each_model():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(50, 4))
+    models = [
+        LinearModel(rng.normal(size=4), 0.5),
+        LinearModel(rng.normal(size=4).astype(np.float32), -1.0),
+    ]
+
+    stack = ModelStack(models, ["champion", "challenger"])
+    scores = stack.predict(X)
+
+    assert stack.is_stacked
+    assert scores.shape == (50, 2)
+    for (i, m) in enumerate(models):
+        np.testing.assert_allclose(scores[:, i], m.predict(X),
+                                   rtol=1e-5, atol=1e-5)
+
+
+def test_non_linear_models_are_scored_one_by_one():
+    X = np.arange(20.0).reshape(10, 2)
+    y = X.sum(axis=1)
+    tree = DecisionTreeRegressor().fit(X, y)
+    linear = LinearModel(np.ones(2), 0.0)
+
+    stack = ModelStack([tree, linear], ["tree", "linear"])
+
+    assert not stack.is_stacked
+    np.testing.assert_allclose(stack.predict(X), np.column_stack([y, y]))
+    with pytest.raises(ValueError):
+        ModelStack([linear], [])
@@ -0,0 +1,68 @@
+import io
+import json
+import threading
+import pandas as pd
+import pytest
+from diabetes_regression.util.output_conversion import (
+    COLUMNS_FILE, IterStream, convert_stream, write_columns)
+
+COLUMNS = ["age", "bmi", "score"]
+OUTPUT = b"0.1 0.2 150.5\n0.3 -0.1 120.0\n0.0 0.0 99.25\n"
+
+
+def convert(output_format, chunk_rows=2, stream=None):
+    blocks = {}
+    lock = threading.Lock()
+
+    def stage_block(block_id, data):
+        with lock:
+            blocks[block_id] = data
+
+    result = convert_stream(
+        stream or io.BytesIO(OUTPUT), COLUMNS, output_format, stage_block,
+        chunk_rows=chunk_rows, max_concurrency=2)
+    return result, b"".join(blocks[i] for i in result["block_ids"])
+
+
+def test_convert_to_csv_writes_one_header():
+    result, data = convert("csv")
+
+    assert result["rows"] == 3
+    assert result["block_ids"] == ["00000000", "00000001"]
+    assert data.decode().splitlines() == [
+        "age,bmi,score", "0.1,0.2,150.5", "0.3,-0.1,120.0", "0.0,0.0,99.25"]
+
+
+def test_convert_to_jsonl_from_chunked_stream():
+    chunks = [OUTPUT[i:i + 5] for i in range(0, len(OUTPUT), 5)]
+
+    _, data = convert("jsonl", stream=IterStream(chunks))
+
+    rows = [json.loads(line) for line in data.decode().splitlines()]
+    assert rows[2] == {"age": 0.0, "bmi": 0.0, "score": 99.25}
+    assert len(rows) == 3
+
+
+def test_convert_to_parquet():
+    pytest.importorskip("pyarrow")
+
+    _, data = convert("parquet")
+
+    df = pd.read_parquet(io.BytesIO(data))
+    assert list(df.columns) == COLUMNS
+    assert df["score"].tolist() == [150.5, 120.0, 99.25]
+
+
+def test_convert_empty_output_to_header():
+    result, data = convert("csv", stream=io.BytesIO(b""))
+
+    assert result["rows"] == 0
+    assert data == b"age,bmi,score\n"
+
+
+def test_write_columns(tmp_path):
+    write_columns(str(tmp_path), COLUMNS)
+    write_columns(str(tmp_path), ["other"])
+
+    with open(tmp_path / COLUMNS_FILE) as f:
+        assert json.load(f) == COLUMNS
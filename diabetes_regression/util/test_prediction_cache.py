@@ -0,0 +1,95 @@
+import numpy as np
+from diabetes_regression.util.prediction_cache import (
+    PredictionCache, create_cache)
+
+
+class Clock:
+    now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_predict(calls):
+    def predict(X):
+        calls.append(len(X))
+        return X.sum(axis=1)
+    return predict
+
+
+def test_only_misses_are_predicted():
+    calls = []
+    predict = make_predict(calls)
+    cache = PredictionCache("model:1")
+    X = np.arange(12.0).reshape(6, 2)
+
+    np.testing.assert_array_equal(cache.predict(X[:4], predict), [1, 5, 9, 13])
+    np.testing.assert_array_equal(
+        cache.predict(X[2:], predict), [9, 13, 17, 21])
+    np.testing.assert_array_equal(cache.predict(X[:2], predict), [1, 5])
+
+    assert calls == [4, 2]
+    stats = cache.stats()
+    assert (stats["cache_hits"], stats["cache_misses"]) == (4, 6)
+    assert stats["cache_hit_rate"] == 0.4
+
+
+def test_model_version_lru_and_ttl():
+    X = np.arange(6.0).reshape(3, 2)
+    assert not np.array_equal(PredictionCache("model:1").row_hashes(X),
+                              PredictionCache("model:2").row_hashes(X))
+
+    calls = []
+    predict = make_predict(calls)
+    clock = Clock()
+    cache = PredictionCache("model:1", max_entries=2, ttl_seconds=10,
+                            clock=clock)
+    cache.predict(X, predict)
+    assert len(cache) == 2
+
+    # the first row was evicted, the last one is still cached
+    cache.predict(X[2:], predict)
+    cache.predict(X[:1], predict)
+    assert calls == [3, 1]
+
+    clock.now = 11
+    cache.predict(X[:1], predict)
+    assert calls == [3, 1, 1]
+
+
+def test_batches_with_repeats_evictions_and_expiry_match_predict():
+    rng = np.random.default_rng(0)
+    rows = rng.normal(size=(300, 3))
+    calls = []
+    predict = make_predict(calls)
+    clock = Clock()
+    cache = PredictionCache("model:1", max_entries=100, ttl_seconds=5,
+                            clock=clock)
+
+    for _ in range(50):
+        clock.now += 1
+        X = rows[rng.integers(0, len(rows), size=rng.integers(0, 150))]
+        np.testing.assert_array_equal(cache.predict(X, predict), X.sum(axis=1))
+        assert len(cache) <= 100
+
+    stats = cache.stats()
+    assert stats["cache_hits"] > 0
+    assert stats["cache_misses"] == sum(calls)
+
+
+def test_create_cache_from_scoring_arguments():
+    # As passed by the batch scoring pipeline, a TTL of "0" never expires
+    cache = create_cache("model:1", "100", "0")
+    calls = []
+    predict = make_predict(calls)
+    X = np.arange(6.0).reshape(3, 2)
+
+    cache.predict(X, predict)
+    cache.predict(X, predict)
+
+    assert cache.ttl_seconds is None
+    assert calls == [3]
+    assert cache.stats()["cache_hits"] == 3
+    assert create_cache("model:1", "100", "2.5").ttl_seconds == 2.5
+    assert create_cache("model:1", "0", "0") is None
+    assert create_cache("model:1", None, None) is None
@@ -0,0 +1,36 @@
+import glob
+import os
+
+from diabetes_regression.util.request_capture import (
+    FILE_PATTERN, RequestCapture, read_trace)
+
+
+def test_captured_requests_are_read_in_order(tmp_path):
+    capture = RequestCapture(str(tmp_path), batch_size=2)
+    headers = {"Content-Type": "application/json", "Authorization": "x"}
+
+    assert capture.capture(b'{"data": [[2]]}', headers, arrival=2.0)
+    assert capture.capture(b'{"data": [[1]]}', headers, arrival=1.0)
+    assert capture.capture(b'{"data": [[3]]}', {}, arrival=3.0)
+    capture.close()
+
+    # Batches of 2 records are separate gzip members of one file
+    assert len(glob.glob(os.path.join(str(tmp_path), FILE_PATTERN))) == 1
+    trace = read_trace(str(tmp_path))
+    assert [r["t"] for r in trace] == [1.0, 2.0, 3.0]
+    assert trace[0] == {
+        "t": 1.0, "headers": {"Content-Type": "application/json"},
+        "body": '{"data": [[1]]}'}
+    assert read_trace(capture.path) == trace
+    assert capture.stats() == {
+        "capture_captured": 3, "capture_dropped": 0, "capture_written": 3}
+
+
+def test_sampling(tmp_path):
+    capture = RequestCapture(str(tmp_path), sample_rate=0.25, seed=0)
+
+    captured = sum(capture.capture(b"{}", {}) for _ in range(1000))
+    capture.close()
+
+    assert 200 < captured < 300
+    assert len(read_trace(str(tmp_path))) == captured
@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+from diabetes_regression.util.scoring_checkpoint import ScoringCheckpoint
+
+
+def test_resume_returns_saved_partition(tmp_path):
+    mini_batch = pd.DataFrame(
+        np.arange(12.0).reshape(4, 3), columns=["a", "b", "c"])
+    scored = mini_batch.assign(score=[1.5, 2.5, 3.5, 4.5])
+
+    checkpoint = ScoringCheckpoint(str(tmp_path), "model:1")
+    key = checkpoint.partition_key(mini_batch)
+    assert not checkpoint.is_complete(key)
+    checkpoint.mark_complete(key, scored)
+
+    resumed = ScoringCheckpoint(str(tmp_path), "model:1")
+    assert resumed.is_complete(key)
+    pd.testing.assert_frame_equal(resumed.load(key), scored)
+    assert [e["rows"] for e in resumed.entries()] == [4]
+
+
+def test_partition_key_depends_on_model_and_content(tmp_path):
+    mini_batch = pd.DataFrame({"a": [1.0, 2.0]})
+    checkpoint = ScoringCheckpoint(str(tmp_path / "v1"), "model:1")
+    other_model = ScoringCheckpoint(str(tmp_path / "v2"), "model:2")
+
+    key = checkpoint.partition_key(mini_batch)
+
+    assert key == checkpoint.partition_key(mini_batch.copy())
+    assert key != other_model.partition_key(mini_batch)
+    assert key != checkpoint.partition_key(mini_batch + 1)
@@ -0,0 +1,70 @@
+import json
+import threading
+import time
+
+import numpy as np
+from diabetes_regression.util.shadow_scoring import (
+    JsonlRecorder, ShadowScorer, compare_predictions)
+
+
+def test_compare_predictions():
+    assert compare_predictions([1.0, 2.0], [1.5, 1.0]) == {
+        "max_abs_diff": 1.0, "mean_abs_diff": 0.75}
+
+
+def test_records_both_predictions(tmp_path):
+    path = str(tmp_path / "shadow.jsonl")
+    recorder = JsonlRecorder(path)
+    shadow = ShadowScorer(
+        lambda data: np.asarray(data).sum(axis=1) + 1, recorder)
+
+    assert shadow.submit([[1, 2], [3, 4]], np.array([3.0, 7.0]), 0.5, "r1")
+    shadow.close()
+    recorder.close()
+
+    with open(path) as f:
+        records = [json.loads(line) for line in f]
+    assert len(records) == 1
+    assert records[0]["request_id"] == "r1"
+    assert records[0]["primary"] == [3.0, 7.0]
+    assert records[0]["shadow"] == [4, 8]
+    assert records[0]["max_abs_diff"] == 1.0
+    assert records[0]["shadow_ms"] >= 0
+    assert shadow.stats()["shadow_scored"] == 1
+
+
+def test_full_queue_drops_instead_of_waiting():
+    release = threading.Event()
+    records = []
+
+    def slow_predict(data):
+        release.wait()
+        return data
+
+    shadow = ShadowScorer(slow_predict, records.append, max_queue=1)
+    # The worker holds the first request, the queue the second
+    assert shadow.submit([1.0], [1.0], 0.1)
+    while shadow.stats()["shadow_queued"]:
+        time.sleep(0.001)
+    assert shadow.submit([2.0], [2.0], 0.1)
+    assert not shadow.submit([3.0], [3.0], 0.1)
+    release.set()
+    shadow.close()
+
+    stats = shadow.stats()
+    assert (stats["shadow_scored"], stats["shadow_dropped"]) == (2, 1)
+    assert len(records) == 2
+
+
+def test_failures_are_recorded():
+    records = []
+
+    def failing_predict(data):
+        raise ValueError("bad input")
+
+    shadow = ShadowScorer(failing_predict, records.append)
+    shadow.submit([1.0], [1.0], 0.1)
+    shadow.close()
+
+    assert records[0]["error"] == "ValueError: bad input"
+    assert shadow.stats()["shadow_failed"] == 1
@@ -0,0 +1,41 @@
+import os
+from datetime import date
+
+import pandas as pd
+import pytest
+from diabetes_regression.util.sharded_output import (
+    ShardWriter, get_partition, read_manifest)
+
+
+def test_get_partition():
+    partition = get_partition(
+        ["model", "date"], "diabetes:3", date(2024, 1, 31))
+
+    assert list(partition.items()) == [
+        ("model", "diabetes-3"), ("date", "2024-01-31")]
+    assert get_partition([], "diabetes:3") == {}
+    with pytest.raises(ValueError):
+        get_partition(["region"], "diabetes:3")
+
+
+def test_workers_write_separate_shards(tmp_path):
+    partition = {"date": "2024-01-31"}
+    writers = [ShardWriter(str(tmp_path), partition, worker_id=str(i))
+               for i in range(2)]
+    batches = [pd.DataFrame({"a": [1.0, 2.0], "score": [0.5, 1.5]}),
+               pd.DataFrame({"a": [3.0], "score": [2.5]})]
+
+    writers[0].write(batches[0])
+    writers[1].write(batches[1])
+    writers[0].write(batches[1])
+
+    manifest = read_manifest(str(tmp_path))
+    paths = [s["path"] for s in manifest["shards"]]
+    assert paths == ["date=2024-01-31/part-0-00000.csv",
+                     "date=2024-01-31/part-0-00001.csv",
+                     "date=2024-01-31/part-1-00000.csv"]
+    assert manifest["rows"] == 4
+    assert not [f for f in os.listdir(tmp_path / "date=2024-01-31")
+                if f.endswith(".tmp")]
+    pd.testing.assert_frame_equal(
+        pd.read_csv(tmp_path / paths[0]), batches[0])
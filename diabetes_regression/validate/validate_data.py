@@ -0,0 +1,106 @@
+"""
+Copyright (C) Microsoft Corporation. All rights reserved.​
+ ​
+Microsoft Corporation (“Microsoft”) grants you a nonexclusive, perpetual,
+royalty-free right to use, copy, and modify the software code provided by us
+("Software Code"). You may not sublicense the Software Code or any use of it
+(except to your affiliates and to vendors to perform work on your behalf)
+through distribution, network access, service agreement, lease, rental, or
+otherwise. This license does not purport to express any claim of ownership over
+data you may have shared with Microsoft in the creation of the Software Code.
+Unless applicable law gives you more rights, Microsoft reserves all other
+rights not expressly granted herein, whether by implication, estoppel or
+otherwise. ​
+ ​
+THE SOFTWARE CODE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS
+OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+MICROSOFT OR ITS LICENSORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR
+BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER
+IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+ARISING IN ANY WAY OUT OF THE USE OF THE SOFTWARE CODE, EVEN IF ADVISED OF THE
+POSSIBILITY OF SUCH DAMAGE.
+"""
+from azureml.core import Run, Dataset, Datastore
+import argparse
+import json
+import os
+import sys
+from util.data_validation import profile_data, validate_data
+
+
+def main():
+    print("Running validate_data.py")
+
+    parser = argparse.ArgumentParser("validate")
+    parser.add_argument(
+        "--dataset_name",
+        type=str,
+        help="Name of the training dataset",
+    )
+    parser.add_argument(
+        "--dataset_version",
+        type=str,
+        help="Version of the training dataset",
+    )
+    parser.add_argument(
+        "--data_file_path",
+        type=str,
+        help=("Data file the training step registers as a new dataset "
+              "version, validated in place if specified"),
+        default="none",
+    )
+    parser.add_argument(
+        "--step_output",
+        type=str,
+        help="Output for the baseline profile of the data",
+    )
+    args = parser.parse_args()
+
+    run = Run.get_context()
+    ws = run.experiment.workspace
+
+    # Load the validation parameters from the parameters file
+    with open("parameters.json") as f:
+        pars = json.load(f)
+    try:
+        validation_args = pars["validation"]
+    except KeyError:
+        print("Could not load validation values from file")
+        validation_args = {}
+
+    # The training step registers data_file_path itself, so it is read
+    # from the datastore here rather than registered twice
+    if args.data_file_path == "none":
+        dataset = Dataset.get_by_name(
+            ws, args.dataset_name, args.dataset_version)
+    else:
+        datastore = Datastore.get(ws, os.environ.get("DATASTORE_NAME"))
+        dataset = Dataset.Tabular.from_delimited_files(
+            path=(datastore, args.data_file_path))
+    df = dataset.to_pandas_dataframe()
+
+    # Write the baseline profile for the next step, and to the run outputs
+    # for history
+    profile = profile_data(df)
+    for path in (args.step_output, "outputs"):
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, "baseline_profile.json"), "w") as f:
+            json.dump(profile, f, indent=2)
+    run.log("rows", profile["rows"])
+    run.log("missing", sum(c["missing"] for c in profile["columns"].values()))
+
+    problems = validate_data(df, **validation_args)
+    if problems:
+        print("Training data is not valid:")
+        for problem in problems:
+            print("  " + problem)
+        sys.exit(1)
+    print("Training data is valid")
+    run.complete()
+
+
+if __name__ == '__main__':
+    main()
@@ -23,23 +23,22 @@ IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
 ARISING IN ANY WAY OUT OF THE USE OF THE SOFTWARE CODE, EVEN IF ADVISED OF THE
 POSSIBILITY OF SUCH DAMAGE.
 """
+from __future__ import annotations
+
+import argparse
 import os
-from azureml.pipeline.steps import ParallelRunConfig, ParallelRunStep
-from ml_service.util.manage_environment import get_environment
-from ml_service.pipelines.load_sample_data import create_sample_data_csv
+from ml_service.util.dry_run import add_dry_run_argument, dry_run
 from ml_service.util.env_variables import Env
-from ml_service.util.attach_compute import get_compute
-from azureml.core import (
-    Workspace,
-    Dataset,
-    Datastore,
-    RunConfiguration,
-)
-from azureml.pipeline.core import Pipeline, PipelineData, PipelineParameter
-from azureml.core.compute import ComputeTarget
-from azureml.data.datapath import DataPath
-from azureml.pipeline.steps import PythonScriptStep
-from typing import Tuple
+from typing import TYPE_CHECKING, Tuple
+from functools import partial
+
+# The Azure ML SDK is imported by the functions that use it, so --help and
+# --dry_run do not pay for importing it
+if TYPE_CHECKING:
+    from azureml.core import Workspace, Dataset, Datastore, RunConfiguration
+    from azureml.core.compute import ComputeTarget
+    from azureml.pipeline.core import Pipeline, PipelineData
+    from azureml.pipeline.steps import ParallelRunConfig
 
 
 def get_or_create_datastore(
@@ -58,6 +57,8 @@ def get_or_create_datastore(
 
     :raises: ValueError
     """
+    from azureml.core import Datastore
+
     if datastorename is None:
         raise ValueError("Datastore name is required.")
 
@@ -106,6 +107,8 @@ def get_input_dataset(ws: Workspace, ds: Datastore, env: Env) -> Dataset:
 
     :returns: Input Dataset
     """
+    from azureml.core import Dataset
+    from azureml.data.datapath import DataPath
 
     scoringinputds = Dataset.Tabular.from_delimited_files(
         path=DataPath(ds, env.scoring_datastore_input_filename)
@@ -136,6 +139,9 @@ def get_fallback_input_dataset(ws: Workspace, env: Env) -> Dataset:
 
     :raises: FileNotFoundError
     """
+    from azureml.core import Dataset
+    from ml_service.pipelines.load_sample_data import create_sample_data_csv
+
     # This call creates an example CSV from sklearn sample data. If you
     # have already bootstrapped your project, you can comment this line
     # out and use your own CSV.
@@ -186,6 +192,7 @@ def get_output_location(
 
     :returns: PipelineData wrapping the output datastore
     """
+    from azureml.pipeline.core import PipelineData
 
     if outputdatastore is None:
         output_loc = PipelineData(
@@ -233,22 +240,18 @@ def get_inputds_outputloc(
     return (scoringinputds, output_loc)
 
 
-def get_run_configs(
-    ws: Workspace, computetarget: ComputeTarget, env: Env
-) -> Tuple[ParallelRunConfig, RunConfiguration]:
+def get_scoring_environment(ws: Workspace, env: Env):
     """
-    Creates the necessary run configurations required by the
-    pipeline to enable parallelized scoring.
+    Gets or creates the conda environment for scoring.
 
     :param ws: AML Workspace
-    :param computetarget: AML Compute target
     :param env: Environment Variables
 
-    :returns: Tuple[Scoring Run configuration, Score copy run configuration]
+    :returns: AML Environment
     """
+    from ml_service.util.manage_environment import get_environment
 
-    # get a conda environment for scoring
-    environment = get_environment(
+    return get_environment(
         ws,
         env.aml_env_name_scoring,
         conda_dependencies_file=env.aml_env_score_conda_dep_file,
@@ -257,19 +260,19 @@ def get_run_configs(
         create_new=env.rebuild_env_scoring,
     )
 
-    score_run_config = ParallelRunConfig(
-        entry_script=env.batchscore_script_path,
-        source_directory=env.sources_directory_train,
-        error_threshold=10,
-        output_action="append_row",
-        compute_target=computetarget,
-        node_count=env.max_nodes_scoring,
-        environment=environment,
-        run_invocation_timeout=300,
-    )
 
-    copy_run_config = RunConfiguration()
-    copy_run_config.environment = get_environment(
+def get_score_copy_environment(ws: Workspace, env: Env):
+    """
+    Gets or creates the conda environment for copying the scores.
+
+    :param ws: AML Workspace
+    :param env: Environment Variables
+
+    :returns: AML Environment
+    """
+    from ml_service.util.manage_environment import get_environment
+
+    return get_environment(
         ws,
         env.aml_env_name_score_copy,
         conda_dependencies_file=env.aml_env_scorecopy_conda_dep_file,
@@ -277,6 +280,47 @@ def get_run_configs(
         use_gpu=env.use_gpu_for_scoring,
         create_new=env.rebuild_env_scoring,
     )
+
+
+def get_run_configs(
+    computetarget: ComputeTarget,
+    env: Env,
+    environment,
+    copy_environment,
+) -> Tuple[ParallelRunConfig, RunConfiguration]:
+    """
+    Creates the necessary run configurations required by the
+    pipeline to enable parallelized scoring.
+
+    :param computetarget: AML Compute target
+    :param env: Environment Variables
+    :param environment: AML Environment for scoring
+    :param copy_environment: AML Environment for copying the scores
+
+    :returns: Tuple[Scoring Run configuration, Score copy run configuration]
+    """
+    from azureml.core import RunConfiguration
+    from azureml.pipeline.steps import ParallelRunConfig
+
+    score_run_config = ParallelRunConfig(
+        entry_script=env.batchscore_script_path,
+        source_directory=env.sources_directory_train,
+        mini_batch_size=env.scoring_mini_batch_size,
+        error_threshold=env.scoring_error_threshold,
+        # with sharded output the workers write their own files and the
+        # runtime only keeps a summary
+        output_action="summary_only"
+        if env.scoring_output_layout == "sharded"
+        else "append_row",
+        compute_target=computetarget,
+        node_count=env.scoring_node_count or env.max_nodes_scoring,
+        process_count_per_node=env.scoring_process_count_per_node or None,
+        environment=environment,
+        run_invocation_timeout=env.scoring_run_invocation_timeout,
+    )
+
+    copy_run_config = RunConfiguration()
+    copy_run_config.environment = copy_environment
     return (score_run_config, copy_run_config)
 
 
@@ -304,6 +348,10 @@ def get_scoring_pipeline(
 
     :returns: Scoring pipeline instance
     """
+    from azureml.data.data_reference import DataReference
+    from azureml.pipeline.core import Pipeline, PipelineParameter
+    from azureml.pipeline.steps import ParallelRunStep, PythonScriptStep
+
     # To help filter the model make the model name, model version and a
     # tag/value pair bindable parameters so that they can be passed to
     # the pipeline when invoked either over REST or via the AML SDK.
@@ -319,11 +367,30 @@ def get_scoring_pipeline(
     model_tag_value_param = PipelineParameter(
         "model_tag_value", default_value=" "
     )  # NOQA: E501
+    # Comma separated name[:version] list of models, e.g. challengers,
+    # scored in the same pass over the input as the model above
+    additional_models_param = PipelineParameter(
+        "additional_models", default_value=" "
+    )  # NOQA: E501
+
+    # Scored partitions are checkpointed under a per-job id on the output
+    # datastore, so a failed job resubmitted with the same checkpoint_id
+    # only scores the partitions that are missing.
+    checkpoint_id_param = PipelineParameter(
+        "checkpoint_id", default_value=" "
+    )  # NOQA: E501
+    checkpoint_dir = DataReference(
+        datastore=output_loc.datastore,
+        data_reference_name="scoring_checkpoints",
+        path_on_datastore=env.scoring_checkpoint_path,
+        mode="mount",
+    )
 
     scoring_step = ParallelRunStep(
         name="scoringstep",
         inputs=[scoring_dataset],
         output=output_loc,
+        side_inputs=[checkpoint_dir],
         arguments=[
             "--model_name",
             model_name_param,
@@ -333,11 +400,30 @@ def get_scoring_pipeline(
             model_tag_name_param,
             "--model_tag_value",
             model_tag_value_param,
+            "--additional_models",
+            additional_models_param,
+            "--checkpoint_dir",
+            checkpoint_dir,
+            "--checkpoint_id",
+            checkpoint_id_param,
+            "--prediction_cache_size",
+            str(env.scoring_prediction_cache_size),
+            "--prediction_cache_ttl_seconds",
+            str(env.scoring_prediction_cache_ttl_seconds),
+            "--output_layout",
+            env.scoring_output_layout,
+            "--partition_by",
+            env.scoring_output_partition_by or " ",
         ],
         parallel_run_config=score_run_config,
         allow_reuse=False,
     )
 
+    # Sharded output is read where the scoring workers wrote it, so there
+    # is nothing to copy and scoring is the only step
+    if env.scoring_output_layout == "sharded":
+        return Pipeline(workspace=ws, steps=[scoring_step])
+
     copying_step = PythonScriptStep(
         name="scorecopystep",
         script_name=env.batchscore_copy_script_path,
@@ -361,6 +447,10 @@ def get_scoring_pipeline(
             env.scoring_datastore_access_key
             if env.scoring_datastore_access_key is not None
             else "",
+            "--output_layout",
+            env.scoring_output_layout,
+            "--output_format",
+            env.scoring_output_format,
         ],
         inputs=[output_loc],
         allow_reuse=False,
@@ -374,6 +464,16 @@ def build_batchscore_pipeline():
     """
     Main method that builds and publishes a scoring pipeline.
     """
+    parser = argparse.ArgumentParser("build_parallel_batchscore_pipeline")
+    add_dry_run_argument(parser)
+    args = parser.parse_args()
+    if args.dry_run:
+        dry_run("scoring")
+        return
+
+    from azureml.core import Workspace
+    from ml_service.util.attach_compute import get_compute
+    from ml_service.util.provisioning import provision
 
     try:
         env = Env()
@@ -385,20 +485,32 @@ def build_batchscore_pipeline():
             resource_group=env.resource_group,
         )
 
-        # Get Azure machine learning cluster
-        aml_compute_score = get_compute(
-            aml_workspace,
-            env.compute_name_scoring,
-            env.vm_size_scoring,
-            for_batch_scoring=True,
+        # Get Azure machine learning cluster, the scoring and score copy
+        # environments, and the scoring input and output, concurrently
+        resources = provision(
+            compute=partial(
+                get_compute,
+                aml_workspace,
+                env.compute_name_scoring,
+                env.vm_size_scoring,
+                for_batch_scoring=True,
+            ),
+            scoring_environment=partial(
+                get_scoring_environment, aml_workspace, env
+            ),
+            score_copy_environment=partial(
+                get_score_copy_environment, aml_workspace, env
+            ),
+            data=partial(get_inputds_outputloc, aml_workspace, env),
         )
-
-        input_dataset, output_location = get_inputds_outputloc(
-            aml_workspace, env
-        )  # NOQA: E501
+        aml_compute_score = resources["compute"]
+        input_dataset, output_location = resources["data"]
 
         scoring_runconfig, score_copy_runconfig = get_run_configs(
-            aml_workspace, aml_compute_score, env
+            aml_compute_score,
+            env,
+            resources["scoring_environment"],
+            resources["score_copy_environment"],
         )
 
         scoring_pipeline = get_scoring_pipeline(
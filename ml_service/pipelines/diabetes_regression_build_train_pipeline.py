@@ -1,16 +1,217 @@
-from azureml.pipeline.core.graph import PipelineParameter
-from azureml.pipeline.steps import PythonScriptStep
-from azureml.pipeline.core import Pipeline, PipelineData
-from azureml.core import Workspace, Dataset, Datastore
-from azureml.core.runconfig import RunConfiguration
-from ml_service.pipelines.load_sample_data import create_sample_data_csv
-from ml_service.util.attach_compute import get_compute
+from ml_service.util.dry_run import add_dry_run_argument, dry_run
 from ml_service.util.env_variables import Env
-from ml_service.util.manage_environment import get_environment
+from functools import partial
+import argparse
 import os
 
 
+def get_train_steps(
+    e: Env,
+    step_class,
+    data_class,
+    params: dict,
+    dataset_name: str,
+    datastore=None,
+    **step_args
+) -> list:
+    """
+    Declares the pipeline steps, so the same steps run in AML and locally.
+    Dependencies are declared through the data the steps pass each other,
+    so data validation runs alongside training, and only control
+    dependencies use run_after.
+
+    :param e: Environment variables
+    :param step_class: PythonScriptStep, or LocalPythonScriptStep
+    :param data_class: PipelineData, or LocalPipelineData
+    :param params: Value of each pipeline parameter, by name
+    :param dataset_name: Name of the training dataset
+    :param datastore: Datastore of the data passed between steps
+    :param step_args: Further arguments of every step, e.g. compute_target
+
+    :returns: Steps
+    """
+    # Create a PipelineData to pass data between steps
+    pipeline_data = data_class("pipeline_data", datastore=datastore)
+
+    train_step = step_class(
+        name="Train Model",
+        script_name=e.train_script_path,
+        source_directory=e.sources_directory_train,
+        outputs=[pipeline_data],
+        arguments=[
+            "--model_name",
+            params["model_name"],
+            "--step_output",
+            pipeline_data,
+            "--dataset_version",
+            params["dataset_version"],
+            "--data_file_path",
+            params["data_file_path"],
+            "--caller_run_id",
+            params["caller_run_id"],
+            "--dataset_name",
+            dataset_name,
+            "--use_cache",
+            e.use_train_cache,
+        ],
+        allow_reuse=True,
+        **step_args,
+    )
+    print("Step Train created")
+    steps = [train_step]
+    register_inputs = [pipeline_data]
+
+    # The data is validated and profiled while the model trains, and the
+    # model is only registered if the data is valid
+    if e.validate_script_path:
+        validation_data = data_class("validation_data", datastore=datastore)
+        validate_step = step_class(
+            name="Validate Data",
+            script_name=e.validate_script_path,
+            source_directory=e.sources_directory_train,
+            outputs=[validation_data],
+            arguments=[
+                "--dataset_name",
+                dataset_name,
+                "--dataset_version",
+                params["dataset_version"],
+                "--data_file_path",
+                params["data_file_path"],
+                "--step_output",
+                validation_data,
+            ],
+            allow_reuse=True,
+            **step_args,
+        )
+        print("Step Validate created")
+        steps.append(validate_step)
+        register_inputs.append(validation_data)
+
+    register_step = step_class(
+        name="Register Model ",
+        script_name=e.register_script_path,
+        source_directory=e.sources_directory_train,
+        inputs=register_inputs,
+        arguments=["--model_name", params["model_name"], "--step_input", pipeline_data, ],  # NOQA: E501
+        allow_reuse=False,
+        **step_args,
+    )
+    print("Step Register created")
+
+    # Check run_evaluation flag to include or exclude evaluation step.
+    if (e.run_evaluation).lower() == "true":
+        print("Include evaluation step before register step.")
+        evaluate_step = step_class(
+            name="Evaluate Model ",
+            script_name=e.evaluate_script_path,
+            source_directory=e.sources_directory_train,
+            inputs=[pipeline_data],
+            arguments=[
+                "--model_name",
+                params["model_name"],
+                "--allow_run_cancel",
+                e.allow_run_cancel,
+            ],
+            allow_reuse=False,
+            **step_args,
+        )
+        print("Step Evaluate created")
+        # Evaluation cancels the run rather than passing data on, so
+        # registration waits for it explicitly
+        register_step.run_after(evaluate_step)
+        steps.append(evaluate_step)
+    else:
+        print("Exclude evaluation step and directly run register step.")
+    steps.append(register_step)
+
+    return steps
+
+
+def run_local(e: Env, in_process: bool = False) -> str:
+    """
+    Runs the training pipeline steps locally, against the filesystem
+    registry at LOCAL_REGISTRY_PATH instead of the AML workspace.
+
+    :param e: Environment variables
+    :param in_process: Run the steps in this process, one at a time
+
+    :returns: Status of the pipeline run
+    """
+    from ml_service.pipelines.load_sample_data import create_sample_data_csv
+    from ml_service.util.local_pipeline import (
+        LocalPipeline, LocalPipelineData, LocalPythonScriptStep)
+    from ml_service.util.local_registry import (
+        DEFAULT_DATASTORE, LocalRegistry)
+
+    e.validate("local")
+    registry = LocalRegistry(e.local_registry_path)
+    datastore_name = e.datastore_name or DEFAULT_DATASTORE
+    os.environ["DATASTORE_NAME"] = datastore_name
+
+    dataset_name = e.dataset_name
+    if dataset_name not in registry.dataset_names():
+        create_sample_data_csv()
+        paths = registry.upload_files(
+            ["diabetes.csv"], "training-data/", datastore_name)
+        registry.register_dataset(
+            dataset_name, paths, datastore_name, tags={"format": "CSV"},
+            description="diabetes training data")
+
+    steps = get_train_steps(
+        e,
+        LocalPythonScriptStep,
+        LocalPipelineData,
+        {
+            "model_name": e.model_name,
+            "dataset_version": e.dataset_version,
+            "data_file_path": "none",
+            "caller_run_id": "none",
+        },
+        dataset_name,
+    )
+    tags = {"BuildId": e.build_id} if e.build_id else {}
+    statuses = LocalPipeline(steps, registry, in_process=in_process).run(
+        e.experiment_name or "local", tags=tags)
+    return statuses["pipeline"]
+
+
 def main():
+    parser = argparse.ArgumentParser("build_train_pipeline")
+    add_dry_run_argument(parser)
+    parser.add_argument(
+        "--local",
+        action="store_true",
+        help="Run the pipeline steps locally instead of publishing the "
+        "pipeline, see ml_service/util/local_pipeline.py",
+    )
+    parser.add_argument(
+        "--in_process",
+        action="store_true",
+        help="With --local, run the steps in this process so a debugger "
+        "can step into them",
+    )
+    args = parser.parse_args()
+    if args.dry_run:
+        dry_run("local" if args.local else "train")
+        return
+    if args.local:
+        # A run canceled by the evaluation step, because the new model is
+        # not better, is not an error
+        if run_local(Env(), args.in_process) == "Failed":
+            exit(1)
+        return
+
+    # The Azure ML SDK is only imported once it is needed
+    from azureml.pipeline.core.graph import PipelineParameter
+    from azureml.pipeline.steps import PythonScriptStep
+    from azureml.pipeline.core import Pipeline, PipelineData
+    from azureml.core import Workspace, Dataset, Datastore
+    from azureml.core.runconfig import RunConfiguration
+    from ml_service.pipelines.load_sample_data import create_sample_data_csv
+    from ml_service.util.attach_compute import get_compute
+    from ml_service.util.manage_environment import get_environment
+    from ml_service.util.provisioning import provision
+
     e = Env()
     # Get Azure machine learning workspace
     aml_workspace = Workspace.get(
@@ -21,19 +222,24 @@ def main():
     print("get_workspace:")
     print(aml_workspace)
 
-    # Get Azure machine learning cluster
-    aml_compute = get_compute(aml_workspace, e.compute_name, e.vm_size)
+    # Get Azure machine learning cluster and create a reusable Azure ML
+    # environment, concurrently
+    resources = provision(
+        compute=partial(
+            get_compute, aml_workspace, e.compute_name, e.vm_size),
+        environment=partial(
+            get_environment,
+            aml_workspace,
+            e.aml_env_name,
+            conda_dependencies_file=e.aml_env_train_conda_dep_file,
+            create_new=e.rebuild_env,
+        ),
+    )
+    aml_compute = resources["compute"]
     if aml_compute is not None:
         print("aml_compute:")
         print(aml_compute)
-
-    # Create a reusable Azure ML environment
-    environment = get_environment(
-        aml_workspace,
-        e.aml_env_name,
-        conda_dependencies_file=e.aml_env_train_conda_dep_file,
-        create_new=e.rebuild_env,
-    )  #
+    environment = resources["environment"]
     run_config = RunConfiguration()
     run_config.environment = environment
 
@@ -96,73 +302,21 @@ def main():
             create_new_version=True,
         )
 
-    # Create a PipelineData to pass data between steps
-    pipeline_data = PipelineData(
-        "pipeline_data", datastore=aml_workspace.get_default_datastore()
-    )
-
-    train_step = PythonScriptStep(
-        name="Train Model",
-        script_name=e.train_script_path,
-        compute_target=aml_compute,
-        source_directory=e.sources_directory_train,
-        outputs=[pipeline_data],
-        arguments=[
-            "--model_name",
-            model_name_param,
-            "--step_output",
-            pipeline_data,
-            "--dataset_version",
-            dataset_version_param,
-            "--data_file_path",
-            data_file_path_param,
-            "--caller_run_id",
-            caller_run_id_param,
-            "--dataset_name",
-            dataset_name,
-        ],
-        runconfig=run_config,
-        allow_reuse=True,
-    )
-    print("Step Train created")
-
-    evaluate_step = PythonScriptStep(
-        name="Evaluate Model ",
-        script_name=e.evaluate_script_path,
+    steps = get_train_steps(
+        e,
+        PythonScriptStep,
+        PipelineData,
+        {
+            "model_name": model_name_param,
+            "dataset_version": dataset_version_param,
+            "data_file_path": data_file_path_param,
+            "caller_run_id": caller_run_id_param,
+        },
+        dataset_name,
+        datastore=aml_workspace.get_default_datastore(),
         compute_target=aml_compute,
-        source_directory=e.sources_directory_train,
-        arguments=[
-            "--model_name",
-            model_name_param,
-            "--allow_run_cancel",
-            e.allow_run_cancel,
-        ],
         runconfig=run_config,
-        allow_reuse=False,
     )
-    print("Step Evaluate created")
-
-    register_step = PythonScriptStep(
-        name="Register Model ",
-        script_name=e.register_script_path,
-        compute_target=aml_compute,
-        source_directory=e.sources_directory_train,
-        inputs=[pipeline_data],
-        arguments=["--model_name", model_name_param, "--step_input", pipeline_data, ],  # NOQA: E501
-        runconfig=run_config,
-        allow_reuse=False,
-    )
-    print("Step Register created")
-    # Check run_evaluation flag to include or exclude evaluation step.
-    if (e.run_evaluation).lower() == "true":
-        print("Include evaluation step before register step.")
-        evaluate_step.run_after(train_step)
-        register_step.run_after(evaluate_step)
-        steps = [train_step, evaluate_step, register_step]
-    else:
-        print("Exclude evaluation step and directly run register step.")
-        register_step.run_after(train_step)
-        steps = [train_step, register_step]
 
     train_pipeline = Pipeline(workspace=aml_workspace, steps=steps)
     train_pipeline._set_experiment_name
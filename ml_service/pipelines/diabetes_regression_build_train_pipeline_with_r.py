@@ -1,13 +1,31 @@
-from azureml.pipeline.steps import PythonScriptStep
-from azureml.pipeline.core import Pipeline
-from azureml.core import Workspace
-from azureml.core.runconfig import RunConfiguration
-from ml_service.util.attach_compute import get_compute
+from ml_service.util.dry_run import add_dry_run_argument, dry_run
 from ml_service.util.env_variables import Env
-from ml_service.util.manage_environment import get_environment
+from functools import partial
+import argparse
 
 
 def main():
+    parser = argparse.ArgumentParser("build_train_pipeline_with_r")
+    add_dry_run_argument(parser)
+    args = parser.parse_args()
+    if args.dry_run:
+        # The R script and its source directory are fixed
+        dry_run("train", required=[
+            "workspace_name", "resource_group", "subscription_id",
+            "compute_name", "vm_size", "aml_env_name",
+            "sources_directory_train", "pipeline_name",
+        ])
+        return
+
+    # The Azure ML SDK is only imported once it is needed
+    from azureml.pipeline.steps import PythonScriptStep
+    from azureml.pipeline.core import Pipeline
+    from azureml.core import Workspace
+    from azureml.core.runconfig import RunConfiguration
+    from ml_service.util.attach_compute import get_compute
+    from ml_service.util.manage_environment import get_environment
+    from ml_service.util.provisioning import provision
+
     e = Env()
     # Get Azure machine learning workspace
     aml_workspace = Workspace.get(
@@ -18,21 +36,26 @@ def main():
     print("get_workspace:")
     print(aml_workspace)
 
-    # Get Azure machine learning cluster
-    aml_compute = get_compute(aml_workspace, e.compute_name, e.vm_size)
+    # Get Azure machine learning cluster and create a reusable Azure ML
+    # environment, concurrently
+    # Make sure to include `r-essentials'
+    #   in diabetes_regression/conda_dependencies.yml
+    resources = provision(
+        compute=partial(
+            get_compute, aml_workspace, e.compute_name, e.vm_size),
+        environment=partial(
+            get_environment,
+            aml_workspace,
+            e.aml_env_name,
+            conda_dependencies_file=e.aml_env_train_conda_dep_file,
+            create_new=e.rebuild_env,
+        ),
+    )
+    aml_compute = resources["compute"]
     if aml_compute is not None:
         print("aml_compute:")
         print(aml_compute)
-
-    # Create a reusable Azure ML environment
-    # Make sure to include `r-essentials'
-    #   in diabetes_regression/conda_dependencies.yml
-    environment = get_environment(
-        aml_workspace,
-        e.aml_env_name,
-        conda_dependencies_file=e.aml_env_train_conda_dep_file,
-        create_new=e.rebuild_env,
-    )  # NOQA: E501
+    environment = resources["environment"]
     run_config = RunConfiguration()
     run_config.environment = environment
 
@@ -1,11 +1,27 @@
-from azureml.pipeline.core import Pipeline
-from azureml.core import Workspace
-from ml_service.util.attach_compute import get_compute
-from azureml.pipeline.steps import DatabricksStep
+from ml_service.util.dry_run import add_dry_run_argument, dry_run
 from ml_service.util.env_variables import Env
+import argparse
 
 
 def main():
+    parser = argparse.ArgumentParser(
+        "build_train_pipeline_with_r_on_dbricks")
+    add_dry_run_argument(parser)
+    args = parser.parse_args()
+    if args.dry_run:
+        # The R script and its source directory are fixed
+        dry_run("train", required=[
+            "workspace_name", "resource_group", "subscription_id",
+            "compute_name", "vm_size", "db_cluster_id", "pipeline_name",
+        ])
+        return
+
+    # The Azure ML SDK is only imported once it is needed
+    from azureml.pipeline.core import Pipeline
+    from azureml.core import Workspace
+    from ml_service.util.attach_compute import get_compute
+    from azureml.pipeline.steps import DatabricksStep
+
     e = Env()
     # Get Azure machine learning workspace
     aml_workspace = Workspace.get(
@@ -1,7 +1,20 @@
+import argparse
+import os
+import time
+from statistics import NormalDist
+from typing import Iterator, List
 
+import numpy as np
 import pandas as pd
 from sklearn.datasets import load_diabetes
 
+# Rows generated and written at a time by the synthetic data generator
+CHUNK_ROWS = 1000000
+# Rows drawn from each random stream. The streams are fixed by the seed and
+# the row offset, so the rows do not depend on the chunk size.
+BLOCK_ROWS = 100000
+TARGET = "Y"
+
 
 # Loads the diabetes sample data from sklearn and produces a csv file that can
 # be used by the build/train pipeline script.
@@ -16,3 +29,218 @@ def create_sample_data_csv(file_name: str = "diabetes.csv",
     # Hard code to diabetes so we fail fast if the project has been
     # bootstrapped.
     df.to_csv(file_name, index=False)
+
+
+class _SampleModel:
+    # Multivariate normal fitted to the sklearn sample features, with sex
+    # thresholded back to its two values, and a linear target with normal
+    # residuals, so synthetic rows have the correlations and the target
+    # relationship of the real ones
+    def __init__(self):
+        sample_data = load_diabetes()
+        X = sample_data.data
+        y = sample_data.target
+        self.columns = list(sample_data.feature_names)
+        self.mean = X.mean(axis=0)
+        self.std = X.std(axis=0)
+        self.cov = np.cov(X, rowvar=False)
+        design = np.c_[X, np.ones(len(X))]
+        coef, _, _, _ = np.linalg.lstsq(design, y, rcond=None)
+        self.coef = coef[:-1]
+        self.intercept = coef[-1]
+        self.noise = float(np.std(y - design @ coef))
+
+        sex = self.columns.index("sex")
+        self.sex_values = np.unique(X[:, sex])
+        high_fraction = np.mean(X[:, sex] == self.sex_values[1])
+        self.sex_threshold = self.mean[sex] + self.std[sex] * \
+            NormalDist().inv_cdf(1 - high_fraction)
+
+
+def generate_sample_data(
+    rows: int,
+    seed: int = 42,
+    drift: float = 0.0,
+    drift_columns: List[str] = None,
+    missing_fraction: float = 0.0,
+    for_scoring: bool = False,
+    chunk_rows: int = CHUNK_ROWS,
+) -> Iterator[pd.DataFrame]:
+    """
+    Generates synthetic rows with the schema of the diabetes sample data,
+    chunk by chunk, so any number of rows can be generated in constant
+    memory. The same arguments always generate the same rows, whatever the
+    chunk size.
+
+    :param rows: Number of rows
+    :param seed: Random seed
+    :param drift: Shift of the feature means by the last row, in standard
+        deviations. The means move linearly from the first row, so later
+        rows drift further from the training distribution.
+    :param drift_columns: Features that drift, all if None
+    :param missing_fraction: Fraction of feature values left empty, at
+        random. The target is never missing.
+    :param for_scoring: Leave out the target column
+    :param chunk_rows: Rows per DataFrame
+    :returns: DataFrames of at most chunk_rows rows
+    :raises: ValueError for fewer than one row, unknown drift columns or
+        a missing fraction outside [0, 1]
+    """
+    model = _SampleModel()
+    if rows < 1:
+        raise ValueError("rows must be at least 1")
+    if not 0.0 <= missing_fraction <= 1.0:
+        raise ValueError("missing_fraction must be between 0 and 1")
+    unknown = set(drift_columns or []) - set(model.columns)
+    if unknown:
+        raise ValueError("Unknown drift columns {}".format(sorted(unknown)))
+    drifting = np.array([
+        drift_columns is None or c in drift_columns for c in model.columns])
+    sex = model.columns.index("sex")
+
+    def block(index: int, start: int) -> pd.DataFrame:
+        # Features, target noise and missing values each have their own
+        # stream, so a block can be generated without the ones before it
+        streams = [np.random.default_rng(s) for s in
+                   np.random.SeedSequence([seed, index]).spawn(3)]
+        n = min(BLOCK_ROWS, rows - start)
+        X = streams[0].multivariate_normal(model.mean, model.cov, size=n)
+        if drift:
+            progress = np.arange(start, start + n) / max(rows - 1, 1)
+            X += np.outer(progress * drift, model.std * drifting)
+        X[:, sex] = np.where(X[:, sex] > model.sex_threshold,
+                             model.sex_values[1], model.sex_values[0])
+        y = np.round(model.intercept + X @ model.coef
+                     + streams[1].normal(0.0, model.noise, size=n))
+        # Adding 0.0 turns the -0.0 of rounded small negatives into 0.0
+        y = np.maximum(y, 0.0) + 0.0
+        if missing_fraction:
+            X[streams[2].random(X.shape) < missing_fraction] = np.nan
+        df = pd.DataFrame(X, columns=model.columns)
+        if not for_scoring:
+            df[TARGET] = y
+        return df
+
+    # Blocks are collected until they fill a chunk, then split into chunks
+    parts = []
+    buffered = 0
+    for (index, start) in enumerate(range(0, rows, BLOCK_ROWS)):
+        parts.append(block(index, start))
+        buffered += len(parts[-1])
+        last = start + BLOCK_ROWS >= rows
+        if buffered < chunk_rows and not last:
+            continue
+        df = pd.concat(parts, ignore_index=True) \
+            if len(parts) > 1 else parts[0]
+        offset = 0
+        while len(df) - offset >= chunk_rows or (last and offset < len(df)):
+            yield df.iloc[offset:offset + chunk_rows].reset_index(drop=True)
+            offset += chunk_rows
+        parts = [df.iloc[offset:]] if offset < len(df) else []
+        buffered = len(df) - offset
+
+
+def _format_csv(df: pd.DataFrame) -> str:
+    # Python's shortest round-trip repr, like pandas, with missing values
+    # left empty. Formatting columns of strings and joining them is about
+    # twice as fast as DataFrame.to_csv.
+    columns = []
+    for c in df.columns:
+        values = df[c].to_numpy()
+        strings = list(map(repr, values.tolist()))
+        for i in np.flatnonzero(np.isnan(values)).tolist():
+            strings[i] = ""
+        columns.append(strings)
+    return "\n".join(map(",".join, zip(*columns))) + "\n"
+
+
+def create_synthetic_data(
+    file_name: str,
+    rows: int,
+    file_format: str = None,
+    **kwargs
+) -> int:
+    """
+    Writes synthetic sample data to a CSV or Parquet file, one chunk at a
+    time, see generate_sample_data for the other arguments.
+
+    :param file_format: csv or parquet, from the file extension if None
+    :returns: Number of rows written
+    """
+    file_format = file_format or \
+        os.path.splitext(file_name)[1].lstrip(".").lower()
+    if file_format not in ("csv", "parquet"):
+        raise ValueError(
+            "Unknown file format {}, expected csv or parquet".format(
+                file_format))
+    written = 0
+    chunks = generate_sample_data(rows, **kwargs)
+    if file_format == "csv":
+        # Formatted the same way whatever is installed, pyarrow spells some
+        # numbers differently from pandas
+        with open(file_name, "w", newline="") as f:
+            for df in chunks:
+                if written == 0:
+                    f.write(",".join(df.columns) + "\n")
+                f.write(_format_csv(df))
+                written += len(df)
+        return written
+
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError(
+            "Parquet output requires pyarrow, pip install pyarrow")
+    writer = None
+    try:
+        for df in chunks:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(file_name, table.schema)
+            writer.write_table(table)
+            written += len(df)
+    finally:
+        if writer is not None:
+            writer.close()
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        "load_sample_data",
+        description="Writes synthetic diabetes data of any size, e.g. for "
+        "benchmarks")
+    parser.add_argument("--output", type=str, default="diabetes.csv",
+                        help="CSV or Parquet file to write")
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--format", type=str, choices=["csv", "parquet"],
+                        help="File format, from the extension by default")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--drift", type=float, default=0.0,
+                        help="Shift of the feature means by the last row, "
+                        "in standard deviations")
+    parser.add_argument("--drift_columns", type=str, default=None,
+                        help="Comma separated features that drift, all by "
+                        "default")
+    parser.add_argument("--missing_fraction", type=float, default=0.0,
+                        help="Fraction of feature values left empty")
+    parser.add_argument("--for_scoring", action="store_true",
+                        help="Leave out the target column")
+    parser.add_argument("--chunk_rows", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    written = create_synthetic_data(
+        args.output, args.rows, file_format=args.format, seed=args.seed,
+        drift=args.drift,
+        drift_columns=args.drift_columns.split(",")
+        if args.drift_columns else None,
+        missing_fraction=args.missing_fraction,
+        for_scoring=args.for_scoring, chunk_rows=args.chunk_rows)
+    print("Wrote {} rows to {} in {:.1f}s".format(
+        written, args.output, time.perf_counter() - start))
+
+
+if __name__ == "__main__":
+    main()
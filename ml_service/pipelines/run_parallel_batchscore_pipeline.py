@@ -23,21 +23,41 @@ IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
 ARISING IN ANY WAY OUT OF THE USE OF THE SOFTWARE CODE, EVEN IF ADVISED OF THE
 POSSIBILITY OF SUCH DAMAGE.
 """
+from __future__ import annotations
 
-from azure.storage.blob import ContainerClient
+from ml_service.util.dry_run import add_dry_run_argument, dry_run
 from ml_service.util.env_variables import Env
-from azureml.core import Experiment, Workspace
-from azureml.pipeline.core import PublishedPipeline
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING
 import argparse
+import asyncio
+import io
+import json
+import uuid
+
+# The Azure SDKs are imported by the functions that use them, so --help and
+# --dry_run do not pay for importing them
+if TYPE_CHECKING:
+    from azureml.core import Workspace
 
 
 def parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument("--pipeline_id", type=str, default=None)
+    parser.add_argument(
+        "--checkpoint_id",
+        type=str,
+        default=None,
+        help=("Checkpoint id of a failed scoring run to resume. "
+              "A new id is generated if omitted."),
+    )
+    add_dry_run_argument(parser)
     return parser.parse_args()
 
 
 def get_pipeline(pipeline_id, ws: Workspace, env: Env):
+    from azureml.pipeline.core import PublishedPipeline
+
     if pipeline_id is not None:
         scoringpipeline = PublishedPipeline.get(ws, pipeline_id)
     else:
@@ -58,6 +78,16 @@ def get_pipeline(pipeline_id, ws: Workspace, env: Env):
 
 
 def copy_output(step_id: str, env: Env):
+    """
+    Copies the scoring output to the output container. In the txt format
+    the blob is copied as is, on the storage side. Otherwise it is
+    downloaded in chunks and converted while the result is uploaded block
+    by block, see diabetes_regression/util/output_conversion.py.
+    """
+    from azure.storage.blob import BlobBlock, ContainerClient
+    from diabetes_regression.util.output_conversion import (
+        COLUMNS_FILE, IterStream, convert_stream)
+
     accounturl = "https://{}.blob.core.windows.net".format(
         env.scoring_datastore_storage_name
     )
@@ -87,20 +117,102 @@ def copy_output(step_id: str, env: Env):
         .replace(".", "_")
     )  # noqa E501
     destfilenameparts = env.scoring_datastore_output_filename.split(".")
+    output_format = env.scoring_output_format
+    extension = (
+        destfilenameparts[1] if output_format == "txt" else output_format
+    )
     destblobname = "{}/{}_{}.{}".format(
-        destfolder, destfilenameparts[0], filetime, destfilenameparts[1]
+        destfolder, destfilenameparts[0], filetime, extension
     )
 
     destblobclient = containerclient.get_blob_client(destblobname)
-    destblobclient.start_copy_from_url(srcbloburl)
+    if output_format == "txt":
+        destblobclient.start_copy_from_url(srcbloburl)
+        return
+
+    columns = json.loads(containerclient.download_blob(
+        srcblobname.replace("parallel_run_step.txt", COLUMNS_FILE)
+    ).readall())
+    source = io.BufferedReader(IterStream(
+        containerclient.download_blob(
+            srcblobname, max_concurrency=4).chunks()))
+    result = convert_stream(
+        source, columns, output_format,
+        lambda block_id, data: destblobclient.stage_block(block_id, data))
+    destblobclient.commit_block_list(
+        [BlobBlock(block_id=i) for i in result["block_ids"]])
+    print("Wrote {} rows as {} to {}".format(
+        result["rows"], output_format, destblobname))
+
+
+def write_shard_manifest(step_id: str, env: Env):
+    """
+    Collects the manifest entries the scoring workers wrote next to their
+    shards and uploads a single manifest listing every shard blob, so
+    consumers can read the shards in parallel without copying them.
+    """
+    from azure.storage.blob import ContainerClient
+
+    accounturl = "https://{}.blob.core.windows.net".format(
+        env.scoring_datastore_storage_name
+    )
+    containerclient = ContainerClient(
+        accounturl,
+        env.scoring_datastore_output_container,
+        env.scoring_datastore_access_key,
+    )
+
+    srcprefix = "azureml/{}/{}_out/".format(
+        step_id, env.scoring_datastore_storage_name
+    )
+    shards = []
+    for blob in containerclient.list_blobs(
+        name_starts_with=srcprefix + "_manifest/"
+    ):
+        if blob.name.endswith(".json"):
+            entry = json.loads(
+                containerclient.download_blob(blob.name).readall()
+            )
+            entry["path"] = srcprefix + entry["path"]
+            shards.append(entry)
+    shards.sort(key=lambda e: e["path"])
+
+    now = datetime.now(timezone.utc)
+    filetime = (
+        now.time()
+        .isoformat("milliseconds")
+        .replace(":", "_")
+        .replace(".", "_")
+    )
+    destblobname = "{}/{}_{}.manifest.json".format(
+        now.date().isoformat(),
+        env.scoring_datastore_output_filename.split(".")[0],
+        filetime,
+    )
+    manifest = {
+        "container": env.scoring_datastore_output_container,
+        "shards": shards,
+        "rows": sum(e["rows"] for e in shards),
+    }
+    containerclient.get_blob_client(destblobname).upload_blob(
+        json.dumps(manifest, indent=2), blob_type="BlockBlob"
+    )
+    print("{} shards, {} rows, manifest written to {}".format(
+        len(shards), manifest["rows"], destblobname))
 
 
 def run_batchscore_pipeline():
+    args = parse_args()
+    if args.dry_run:
+        dry_run("scoring")
+        return
+
+    from azureml.core import Experiment, Workspace
+    from ml_service.util.run_monitor import RunMonitor
+
     try:
         env = Env()
 
-        args = parse_args()
-
         aml_workspace = Workspace.get(
             name=env.workspace_name,
             subscription_id=env.subscription_id,
@@ -111,20 +223,43 @@ def run_batchscore_pipeline():
 
         experiment = Experiment(workspace=aml_workspace, name=env.experiment_name)  # NOQA: E501
 
-        run = experiment.submit(
-            scoringpipeline,
-            pipeline_parameters={
-                "model_name": env.model_name,
-                "model_version": env.model_version,
-                "model_tag_name": " ",
-                "model_tag_value": " ",
-            },
-        )
+        checkpoint_id = args.checkpoint_id or uuid.uuid4().hex
+        print("Scoring checkpoint id: {}".format(checkpoint_id))
 
-        run.wait_for_completion(show_output=True)
+        def on_complete(run, status):
+            if status == "Finished" and env.scoring_output_layout == "sharded":
+                write_shard_manifest(list(run.get_steps())[0].id, env)
+            elif status == "Finished":
+                copy_output(list(run.get_steps())[0].id, env)
+            else:
+                print(
+                    "Scoring run ended with status {}. Rerun with "
+                    "--checkpoint_id {} to score only the remaining "
+                    "partitions.".format(status, checkpoint_id)
+                )
+
+        async def submit_and_wait():
+            monitor = RunMonitor()
+            await monitor.submit(
+                "scoring",
+                experiment,
+                scoringpipeline,
+                on_complete=on_complete,
+                pipeline_parameters={
+                    "model_name": env.model_name,
+                    "model_version": env.model_version,
+                    "model_tag_name": " ",
+                    "model_tag_value": " ",
+                    "additional_models": env.scoring_additional_models
+                    or " ",
+                    "checkpoint_id": checkpoint_id,
+                },
+            )
+            return await monitor.wait()
 
-        if run.get_status() == "Finished":
-            copy_output(list(run.get_steps())[0].id, env)
+        for (name, result) in asyncio.run(submit_and_wait()).items():
+            if isinstance(result, Exception):
+                raise result
 
     except Exception as ex:
         print("Error: {}".format(ex))
@@ -1,6 +1,5 @@
-from azureml.pipeline.core import PublishedPipeline
-from azureml.core import Experiment, Workspace
 import argparse
+from ml_service.util.dry_run import add_dry_run_argument, dry_run
 from ml_service.util.env_variables import Env
 
 
@@ -19,7 +18,19 @@ def main():
         help=("Do not trigger the execution. "
               "Use this in Azure DevOps when using a server job to trigger")
     )
+    add_dry_run_argument(parser)
     args = parser.parse_args()
+    if args.dry_run:
+        # Only runs the published pipeline, no compute or scripts needed
+        dry_run("train", required=[
+            "workspace_name", "resource_group", "subscription_id",
+            "pipeline_name", "build_id", "experiment_name", "model_name",
+        ])
+        return
+
+    # The Azure ML SDK is only imported once it is needed
+    from azureml.pipeline.core import PublishedPipeline
+    from azureml.core import Experiment, Workspace
 
     e = Env()
 
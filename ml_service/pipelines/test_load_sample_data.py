@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+from ml_service.pipelines.load_sample_data import (
+    TARGET, create_synthetic_data, generate_sample_data)
+
+
+def generate(rows, **kwargs):
+    return pd.concat(generate_sample_data(rows, **kwargs), ignore_index=True)
+
+
+def test_row_count_and_chunks():
+    chunks = list(generate_sample_data(2500, chunk_rows=1000))
+
+    assert [len(c) for c in chunks] == [1000, 1000, 500]
+    assert list(chunks[0].columns) == [
+        "age", "sex", "bmi", "bp", "s1", "s2", "s3", "s4", "s5", "s6",
+        TARGET]
+    assert TARGET not in generate(10, for_scoring=True)
+
+
+def test_same_seed_generates_the_same_rows_whatever_the_chunks():
+    df = generate(2500, chunk_rows=1000, missing_fraction=0.1, drift=1.0)
+
+    pd.testing.assert_frame_equal(df, generate(
+        2500, chunk_rows=500, missing_fraction=0.1, drift=1.0))
+    pd.testing.assert_frame_equal(df, generate(
+        2500, chunk_rows=2500, missing_fraction=0.1, drift=1.0))
+    assert not df.equals(generate(
+        2500, seed=7, missing_fraction=0.1, drift=1.0))
+
+
+def test_missing_fraction():
+    df = generate(20000, missing_fraction=0.2)
+
+    missing = df.drop(columns=TARGET).isna().to_numpy().mean()
+    assert missing == pytest.approx(0.2, abs=0.01)
+    assert not df[TARGET].isna().any()
+    assert not generate(1000).isna().any().any()
+
+
+def test_drift_moves_only_the_drift_columns_up():
+    df = generate(20000, drift=3.0, drift_columns=["bmi"])
+    std = generate(20000).std()
+
+    (first, last) = (df.iloc[:2000].mean(), df.iloc[-2000:].mean())
+    # The means move linearly to 3 standard deviations by the last row
+    assert (last["bmi"] - first["bmi"]) / std["bmi"] == pytest.approx(
+        2.7, abs=0.2)
+    assert abs(last["age"] - first["age"]) / std["age"] < 0.2
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        next(generate_sample_data(0))
+    with pytest.raises(ValueError):
+        next(generate_sample_data(10, missing_fraction=1.5))
+    with pytest.raises(ValueError, match="Unknown drift columns"):
+        next(generate_sample_data(10, drift_columns=["height"]))
+
+
+def test_csv_matches_pandas(tmp_path):
+    path = str(tmp_path / "diabetes.csv")
+
+    written = create_synthetic_data(
+        path, 2500, chunk_rows=1000, missing_fraction=0.1)
+
+    assert written == 2500
+    with open(path) as f:
+        assert f.read() == generate(2500, missing_fraction=0.1).to_csv(
+            index=False)
+    np.testing.assert_allclose(
+        pd.read_csv(path).to_numpy(),
+        generate(2500, missing_fraction=0.1).to_numpy())
@@ -9,9 +9,13 @@ from ml_service.util.env_variables import Env
 
 def get_compute(workspace: Workspace, compute_name: str, vm_size: str, for_batch_scoring: bool = False):  # NOQA E501
     try:
-        if compute_name in workspace.compute_targets:
-            compute_target = workspace.compute_targets[compute_name]
-            if compute_target and type(compute_target) is AmlCompute:
+        try:
+            # Look the compute target up by name rather than listing them all
+            compute_target = ComputeTarget(workspace=workspace, name=compute_name)  # NOQA E501
+        except ComputeTargetException:
+            compute_target = None
+        if compute_target is not None:
+            if type(compute_target) is AmlCompute:
                 print("Found existing compute target " + compute_name + " so using it.") # NOQA
         else:
             e = Env()
@@ -0,0 +1,272 @@
+"""Profiles batch scoring on a sample of the input and chooses the
+ParallelRunStep mini-batch size, processes per node and node count needed
+to score the full input within a target wall-clock time.
+
+The chosen values are printed as environment variables read by Env
+(SCORING_MINI_BATCH_SIZE, SCORING_PROCESS_COUNT_PER_NODE, SCORING_NODE_COUNT)
+and can be checked with the local simulator before publishing the pipeline.
+"""
+import argparse
+import heapq
+import math
+import os
+import time
+import tracemalloc
+from dataclasses import dataclass, replace
+from typing import Callable, List
+
+import pandas as pd
+
+
+@dataclass(frozen=True)
+class ScoringProfile:
+    """Measured cost of scoring one row"""
+
+    seconds_per_row: float
+    seconds_per_batch: float
+    memory_bytes_per_row: float
+    input_bytes_per_row: float
+
+
+@dataclass(frozen=True)
+class BatchScoringPlan:
+    """ParallelRunStep settings chosen for a scoring job"""
+
+    mini_batch_rows: int
+    mini_batch_size: str
+    process_count_per_node: int
+    node_count: int
+    estimated_seconds: float
+
+
+@dataclass(frozen=True)
+class SimulationResult:
+    """Outcome of replaying a plan on simulated workers"""
+
+    wall_clock_seconds: float
+    mini_batches: int
+    max_batch_seconds: float
+    peak_batch_memory_bytes: float
+    meets_target: bool
+
+
+def _time_call(predict: Callable, X, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        predict(X)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def profile_scoring(
+    predict: Callable,
+    sample: pd.DataFrame,
+    input_bytes_per_row: float,
+    repeats: int = 3,
+) -> ScoringProfile:
+    """
+    Measures the fixed and per-row cost of scoring by timing a single row
+    and the whole sample, and the memory used per row by the mini-batch
+    frame and the prediction.
+
+    :param predict: Function scoring a DataFrame
+    :param sample: Sample of the scoring input
+    :param input_bytes_per_row: Size of one row in the input file
+    :param repeats: Number of timings to take the best of
+
+    :returns: ScoringProfile
+    """
+    if len(sample) < 2:
+        raise ValueError("At least two sample rows are needed to profile.")
+
+    single = _time_call(predict, sample.iloc[:1], repeats)
+    full = _time_call(predict, sample, repeats)
+    seconds_per_row = max(full - single, 0.0) / (len(sample) - 1)
+    seconds_per_batch = max(single - seconds_per_row, 0.0)
+
+    tracemalloc.start()
+    predict(sample)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    frame_bytes = sample.memory_usage(index=True, deep=True).sum()
+
+    return ScoringProfile(
+        seconds_per_row=seconds_per_row,
+        seconds_per_batch=seconds_per_batch,
+        memory_bytes_per_row=float(peak + frame_bytes) / len(sample),
+        input_bytes_per_row=input_bytes_per_row,
+    )
+
+
+def plan_batch_scoring(
+    profile: ScoringProfile,
+    total_rows: int,
+    target_seconds: float,
+    max_nodes: int,
+    cores_per_node: int,
+    memory_bytes_per_node: float,
+    run_invocation_timeout: int = 300,
+    batch_overhead_fraction: float = 0.1,
+    batches_per_worker: int = 4,
+) -> BatchScoringPlan:
+    """
+    Chooses the mini-batch size and the number of workers for a job.
+
+    Mini-batches are made large enough that the fixed per-batch cost is at
+    most batch_overhead_fraction of the batch, and small enough to finish
+    well within run_invocation_timeout, to fit in memory, and to give each
+    worker several batches so the load evens out. Enough workers are then
+    used to finish within target_seconds, up to the available capacity.
+
+    :param profile: Measured scoring cost
+    :param total_rows: Number of rows to score
+    :param target_seconds: Wall-clock target for the job
+    :param max_nodes: Maximum number of nodes in the cluster
+    :param cores_per_node: Cores on each node
+    :param memory_bytes_per_node: Memory on each node
+    :param run_invocation_timeout: Timeout of one run() call in seconds
+    :param batch_overhead_fraction: Acceptable share of fixed batch cost
+    :param batches_per_worker: Minimum mini-batches per worker
+
+    :returns: BatchScoringPlan
+    """
+    spr = max(profile.seconds_per_row, 1e-9)
+    rows_for_overhead = math.ceil(
+        profile.seconds_per_batch / (batch_overhead_fraction * spr))
+    rows_for_timeout = math.floor(
+        (run_invocation_timeout / 2 - profile.seconds_per_batch) / spr)
+
+    total_seconds = total_rows * spr
+    workers = max(1, math.ceil(total_seconds / target_seconds))
+    process_count = max(1, min(cores_per_node, workers))
+    node_count = max(1, min(max_nodes, math.ceil(workers / process_count)))
+    workers = process_count * node_count
+
+    rows_for_memory = math.floor(
+        memory_bytes_per_node / 2 / process_count
+        / max(profile.memory_bytes_per_row, 1.0))
+    rows_for_balance = math.ceil(total_rows / (workers * batches_per_worker))
+
+    rows = max(rows_for_overhead, min(rows_for_balance, rows_for_timeout))
+    rows = max(1, min(rows, rows_for_timeout, rows_for_memory, total_rows))
+
+    n_batches = math.ceil(total_rows / rows)
+    batch_seconds = profile.seconds_per_batch + rows * spr
+    estimated = math.ceil(n_batches / workers) * batch_seconds
+
+    batch_kb = max(1, math.ceil(rows * profile.input_bytes_per_row / 1024))
+    return BatchScoringPlan(
+        mini_batch_rows=rows,
+        mini_batch_size="{}KB".format(batch_kb),
+        process_count_per_node=process_count,
+        node_count=node_count,
+        estimated_seconds=estimated,
+    )
+
+
+def simulate_plan(
+    plan: BatchScoringPlan,
+    profile: ScoringProfile,
+    total_rows: int,
+    target_seconds: float,
+    node_startup_seconds: float = 0.0,
+) -> SimulationResult:
+    """
+    Replays a plan by handing mini-batches to the first free worker, the
+    way ParallelRunStep schedules them, and reports the simulated
+    wall-clock time.
+
+    :param plan: Plan to validate
+    :param profile: Measured scoring cost
+    :param total_rows: Number of rows to score
+    :param target_seconds: Wall-clock target for the job
+    :param node_startup_seconds: Time before a node starts scoring
+
+    :returns: SimulationResult
+    """
+    workers: List[float] = [node_startup_seconds] * (
+        plan.process_count_per_node * plan.node_count)
+    heapq.heapify(workers)
+
+    remaining = total_rows
+    batches = 0
+    max_batch_seconds = 0.0
+    while remaining > 0:
+        rows = min(plan.mini_batch_rows, remaining)
+        seconds = profile.seconds_per_batch + rows * profile.seconds_per_row
+        heapq.heappush(workers, heapq.heappop(workers) + seconds)
+        max_batch_seconds = max(max_batch_seconds, seconds)
+        remaining -= rows
+        batches += 1
+
+    wall_clock = max(workers)
+    return SimulationResult(
+        wall_clock_seconds=wall_clock,
+        mini_batches=batches,
+        max_batch_seconds=max_batch_seconds,
+        peak_batch_memory_bytes=(
+            plan.mini_batch_rows * profile.memory_bytes_per_row),
+        meets_target=wall_clock <= target_seconds,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser("batchscore_tuner")
+    parser.add_argument("--sample_file", type=str, required=True,
+                        help="CSV sample of the scoring input")
+    parser.add_argument("--model_file", type=str, required=True,
+                        help="Model artifact or pickle to profile")
+    parser.add_argument("--total_rows", type=int, required=True,
+                        help="Number of rows in the full scoring input")
+    parser.add_argument("--target_minutes", type=float, default=30)
+    parser.add_argument("--max_nodes", type=int, default=4)
+    parser.add_argument("--cores_per_node", type=int, default=2)
+    parser.add_argument("--memory_gb_per_node", type=float, default=7)
+    parser.add_argument("--run_invocation_timeout", type=int, default=300)
+    args = parser.parse_args()
+
+    from diabetes_regression.util.model_artifact import load_model
+
+    model = load_model(args.model_file)
+
+    # Parsing the input is part of the cost of every mini-batch
+    start = time.perf_counter()
+    sample = pd.read_csv(args.sample_file)
+    parse_seconds_per_row = (time.perf_counter() - start) / len(sample)
+
+    profile = profile_scoring(
+        lambda df: model.predict(df.to_numpy()),
+        sample,
+        os.path.getsize(args.sample_file) / len(sample),
+    )
+    profile = replace(
+        profile,
+        seconds_per_row=profile.seconds_per_row + parse_seconds_per_row)
+    print(profile)
+
+    target_seconds = args.target_minutes * 60
+    plan = plan_batch_scoring(
+        profile,
+        args.total_rows,
+        target_seconds,
+        args.max_nodes,
+        args.cores_per_node,
+        args.memory_gb_per_node * 1024 ** 3,
+        args.run_invocation_timeout,
+    )
+    print(plan)
+    print(simulate_plan(plan, profile, args.total_rows, target_seconds))
+
+    settings = {
+        "SCORING_MINI_BATCH_SIZE": plan.mini_batch_size,
+        "SCORING_PROCESS_COUNT_PER_NODE": plan.process_count_per_node,
+        "SCORING_NODE_COUNT": plan.node_count,
+    }
+    for (k, v) in settings.items():
+        print("{}={}".format(k, v))
+        print("##vso[task.setvariable variable={}]{}".format(k, v))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,385 @@
+"""Benchmarks the training, data validation and scoring hot paths.
+
+Every case is timed at several data sizes, on synthetic data from
+ml_service/pipelines/load_sample_data.py with a fixed seed, so runs on
+different commits time the same inputs. The scoring entry scripts are loaded
+with the Azure ML SDK replaced by the stand-ins of
+ml_service/util/local_aml.py and are set up the way their init() would set
+them up, with a model artifact trained on the synthetic data. Batch scoring
+is also timed with the prediction cache on, with every row cached and with
+none, to show whether the cache saves more than its hashing costs.
+
+Results are added to a JSON file keyed by commit and compared to a baseline
+commit in the same file, by default the parent commit, or the commit itself
+for a working tree with changes, if it was recorded, and the one recorded
+last otherwise. A case whose throughput dropped, or whose 95th percentile
+latency rose, by more than the threshold is reported as a regression.
+Timings depend on the machine, so only compare results recorded on the same
+one.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from ml_service.util.local_pipeline import REPO_ROOT, load_script
+
+SOURCE_DIRECTORY = os.path.join(REPO_ROOT, "diabetes_regression")
+DATA_SIZES = [10000, 100000, 1000000]
+# Rows per score.run request, web service requests are small
+REQUEST_SIZES = [1, 100, 10000]
+DATA_CASES = [
+    "split_data", "train_model", "get_model_metrics", "validate_data",
+    "profile_data", "parallel_batchscore.run",
+    "parallel_batchscore.run_cache_hits",
+    "parallel_batchscore.run_cache_misses",
+]
+REQUEST_CASES = ["score.run"]
+CASES = DATA_CASES + REQUEST_CASES
+
+
+def measure(
+    func: Callable[[], object],
+    rows: int,
+    repeat: int = 5,
+    min_seconds: float = 0.5,
+    max_repeat: int = 1000,
+) -> Dict[str, float]:
+    """
+    Times func, at least repeat times and until min_seconds have passed,
+    after one untimed call.
+
+    :param rows: Rows processed by one call, for the throughput
+    :returns: Number of calls timed, median and 95th percentile latency in
+        ms and throughput in rows per second at the median latency
+    """
+    func()
+    seconds = []
+    start = time.perf_counter()
+    while len(seconds) < max_repeat and (
+            len(seconds) < repeat
+            or time.perf_counter() - start < min_seconds):
+        call_start = time.perf_counter()
+        func()
+        seconds.append(time.perf_counter() - call_start)
+    median = float(np.median(seconds))
+    return {
+        "runs": len(seconds),
+        "median_ms": median * 1000,
+        "p95_ms": float(np.percentile(seconds, 95)) * 1000,
+        "rows_per_second": rows / median if median else float("inf"),
+    }
+
+
+class BenchmarkSuite:
+    """
+    Inputs and setup shared by the cases: synthetic data of each size, a
+    model trained on it and saved as an artifact, and the scoring scripts.
+    """
+
+    def __init__(self, model_dir: str, seed: int = 42):
+        from diabetes_regression.training.train import (
+            split_data, train_model)
+        from diabetes_regression.util.feature_schema import infer_schema
+        from diabetes_regression.util.model_artifact import save_model
+
+        self.seed = seed
+        with open(os.path.join(SOURCE_DIRECTORY, "parameters.json")) as f:
+            self.parameters = json.load(f)
+        self._data = {}
+
+        df = self.data(10000)
+        model = train_model(split_data(df), self.parameters["training"])
+        model_path = os.path.join(model_dir, "sklearn_regression_model.pkl")
+        save_model(model, model_path, [c for c in df.columns if c != "Y"],
+                   metadata={"feature_schema": infer_schema(df)})
+
+        self.score = load_script(
+            "score", os.path.join(SOURCE_DIRECTORY, "scoring", "score.py"),
+            SOURCE_DIRECTORY)
+        model = self.score.load_model(model_path)
+        # As score.init()
+        self.score.model = model
+        self.score.model_dtype = model.coef_.dtype
+        self.score.validator = self.score.get_validator(model)
+
+        self.batchscore = load_script(
+            "parallel_batchscore", os.path.join(
+                SOURCE_DIRECTORY, "scoring", "parallel_batchscore.py"),
+            SOURCE_DIRECTORY)
+        # As parallel_batchscore.init() without checkpoints, cache or shards
+        stack = self.batchscore.ModelStack([model], ["score"])
+        self.batchscore.model = stack
+        self.batchscore.model_dtype = stack.dtype
+        self.batchscore.score_columns = ["score"]
+        self.batchscore.validator = self.batchscore.get_validator(
+            model, dtype=stack.dtype, allow_extra=True)
+
+    def data(self, rows: int) -> pd.DataFrame:
+        if rows not in self._data:
+            from ml_service.pipelines.load_sample_data import (
+                generate_sample_data)
+
+            self._data[rows] = pd.concat(
+                generate_sample_data(rows, seed=self.seed),
+                ignore_index=True)
+        return self._data[rows]
+
+    def case(self, name: str, rows: int) -> Callable[[], object]:
+        """
+        Prepares the inputs of a case and returns the call to time.
+        """
+        from diabetes_regression.training.train import (
+            get_model_metrics, split_data, train_model)
+        from diabetes_regression.util.data_validation import (
+            profile_data, validate_data)
+
+        df = self.data(rows)
+        ridge_args = self.parameters["training"]
+        if name == "split_data":
+            return lambda: split_data(df)
+        if name == "train_model":
+            data = split_data(df)
+            return lambda: train_model(data, ridge_args)
+        if name == "get_model_metrics":
+            data = split_data(df)
+            model = train_model(data, ridge_args)
+            return lambda: get_model_metrics(model, data)
+        if name == "validate_data":
+            return lambda: validate_data(df, **self.parameters["validation"])
+        if name == "profile_data":
+            return lambda: profile_data(df)
+        if name.startswith("parallel_batchscore.run"):
+            mini_batch = df.drop(columns="Y")
+            # Against parallel_batchscore.run, the cost of the prediction
+            # cache when every row is cached, the cache being filled by the
+            # untimed first call, and when no row is, with a new cache for
+            # every call
+            hits_cache = self.batchscore.create_cache("score:1", rows)
+
+            def score_mini_batch():
+                if name == "parallel_batchscore.run_cache_hits":
+                    self.batchscore.cache = hits_cache
+                elif name == "parallel_batchscore.run_cache_misses":
+                    self.batchscore.cache = self.batchscore.create_cache(
+                        "score:1", rows)
+                try:
+                    # run() prints errors and returns None instead of
+                    # raising
+                    scored = self.batchscore.run(mini_batch)
+                finally:
+                    self.batchscore.cache = None
+                if not isinstance(scored, pd.DataFrame):
+                    raise RuntimeError("Batch scoring failed")
+                return scored
+            return score_mini_batch
+        if name == "score.run":
+            body = json.dumps({
+                "data": df.drop(columns="Y").to_numpy().tolist()
+            }).encode("utf-8")
+            request_class = self.score.AMLRequest
+
+            def score_request():
+                response = self.score.run(request_class(
+                    body, headers={"Content-Type": "application/json"}))
+                if response.status_code != 200:
+                    raise RuntimeError(response.get_data())
+                return response
+            return score_request
+        raise ValueError("Unknown case {}, expected one of {}".format(
+            name, CASES))
+
+
+def get_commit() -> str:
+    """
+    Returns the commit of the working tree, with a +dirty suffix when
+    tracked files have changed since, or "unknown" outside a git checkout.
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, check=True,
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            universal_newlines=True).stdout.strip()
+        changes = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=REPO_ROOT, check=True, stdout=subprocess.PIPE,
+            universal_newlines=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return commit + ("+dirty" if changes else "")
+
+
+def get_parent_commit(commit: str) -> Optional[str]:
+    """
+    Returns the commit the working tree is compared to by default: HEAD if
+    tracked files have changed, its parent otherwise, or None outside a git
+    checkout or for the first commit.
+    """
+    (head, _, dirty) = commit.partition("+")
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", head if dirty else head + "~1"],
+            cwd=REPO_ROOT, check=True, stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def choose_baseline(
+    runs: Dict[str, dict],
+    commit: str,
+    parent: Optional[str],
+) -> Optional[str]:
+    """
+    Returns the default baseline of a commit: its parent if results were
+    recorded for it, the commit recorded last otherwise, or None if no
+    other commit was recorded.
+    """
+    if parent is not None and parent != commit and parent in runs:
+        return parent
+    return next((c for c in reversed(list(runs)) if c != commit), None)
+
+
+def find_regressions(
+    current: Dict[str, dict],
+    baseline: Dict[str, dict],
+    threshold: float,
+) -> List[str]:
+    """
+    Compares the cases of two runs.
+
+    :param threshold: Largest relative drop of throughput, or rise of 95th
+        percentile latency, that is not a regression
+    :returns: Description of each regression
+    """
+    regressions = []
+    for (key, result) in current.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        throughput = result["rows_per_second"] / base["rows_per_second"]
+        if throughput < 1 - threshold:
+            regressions.append(
+                "{}: throughput {:.0f} rows/s, {:.0%} of {:.0f}".format(
+                    key, result["rows_per_second"], throughput,
+                    base["rows_per_second"]))
+        latency = result["p95_ms"] / base["p95_ms"]
+        if latency > 1 + threshold:
+            regressions.append(
+                "{}: p95 latency {:.3f}ms, {:.0%} of {:.3f}ms".format(
+                    key, result["p95_ms"], latency, base["p95_ms"]))
+    return regressions
+
+
+def run_benchmarks(
+    cases: List[str],
+    data_sizes: List[int],
+    request_sizes: List[int],
+    repeat: int = 5,
+) -> Dict[str, dict]:
+    """
+    Runs every case at every size.
+
+    :returns: Measurements keyed by case[rows]
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as model_dir:
+        suite = BenchmarkSuite(model_dir)
+        for name in cases:
+            sizes = request_sizes if name in REQUEST_CASES else data_sizes
+            for rows in sizes:
+                key = "{}[{}]".format(name, rows)
+                func = suite.case(name, rows)
+                # The scoring scripts print a line per request or batch
+                with open(os.devnull, "w") as devnull, \
+                        contextlib.redirect_stdout(devnull):
+                    result = measure(func, rows, repeat)
+                results[key] = dict(result, case=name, rows=rows)
+                print("{:<46} {:>10.3f}ms median {:>10.3f}ms p95 "
+                      "{:>14,.0f} rows/s".format(
+                          key, result["median_ms"], result["p95_ms"],
+                          result["rows_per_second"]))
+    return results
+
+
+def _sizes(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser("benchmark")
+    parser.add_argument("--cases", nargs="*", choices=CASES, default=CASES)
+    parser.add_argument("--sizes", type=_sizes, default=DATA_SIZES,
+                        help="Comma separated rows of the data cases")
+    parser.add_argument("--request_sizes", type=_sizes,
+                        default=REQUEST_SIZES,
+                        help="Comma separated rows per score.run request")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="Fewest timed calls per case")
+    parser.add_argument("--results", type=str,
+                        default="benchmark_results.json",
+                        help="JSON file the results are added to")
+    parser.add_argument("--baseline", type=str, default=None,
+                        help="Commit to compare to, by default the parent "
+                        "commit, or HEAD for a working tree with changes, if "
+                        "recorded, else the last one recorded")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="Relative change reported as a regression")
+    parser.add_argument("--fail_on_regression", action="store_true",
+                        help="Exit with status 1 if there are regressions")
+    args = parser.parse_args()
+
+    history = {"runs": {}}
+    if os.path.exists(args.results):
+        with open(args.results) as f:
+            history = json.load(f)
+    commit = get_commit()
+    baseline = args.baseline or choose_baseline(
+        history["runs"], commit, get_parent_commit(commit))
+    if baseline is not None and baseline not in history["runs"]:
+        parser.error("No results recorded for baseline {}".format(baseline))
+
+    print("Benchmarking commit {}".format(commit))
+    results = run_benchmarks(
+        args.cases, args.sizes, args.request_sizes, args.repeat)
+
+    # A commit benchmarked again keeps the cases that were not run again
+    # and becomes the last one recorded
+    run = history["runs"].pop(commit, {"cases": {}})
+    run.update({
+        "recorded": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    })
+    run["cases"].update(results)
+    history["runs"][commit] = run
+    with open(args.results, "w") as f:
+        json.dump(history, f, indent=2)
+    print("Results of {} written to {}".format(commit, args.results))
+
+    if baseline is None:
+        return
+    regressions = find_regressions(
+        results, history["runs"][baseline]["cases"], args.threshold)
+    print("{} regressions against {} beyond {:.0%}".format(
+        len(regressions), baseline, args.threshold))
+    for regression in regressions:
+        print("  " + regression)
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
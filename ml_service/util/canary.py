@@ -0,0 +1,409 @@
+"""Simulates a canary rollout of the A/B deployment locally.
+
+charts/abtest-istio routes requests with an x-api-version header of blue or
+green to that deployment, and splits the other requests between the two by
+weight.blue and weight.green. This module replays a trace of requests
+against two scoring entry scripts loaded in this process, e.g. scoreA.py
+and scoreB.py, routed the same way, and records the latency and outcome of
+each request. The latency of a request is measured from its arrival in the
+trace, so it includes the time it waited for a free worker.
+
+A CanaryController then rolls the canary out step by step: after each
+window of requests it compares the canary with its latency and error SLOs
+and with the stable deployment, and either promotes it to the next weight,
+holds it while there are too few canary requests to judge, or rolls it back
+to weight 0. The requests of held windows are judged again with the next
+window, so a low weight still gathers enough canary requests. The resulting
+weights are printed as helm values for the abtest-istio chart.
+
+Backends can be made slower or less reliable than the script is, with
+--delay_ms and --error_rate, to check that the controller rolls back a bad
+canary.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from diabetes_regression.util.request_capture import read_trace
+from ml_service.util.local_pipeline import REPO_ROOT, load_script
+
+SOURCE_DIRECTORY = os.path.join(REPO_ROOT, "diabetes_regression")
+VERSION_HEADER = "x-api-version"
+CANARY_STEPS = [10, 25, 50, 100]
+
+
+def synthetic_trace(
+    requests: int,
+    rate: float,
+    rows: int = 1,
+    seed: int = 42,
+) -> List[dict]:
+    """
+    Generates a trace of scoring requests arriving at random, rate requests
+    per second on average, each with rows rows of synthetic data.
+    """
+    from ml_service.pipelines.load_sample_data import generate_sample_data
+
+    rng = np.random.default_rng(seed)
+    arrivals = np.cumsum(rng.exponential(1.0 / rate, size=requests))
+    features = next(generate_sample_data(
+        requests * rows, seed=seed, for_scoring=True,
+        chunk_rows=requests * rows)).to_numpy()
+    return [
+        {"t": float(t),
+         "body": {"data": features[i * rows:(i + 1) * rows].tolist()}}
+        for (i, t) in enumerate(arrivals)
+    ]
+
+
+class ScriptBackend:
+    """
+    Scoring entry script, initialized once and called like the web service
+    calls it: with the request for run functions decorated with rawhttp,
+    with the body otherwise.
+
+    :param delay_ms: Delay added to every request
+    :param error_rate: Fraction of requests failed at random
+    :param env: Environment variables set while the script is initialized,
+        e.g. AZUREML_MODEL_DIR
+    """
+
+    def __init__(self, name: str, script: str, delay_ms: float = 0.0,
+                 error_rate: float = 0.0, env: Dict[str, str] = None,
+                 seed: int = 0):
+        self.name = name
+        saved = dict(os.environ)
+        os.environ.update(env or {})
+        try:
+            self.module = load_script(
+                "canary_" + name, script, SOURCE_DIRECTORY)
+            self.module.init()
+        finally:
+            os.environ.clear()
+            os.environ.update(saved)
+        self.rawhttp = getattr(self.module.run, "rawhttp", False)
+        self.delay = delay_ms / 1000
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self, body: str, headers: Dict[str, str]) -> bool:
+        """
+        Scores a request.
+
+        :returns: Whether the request succeeded
+        """
+        if self.delay:
+            time.sleep(self.delay)
+        with self._lock:
+            failed = self._random.random() < self.error_rate
+        if failed:
+            return False
+        try:
+            if not self.rawhttp:
+                self.module.run(body)
+                return True
+            response = self.module.run(self.module.AMLRequest(
+                body.encode("utf-8"), headers=headers))
+            # Streamed bodies are scored while they are read
+            response.get_data()
+            return response.status_code < 500
+        except Exception:
+            return False
+
+
+class Router:
+    """
+    Routes requests like the abtest-istio VirtualService: by the
+    x-api-version header if it names a deployment, by weight otherwise.
+    """
+
+    def __init__(self, weights: Dict[str, int], seed: int = 0):
+        self.weights = dict(weights)
+        self._random = random.Random(seed)
+
+    def route(self, headers: Dict[str, str]) -> str:
+        version = {k.lower(): v for (k, v) in headers.items()}.get(
+            VERSION_HEADER)
+        if version in self.weights:
+            return version
+        names = list(self.weights)
+        return self._random.choices(
+            names, weights=[self.weights[n] for n in names])[0]
+
+
+def replay(
+    trace: List[dict],
+    router: Router,
+    backends: Dict[str, ScriptBackend],
+    speed: float = 1.0,
+    workers: int = 8,
+) -> List[dict]:
+    """
+    Replays requests at their arrival times, scaled by speed, or as fast as
+    the workers take them if speed is 0.
+
+    :returns: Backend, latency in ms and outcome of each request
+    """
+    records = []
+    lock = threading.Lock()
+    start = time.perf_counter()
+    offset = trace[0]["t"] if trace else 0.0
+
+    def send(request: dict, backend: str, arrival: float):
+        body = request["body"]
+        if not isinstance(body, str):
+            body = json.dumps(body)
+        ok = backends[backend](body, request.get("headers") or {})
+        latency = (time.perf_counter() - arrival) * 1000
+        with lock:
+            records.append(
+                {"backend": backend, "latency_ms": latency, "ok": ok})
+
+    with ThreadPoolExecutor(workers) as pool:
+        for request in trace:
+            if speed > 0:
+                arrival = start + (request["t"] - offset) / speed
+                time.sleep(max(0.0, arrival - time.perf_counter()))
+            else:
+                arrival = time.perf_counter()
+            backend = router.route(request.get("headers") or {})
+            pool.submit(send, request, backend, arrival)
+    return records
+
+
+def summarize(records: Iterable[dict]) -> Dict[str, dict]:
+    """
+    :returns: Per backend, the number of requests, their error rate and
+        50th, 95th and 99th percentile latency in ms
+    """
+    by_backend = {}
+    for r in records:
+        by_backend.setdefault(r["backend"], []).append(r)
+    summary = {}
+    for (name, rs) in sorted(by_backend.items()):
+        latencies = np.array([r["latency_ms"] for r in rs])
+        summary[name] = {
+            "requests": len(rs),
+            "error_rate": sum(not r["ok"] for r in rs) / len(rs),
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p95_ms": float(np.percentile(latencies, 95)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+        }
+    return summary
+
+
+class CanaryController:
+    """
+    Decides the canary weight from the requests of the last window.
+
+    :param latency_slo_ms: Highest canary latency at the percentile
+    :param percentile: Latency percentile the SLOs apply to, 50, 95 or 99
+    :param max_error_rate: Highest canary error rate
+    :param max_latency_increase: Highest relative latency increase of the
+        canary over the stable deployment at the percentile
+    :param latency_margin_ms: Latency increase over the stable deployment
+        always allowed, so jitter of fast deployments is not a regression
+    :param min_requests: Fewest canary requests in a window to judge it by
+    :param steps: Canary weights to promote through, ending at 100
+    """
+
+    def __init__(self, latency_slo_ms: float, percentile: int = 95,
+                 max_error_rate: float = 0.01,
+                 max_latency_increase: float = 0.2,
+                 latency_margin_ms: float = 5.0,
+                 min_requests: int = 20, steps: List[int] = None):
+        if percentile not in (50, 95, 99):
+            raise ValueError("percentile must be 50, 95 or 99")
+        self.latency_slo_ms = latency_slo_ms
+        self.latency_key = "p{}_ms".format(percentile)
+        self.max_error_rate = max_error_rate
+        self.max_latency_increase = max_latency_increase
+        self.latency_margin_ms = latency_margin_ms
+        self.min_requests = min_requests
+        self.steps = list(steps or CANARY_STEPS)
+
+    def violations(self, canary: dict, stable: dict = None) -> List[str]:
+        """Describes every SLO the canary broke"""
+        found = []
+        latency = canary[self.latency_key]
+        if latency > self.latency_slo_ms:
+            found.append("{} {:.1f}ms above the {:.1f}ms SLO".format(
+                self.latency_key, latency, self.latency_slo_ms))
+        if canary["error_rate"] > self.max_error_rate:
+            found.append("error rate {:.1%} above {:.1%}".format(
+                canary["error_rate"], self.max_error_rate))
+        if stable is not None and stable["requests"] >= self.min_requests:
+            limit = max(
+                stable[self.latency_key] * (1 + self.max_latency_increase),
+                stable[self.latency_key] + self.latency_margin_ms)
+            if latency > limit:
+                found.append(
+                    "{} {:.1f}ms above the {:.1f}ms allowed by stable "
+                    "{:.1f}ms".format(self.latency_key, latency, limit,
+                                      stable[self.latency_key]))
+        return found
+
+    def decide(self, weight: int, canary: dict = None,
+               stable: dict = None) -> Tuple[str, int, List[str]]:
+        """
+        :param weight: Current canary weight
+        :param canary: Summary of the canary requests of the window
+        :param stable: Summary of the stable requests of the window
+        :returns: promote, hold or rollback, the new canary weight and the
+            reasons for the decision
+        """
+        if canary is None or canary["requests"] < self.min_requests:
+            return ("hold", weight, ["{} canary requests, {} needed".format(
+                canary["requests"] if canary else 0, self.min_requests)])
+        found = self.violations(canary, stable)
+        if found:
+            return ("rollback", 0, found)
+        next_weight = next((s for s in self.steps if s > weight), weight)
+        return ("promote", next_weight, [])
+
+
+def run_canary(
+    trace: List[dict],
+    backends: Dict[str, ScriptBackend],
+    controller: CanaryController,
+    canary: str,
+    stable: str,
+    window: int,
+    speed: float = 1.0,
+    workers: int = 8,
+) -> dict:
+    """
+    Replays the trace window by window, starting the canary at the first
+    step weight and applying the decision of the controller after each
+    window, until the canary is rolled back, reaches weight 100 or the
+    trace ends. A window the controller holds on is added to the next one,
+    since both were routed at the same weight.
+
+    :param window: Requests per window
+    :returns: Summary and decision of each window, and the final weights
+    """
+    weight = controller.steps[0]
+    windows = []
+    held = []
+    for start in range(0, len(trace), window):
+        router = Router({canary: weight, stable: 100 - weight}, seed=start)
+        records = held + replay(trace[start:start + window], router,
+                                backends, speed, workers)
+        summary = summarize(records)
+        (decision, new_weight, reasons) = controller.decide(
+            weight, summary.get(canary), summary.get(stable))
+        windows.append({"weight": weight, "summary": summary,
+                        "decision": decision, "reasons": reasons})
+        print("Canary at {:>3}%: {}".format(weight, ", ".join(
+            "{} {} requests p95 {:.1f}ms errors {:.1%}".format(
+                name, s["requests"], s["p95_ms"], s["error_rate"])
+            for (name, s) in summary.items())))
+        print("  {} to {}%{}".format(decision, new_weight, "".join(
+            "\n    " + r for r in reasons)))
+        held = records if decision == "hold" else []
+        weight = new_weight
+        if decision == "rollback" or weight == 100:
+            break
+    return {
+        "windows": windows,
+        "rolled_back": bool(windows) and windows[-1]["decision"] == "rollback",
+        "weights": {canary: weight, stable: 100 - weight},
+    }
+
+
+def _backend_options(value: str) -> Dict[str, float]:
+    # name=value pairs, e.g. blue=20,green=0
+    options = {}
+    for item in value.split(","):
+        if item.strip():
+            (name, _, number) = item.partition("=")
+            options[name.strip()] = float(number)
+    return options
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        "canary",
+        description="Replays requests against two scoring scripts and "
+        "rolls out the canary by latency and error SLOs")
+    parser.add_argument("--green", type=str,
+                        default=os.path.join(
+                            SOURCE_DIRECTORY, "scoring", "scoreA.py"),
+                        help="Entry script of the green deployment")
+    parser.add_argument("--blue", type=str,
+                        default=os.path.join(
+                            SOURCE_DIRECTORY, "scoring", "scoreB.py"),
+                        help="Entry script of the blue deployment")
+    parser.add_argument("--canary", type=str, choices=["blue", "green"],
+                        default="blue")
+    parser.add_argument("--model_dir", type=str, default=None,
+                        help="AZUREML_MODEL_DIR of the scripts, e.g. "
+                        "azureml-models/diabetes_model/1, with models "
+                        "taken from the local registry (LOCAL_AML_REGISTRY)")
+    parser.add_argument("--trace", type=str, default=None,
+                        help="Captured requests, a file or directory, see "
+                        "diabetes_regression/util/request_capture.py. A "
+                        "synthetic trace by default")
+    parser.add_argument("--requests", type=int, default=1000,
+                        help="Requests in the synthetic trace")
+    parser.add_argument("--rate", type=float, default=100.0,
+                        help="Requests per second of the synthetic trace")
+    parser.add_argument("--rows", type=int, default=1,
+                        help="Rows per request of the synthetic trace")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Replay speed, 0 replays as fast as possible")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--window", type=int, default=200,
+                        help="Requests between decisions")
+    parser.add_argument("--latency_slo_ms", type=float, default=100.0)
+    parser.add_argument("--percentile", type=int, choices=[50, 95, 99],
+                        default=95)
+    parser.add_argument("--max_error_rate", type=float, default=0.01)
+    parser.add_argument("--max_latency_increase", type=float, default=0.2,
+                        help="Relative latency increase over stable allowed")
+    parser.add_argument("--latency_margin_ms", type=float, default=5.0,
+                        help="Latency increase over stable always allowed")
+    parser.add_argument("--min_requests", type=int, default=20)
+    parser.add_argument("--delay_ms", type=_backend_options, default={},
+                        help="Delay added per deployment, e.g. blue=20")
+    parser.add_argument("--error_rate", type=_backend_options, default={},
+                        help="Errors injected per deployment, e.g. blue=0.05")
+    parser.add_argument("--output", type=str, default=None,
+                        help="JSON file to write the windows to")
+    args = parser.parse_args()
+
+    env = {"AZUREML_MODEL_DIR": args.model_dir} if args.model_dir else {}
+    backends = {
+        name: ScriptBackend(name, script, args.delay_ms.get(name, 0.0),
+                            args.error_rate.get(name, 0.0), env)
+        for (name, script) in (("green", args.green), ("blue", args.blue))
+    }
+    trace = read_trace(args.trace) if args.trace else synthetic_trace(
+        args.requests, args.rate, args.rows)
+    controller = CanaryController(
+        args.latency_slo_ms, args.percentile, args.max_error_rate,
+        args.max_latency_increase, args.latency_margin_ms, args.min_requests)
+    stable = "green" if args.canary == "blue" else "blue"
+    result = run_canary(trace, backends, controller, args.canary, stable,
+                        args.window, args.speed, args.workers)
+
+    print("Recommended abtest-istio values: weight.blue={},weight.green={}"
+          .format(result["weights"]["blue"], result["weights"]["green"]))
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    if result["rolled_back"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
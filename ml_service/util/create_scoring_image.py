@@ -1,59 +1,87 @@
 import os
 import argparse
-from azureml.core import Workspace
-from azureml.core.environment import Environment
-from azureml.core.model import Model, InferenceConfig
-import shutil
+from ml_service.util.dry_run import add_dry_run_argument, dry_run
 from ml_service.util.env_variables import Env
 
-e = Env()
-
-# Get Azure machine learning workspace
-ws = Workspace.get(
-    name=e.workspace_name,
-    subscription_id=e.subscription_id,
-    resource_group=e.resource_group
-)
-
-parser = argparse.ArgumentParser("create scoring image")
-parser.add_argument(
-    "--output_image_location_file",
-    type=str,
-    help=("Name of a file to write image location to, "
-          "in format REGISTRY.azurecr.io/IMAGE_NAME:IMAGE_VERSION")
-)
-args = parser.parse_args()
-
-model = Model(ws, name=e.model_name, version=e.model_version)
-sources_dir = e.sources_directory_train
-if (sources_dir is None):
-    sources_dir = 'diabetes_regression'
-score_script = os.path.join(".", sources_dir, e.score_script)
-score_file = os.path.basename(score_script)
-path_to_scoring = os.path.dirname(score_script)
-cwd = os.getcwd()
-# Copy conda_dependencies.yml into scoring as this method does not accept relative paths. # NOQA: E501
-shutil.copy(os.path.join(".", sources_dir,
-                         "conda_dependencies.yml"), path_to_scoring)
-os.chdir(path_to_scoring)
-
-scoring_env = Environment.from_conda_specification(name="scoringenv", file_path="conda_dependencies.yml")  # NOQA: E501
-inference_config = InferenceConfig(
-    entry_script=score_file, environment=scoring_env)
-package = Model.package(ws, [model], inference_config)
-package.wait_for_creation(show_output=True)
-# Display the package location/ACR path
-print(package.location)
-
-os.chdir(cwd)
-
-if package.state != "Succeeded":
-    raise Exception("Image creation status: {package.creation_state}")
-
-print("Package stored at {} with build log {}".format(package.location, package.package_build_log_uri))  # NOQA: E501
-
-# Save the Image Location for other AzDO jobs after script is complete
-if args.output_image_location_file is not None:
-    print("Writing image location to %s" % args.output_image_location_file)
-    with open(args.output_image_location_file, "w") as out_file:
-        out_file.write(str(package.location))
+
+def main():
+    parser = argparse.ArgumentParser("create scoring image")
+    parser.add_argument(
+        "--output_image_location_file",
+        type=str,
+        help=("Name of a file to write image location to, "
+              "in format REGISTRY.azurecr.io/IMAGE_NAME:IMAGE_VERSION")
+    )
+    add_dry_run_argument(parser)
+    args = parser.parse_args()
+    if args.dry_run:
+        dry_run(settings=[
+            "workspace_name", "resource_group", "subscription_id",
+            "model_name", "model_version", "sources_directory_train",
+            "score_script", "shadow_model",
+        ])
+        return
+
+    # The Azure ML SDK is only imported once it is needed
+    from azureml.core import Workspace
+    from azureml.core.environment import Environment
+    from azureml.core.model import Model, InferenceConfig
+
+    e = Env()
+
+    # Get Azure machine learning workspace
+    ws = Workspace.get(
+        name=e.workspace_name,
+        subscription_id=e.subscription_id,
+        resource_group=e.resource_group
+    )
+
+    model = Model(ws, name=e.model_name, version=e.model_version)
+    sources_dir = e.sources_directory_train
+    if (sources_dir is None):
+        sources_dir = 'diabetes_regression'
+    # The scoring scripts import shared modules from util, so the whole
+    # sources directory is packaged and the entry script is given relative
+    # to it.
+    scoring_env = Environment.from_conda_specification(
+        name="scoringenv",
+        file_path=os.path.join(".", sources_dir, "conda_dependencies.yml"))
+    models = [model]
+    if e.shadow_model:
+        # The shadow model is packaged alongside, and the scoring script is
+        # told which of the models answers the requests
+        shadow_name, _, shadow_version = e.shadow_model.partition(":")
+        shadow = Model(
+            ws, name=shadow_name,
+            version=int(shadow_version) if shadow_version else None)
+        models.append(shadow)
+        scoring_env.environment_variables.update({
+            "SCORING_MODEL": "{}:{}".format(model.name, model.version),
+            "SHADOW_MODEL": "{}:{}".format(shadow.name, shadow.version),
+        })
+        print("Shadow scoring against {}:{}".format(
+            shadow.name, shadow.version))
+    inference_config = InferenceConfig(
+        source_directory=os.path.join(".", sources_dir),
+        entry_script=e.score_script,
+        environment=scoring_env)
+    package = Model.package(ws, models, inference_config)
+    package.wait_for_creation(show_output=True)
+    # Display the package location/ACR path
+    print(package.location)
+
+    if package.state != "Succeeded":
+        raise Exception("Image creation status: {package.creation_state}")
+
+    print("Package stored at {} with build log {}".format(package.location, package.package_build_log_uri))  # NOQA: E501
+
+    # Save the Image Location for other AzDO jobs after script is complete
+    if args.output_image_location_file is not None:
+        print("Writing image location to %s" %
+              args.output_image_location_file)
+        with open(args.output_image_location_file, "w") as out_file:
+            out_file.write(str(package.location))
+
+
+if __name__ == "__main__":
+    main()
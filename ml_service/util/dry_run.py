@@ -0,0 +1,57 @@
+"""Dry-run support for the ml_service command line entry points.
+
+With --dry_run an entry point parses its arguments, validates the
+configuration and prints it, then exits before the Azure ML SDK is
+imported. Entry points import the SDK inside main() for this reason.
+"""
+import argparse
+import sys
+
+from ml_service.util.env_variables import Env
+
+SECRET_SETTINGS = ("app_secret", "scoring_datastore_access_key")
+
+
+def add_dry_run_argument(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--dry_run",
+        action="store_true",
+        help="Validate and print the configuration without connecting to "
+        "Azure ML",
+    )
+
+
+def dry_run(
+    profile: str = None,
+    settings: list = None,
+    required: list = None,
+) -> Env:
+    """
+    Validates the configuration, including the settings required by
+    profile, and prints the given settings, or every setting, with secrets
+    masked.
+
+    :param profile: Profile whose required settings are checked, see
+        Env.REQUIRED
+    :param settings: Names of the settings to print
+    :param required: Names of the settings the entry point needs, instead
+        of those of the profile
+
+    :returns: The validated Env
+
+    :raises: SystemExit after listing every invalid or missing setting
+    """
+    env = Env()
+    try:
+        values = env.validate(profile, required)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        raise SystemExit(1)
+    print("Configuration is valid for {}:".format(
+        profile or env.profile or "no profile"))
+    for name in settings or sorted(values):
+        value = values[name]
+        if name in SECRET_SETTINGS and value:
+            value = "***"
+        print("  {} = {}".format(name, value))
+    return env
@@ -1,126 +1,335 @@
-"""Env dataclass to load and hold all environment variables
+"""Env object to load and hold all environment variables
+
+Settings are read from the environment when first accessed and cached on
+the Env instance, so importing this module does no work and a new Env()
+sees the current environment. The .env file is loaded on the first Env().
+
+A profile (train, scoring or local, from ENV_PROFILE or Env(profile=...))
+lets a variable be overridden for that profile only, by setting it with the
+profile as a suffix, e.g. AML_COMPUTE_CLUSTER_NAME__SCORING. Env.validate()
+resolves every setting at once and reports all invalid or missing values
+together.
 """
-from dataclasses import dataclass
 import os
-from typing import Optional
+from typing import Callable, Dict, Iterable, Optional
+
+PROFILES = ("train", "scoring", "local")
+
+_dotenv_loaded = False
+
+
+def _load_dotenv():
+    # to load .env file into environment variables for local execution
+    global _dotenv_loaded
+    if not _dotenv_loaded:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        _dotenv_loaded = True
+
+
+def as_bool(value: str) -> bool:
+    return value.lower().strip() == "true"
+
+
+def as_choice(*choices: str) -> Callable[[str], str]:
+    def parse(value: str) -> str:
+        value = value.lower().strip()
+        if value not in choices:
+            raise ValueError("expected one of {}".format(", ".join(choices)))
+        return value
+    return parse
+
 
-from dotenv import load_dotenv
+class Setting:
+    """Typed environment variable, resolved on first access"""
+
+    def __init__(self, key: str, default=None, parse: Callable = str):
+        self.key = key
+        self.default = default
+        self.parse = parse
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, env, owner=None):
+        if env is None:
+            return self
+        values = env.__dict__["_values"]
+        if self.name not in values:
+            values[self.name] = env.resolve(self)
+        return values[self.name]
+
+    def __set__(self, env, value):
+        raise AttributeError("Env settings are read only")
+
+
+def _default_env_index_path() -> str:
+    return os.path.join(
+        os.path.expanduser("~"), ".azureml", "environment_index.json")
+
+
+def _default_local_registry_path() -> str:
+    return os.path.join(os.path.expanduser("~"), ".azureml", "local_registry")
 
 
-@dataclass(frozen=True)
 class Env:
     """Loads all environment variables into a predefined set of properties
     """
 
-    # to load .env file into environment variables for local execution
-    load_dotenv()
-    workspace_name: Optional[str] = os.environ.get("WORKSPACE_NAME")
-    resource_group: Optional[str] = os.environ.get("RESOURCE_GROUP")
-    subscription_id: Optional[str] = os.environ.get("SUBSCRIPTION_ID")
-    tenant_id: Optional[str] = os.environ.get("TENANT_ID")
-    app_id: Optional[str] = os.environ.get("SP_APP_ID")
-    app_secret: Optional[str] = os.environ.get("SP_APP_SECRET")
-    vm_size: Optional[str] = os.environ.get("AML_COMPUTE_CLUSTER_CPU_SKU")
-    compute_name: Optional[str] = os.environ.get("AML_COMPUTE_CLUSTER_NAME")
-    vm_priority: Optional[str] = os.environ.get(
+    workspace_name: Optional[str] = Setting("WORKSPACE_NAME")
+    resource_group: Optional[str] = Setting("RESOURCE_GROUP")
+    subscription_id: Optional[str] = Setting("SUBSCRIPTION_ID")
+    tenant_id: Optional[str] = Setting("TENANT_ID")
+    app_id: Optional[str] = Setting("SP_APP_ID")
+    app_secret: Optional[str] = Setting("SP_APP_SECRET")
+    vm_size: Optional[str] = Setting("AML_COMPUTE_CLUSTER_CPU_SKU")
+    compute_name: Optional[str] = Setting("AML_COMPUTE_CLUSTER_NAME")
+    vm_priority: Optional[str] = Setting(
         "AML_CLUSTER_PRIORITY", "lowpriority"
-    )  # NOQA: E501
-    min_nodes: int = int(os.environ.get("AML_CLUSTER_MIN_NODES", 0))
-    max_nodes: int = int(os.environ.get("AML_CLUSTER_MAX_NODES", 4))
-    build_id: Optional[str] = os.environ.get("BUILD_BUILDID")
-    pipeline_name: Optional[str] = os.environ.get("TRAINING_PIPELINE_NAME")
-    sources_directory_train: Optional[str] = os.environ.get(
-        "SOURCES_DIR_TRAIN"
-    )  # NOQA: E501
-    train_script_path: Optional[str] = os.environ.get("TRAIN_SCRIPT_PATH")
-    evaluate_script_path: Optional[str] = os.environ.get(
-        "EVALUATE_SCRIPT_PATH"
-    )  # NOQA: E501
-    register_script_path: Optional[str] = os.environ.get(
-        "REGISTER_SCRIPT_PATH"
-    )  # NOQA: E501
-    model_name: Optional[str] = os.environ.get("MODEL_NAME")
-    experiment_name: Optional[str] = os.environ.get("EXPERIMENT_NAME")
-    model_version: Optional[str] = os.environ.get("MODEL_VERSION")
-    image_name: Optional[str] = os.environ.get("IMAGE_NAME")
-    db_cluster_id: Optional[str] = os.environ.get("DB_CLUSTER_ID")
-    score_script: Optional[str] = os.environ.get("SCORE_SCRIPT")
-    build_uri: Optional[str] = os.environ.get("BUILD_URI")
-    dataset_name: Optional[str] = os.environ.get("DATASET_NAME")
-    datastore_name: Optional[str] = os.environ.get("DATASTORE_NAME")
-    dataset_version: Optional[str] = os.environ.get("DATASET_VERSION")
-    run_evaluation: Optional[str] = os.environ.get("RUN_EVALUATION", "true")
-    allow_run_cancel: Optional[str] = os.environ.get(
-        "ALLOW_RUN_CANCEL", "true"
-    )  # NOQA: E501
-    aml_env_name: Optional[str] = os.environ.get("AML_ENV_NAME")
-    aml_env_train_conda_dep_file: Optional[str] = os.environ.get(
+    )
+    min_nodes: int = Setting("AML_CLUSTER_MIN_NODES", 0, int)
+    max_nodes: int = Setting("AML_CLUSTER_MAX_NODES", 4, int)
+    build_id: Optional[str] = Setting("BUILD_BUILDID")
+    pipeline_name: Optional[str] = Setting("TRAINING_PIPELINE_NAME")
+    sources_directory_train: Optional[str] = Setting("SOURCES_DIR_TRAIN")
+    train_script_path: Optional[str] = Setting("TRAIN_SCRIPT_PATH")
+    evaluate_script_path: Optional[str] = Setting("EVALUATE_SCRIPT_PATH")
+    register_script_path: Optional[str] = Setting("REGISTER_SCRIPT_PATH")
+    # Optional, the data validation step is left out of the training
+    # pipeline if not set
+    validate_script_path: Optional[str] = Setting("VALIDATE_SCRIPT_PATH")
+    model_name: Optional[str] = Setting("MODEL_NAME")
+    experiment_name: Optional[str] = Setting("EXPERIMENT_NAME")
+    model_version: Optional[str] = Setting("MODEL_VERSION")
+    image_name: Optional[str] = Setting("IMAGE_NAME")
+    db_cluster_id: Optional[str] = Setting("DB_CLUSTER_ID")
+    score_script: Optional[str] = Setting("SCORE_SCRIPT")
+    # Optional, name[:version] of a model packaged into the scoring image
+    # to shadow score requests with, see diabetes_regression/scoring/score.py
+    shadow_model: Optional[str] = Setting("SHADOW_MODEL")
+    build_uri: Optional[str] = Setting("BUILD_URI")
+    dataset_name: Optional[str] = Setting("DATASET_NAME")
+    datastore_name: Optional[str] = Setting("DATASTORE_NAME")
+    dataset_version: Optional[str] = Setting("DATASET_VERSION")
+    run_evaluation: Optional[str] = Setting("RUN_EVALUATION", "true")
+    allow_run_cancel: Optional[str] = Setting("ALLOW_RUN_CANCEL", "true")
+    use_train_cache: Optional[str] = Setting("USE_TRAIN_CACHE", "true")
+    aml_env_name: Optional[str] = Setting("AML_ENV_NAME")
+    aml_env_train_conda_dep_file: Optional[str] = Setting(
         "AML_ENV_TRAIN_CONDA_DEP_FILE", "conda_dependencies.yml"
     )
-    rebuild_env: Optional[bool] = os.environ.get(
-        "AML_REBUILD_ENVIRONMENT", "false"
-    ).lower().strip() == "true"
+    rebuild_env: Optional[bool] = Setting(
+        "AML_REBUILD_ENVIRONMENT", False, as_bool
+    )
+    # Registry of the runs, models and datasets of local pipeline runs, see
+    # ml_service/util/local_registry.py
+    local_registry_path: str = Setting(
+        "LOCAL_REGISTRY_PATH", _default_local_registry_path
+    )
+    # Local index of the environments registered for each conda file hash,
+    # see ml_service/util/manage_environment.py
+    aml_env_index_path: str = Setting(
+        "AML_ENV_INDEX_PATH", _default_env_index_path
+    )
 
-    use_gpu_for_scoring: Optional[bool] = os.environ.get(
-        "USE_GPU_FOR_SCORING", "false"
-    ).lower().strip() == "true"
-    aml_env_score_conda_dep_file: Optional[str] = os.environ.get(
+    use_gpu_for_scoring: Optional[bool] = Setting(
+        "USE_GPU_FOR_SCORING", False, as_bool
+    )
+    aml_env_score_conda_dep_file: Optional[str] = Setting(
         "AML_ENV_SCORE_CONDA_DEP_FILE", "conda_dependencies_scoring.yml"
     )
-    aml_env_scorecopy_conda_dep_file: Optional[str] = os.environ.get(
+    aml_env_scorecopy_conda_dep_file: Optional[str] = Setting(
         "AML_ENV_SCORECOPY_CONDA_DEP_FILE", "conda_dependencies_scorecopy.yml"
     )
-    vm_size_scoring: Optional[str] = os.environ.get(
+    vm_size_scoring: Optional[str] = Setting(
         "AML_COMPUTE_CLUSTER_CPU_SKU_SCORING"
     )
-    compute_name_scoring: Optional[str] = os.environ.get(
+    compute_name_scoring: Optional[str] = Setting(
         "AML_COMPUTE_CLUSTER_NAME_SCORING"
     )
-    vm_priority_scoring: Optional[str] = os.environ.get(
+    vm_priority_scoring: Optional[str] = Setting(
         "AML_CLUSTER_PRIORITY_SCORING", "lowpriority"
     )
-    min_nodes_scoring: int = int(
-        os.environ.get("AML_CLUSTER_MIN_NODES_SCORING", 0)
-    )  # NOQA: E501
-    max_nodes_scoring: int = int(
-        os.environ.get("AML_CLUSTER_MAX_NODES_SCORING", 4)
-    )  # NOQA: E501
-    rebuild_env_scoring: Optional[bool] = os.environ.get(
-        "AML_REBUILD_ENVIRONMENT_SCORING", "false"
-    ).lower().strip() == "true"
-    scoring_datastore_storage_name: Optional[str] = os.environ.get(
+    min_nodes_scoring: int = Setting("AML_CLUSTER_MIN_NODES_SCORING", 0, int)
+    max_nodes_scoring: int = Setting("AML_CLUSTER_MAX_NODES_SCORING", 4, int)
+    # ParallelRunStep settings, see ml_service/util/batchscore_tuner.py.
+    # Zero process and node counts fall back to the AML default and
+    # max_nodes_scoring respectively.
+    scoring_mini_batch_size: str = Setting("SCORING_MINI_BATCH_SIZE", "1MB")
+    scoring_process_count_per_node: int = Setting(
+        "SCORING_PROCESS_COUNT_PER_NODE", 0, int
+    )
+    scoring_node_count: int = Setting("SCORING_NODE_COUNT", 0, int)
+    scoring_run_invocation_timeout: int = Setting(
+        "SCORING_RUN_INVOCATION_TIMEOUT", 300, int
+    )
+    scoring_error_threshold: int = Setting("SCORING_ERROR_THRESHOLD", 10, int)
+    scoring_checkpoint_path: str = Setting(
+        "SCORING_CHECKPOINT_PATH", "scoring_checkpoints"
+    )
+    # Comma separated name[:version] models scored alongside MODEL_NAME by
+    # the batch scoring pipeline, one score column each
+    scoring_additional_models: Optional[str] = Setting(
+        "SCORING_ADDITIONAL_MODELS"
+    )
+    # Rows cached per scoring worker so repeated rows are predicted once,
+    # 0 disables the cache
+    scoring_prediction_cache_size: int = Setting(
+        "SCORING_PREDICTION_CACHE_SIZE", 0, int
+    )
+    # Seconds a cached prediction is reused, 0 keeps it until it is evicted
+    scoring_prediction_cache_ttl_seconds: float = Setting(
+        "SCORING_PREDICTION_CACHE_TTL_SECONDS", 0, float
+    )
+    # "append_row" collects all scores in one parallel_run_step.txt,
+    # "sharded" has every worker write its own shard files plus a manifest,
+    # see diabetes_regression/util/sharded_output.py
+    scoring_output_layout: str = Setting(
+        "SCORING_OUTPUT_LAYOUT", "append_row",
+        as_choice("append_row", "sharded")
+    )
+    scoring_output_partition_by: str = Setting(
+        "SCORING_OUTPUT_PARTITION_BY", ""
+    )
+    # Format the append_row output is copied to the output container in,
+    # "txt" copies it as is, see diabetes_regression/util/output_conversion.py
+    scoring_output_format: str = Setting(
+        "SCORING_OUTPUT_FORMAT", "txt",
+        as_choice("txt", "csv", "jsonl", "parquet")
+    )
+    rebuild_env_scoring: Optional[bool] = Setting(
+        "AML_REBUILD_ENVIRONMENT_SCORING", False, as_bool
+    )
+    scoring_datastore_storage_name: Optional[str] = Setting(
         "SCORING_DATASTORE_STORAGE_NAME"
     )
-    scoring_datastore_access_key: Optional[str] = os.environ.get(
+    scoring_datastore_access_key: Optional[str] = Setting(
         "SCORING_DATASTORE_ACCESS_KEY"
     )
-    scoring_datastore_input_container: Optional[str] = os.environ.get(
+    scoring_datastore_input_container: Optional[str] = Setting(
         "SCORING_DATASTORE_INPUT_CONTAINER"
     )
-    scoring_datastore_input_filename: Optional[str] = os.environ.get(
+    scoring_datastore_input_filename: Optional[str] = Setting(
         "SCORING_DATASTORE_INPUT_FILENAME"
     )
-    scoring_datastore_output_container: Optional[str] = os.environ.get(
+    scoring_datastore_output_container: Optional[str] = Setting(
         "SCORING_DATASTORE_OUTPUT_CONTAINER"
     )
-    scoring_datastore_output_filename: Optional[str] = os.environ.get(
+    scoring_datastore_output_filename: Optional[str] = Setting(
         "SCORING_DATASTORE_OUTPUT_FILENAME"
     )
-    scoring_dataset_name: Optional[str] = os.environ.get(
-        "SCORING_DATASET_NAME"
-    )  # NOQA: E501
-    scoring_pipeline_name: Optional[str] = os.environ.get(
-        "SCORING_PIPELINE_NAME"
-    )  # NOQA: E501
-    aml_env_name_scoring: Optional[str] = os.environ.get(
-        "AML_ENV_NAME_SCORING"
-    )  # NOQA: E501
-    aml_env_name_score_copy: Optional[str] = os.environ.get(
+    scoring_dataset_name: Optional[str] = Setting("SCORING_DATASET_NAME")
+    scoring_pipeline_name: Optional[str] = Setting("SCORING_PIPELINE_NAME")
+    aml_env_name_scoring: Optional[str] = Setting("AML_ENV_NAME_SCORING")
+    aml_env_name_score_copy: Optional[str] = Setting(
         "AML_ENV_NAME_SCORE_COPY"
-    )  # NOQA: E501
-    batchscore_script_path: Optional[str] = os.environ.get(
-        "BATCHSCORE_SCRIPT_PATH"
-    )  # NOQA: E501
-    batchscore_copy_script_path: Optional[str] = os.environ.get(
+    )
+    batchscore_script_path: Optional[str] = Setting("BATCHSCORE_SCRIPT_PATH")
+    batchscore_copy_script_path: Optional[str] = Setting(
         "BATCHSCORE_COPY_SCRIPT_PATH"
-    )  # NOQA: E501
+    )
+
+    # Settings that must be set for each profile
+    REQUIRED = {
+        "train": (
+            "workspace_name", "resource_group", "subscription_id",
+            "compute_name", "vm_size", "experiment_name", "model_name",
+            "sources_directory_train", "train_script_path",
+        ),
+        "scoring": (
+            "workspace_name", "resource_group", "subscription_id",
+            "compute_name_scoring", "vm_size_scoring", "model_name",
+            "sources_directory_train", "batchscore_script_path",
+        ),
+        "local": (
+            "model_name", "dataset_name", "sources_directory_train",
+            "train_script_path", "evaluate_script_path",
+            "register_script_path",
+        ),
+    }
+
+    def __init__(self, profile: str = None, environ: Dict[str, str] = None):
+        if environ is None:
+            _load_dotenv()
+            environ = os.environ
+        self.__dict__["_environ"] = environ
+        self.__dict__["_values"] = {}
+        profile = (profile or environ.get("ENV_PROFILE") or "").strip()
+        profile = profile.lower() or None
+        if profile is not None and profile not in PROFILES:
+            raise ValueError("Unknown profile {}, expected one of {}".format(
+                profile, PROFILES))
+        self.__dict__["profile"] = profile
+
+    @classmethod
+    def settings(cls) -> Dict[str, Setting]:
+        return {
+            name: value for (name, value) in vars(cls).items()
+            if isinstance(value, Setting)
+        }
+
+    def resolve(self, setting: Setting):
+        """
+        Returns the value of a setting: the profile override if set, then
+        the environment variable, then the default.
+        """
+        value = None
+        if self.profile is not None:
+            value = self._environ.get(
+                "{}__{}".format(setting.key, self.profile.upper()))
+        if value is None:
+            value = self._environ.get(setting.key)
+        if value is None:
+            default = setting.default
+            return default() if callable(default) else default
+        try:
+            return setting.parse(value)
+        except ValueError as e:
+            raise ValueError("{}={!r}: {}".format(setting.key, value, e))
+
+    def validate(
+        self,
+        profile: str = None,
+        required: Iterable[str] = None,
+    ) -> Dict[str, object]:
+        """
+        Resolves every setting and checks the settings required by the
+        profile are set.
+
+        :param profile: Profile whose required settings are checked,
+            the profile of this Env by default
+        :param required: Names of the settings to check instead of those
+            of the profile, for entry points that need fewer of them
+
+        :returns: Value of every setting, by name
+
+        :raises: ValueError listing every invalid or missing setting
+        """
+        values = {}
+        errors = []
+        for name in self.settings():
+            try:
+                values[name] = getattr(self, name)
+            except ValueError as e:
+                errors.append(str(e))
+        settings = self.settings()
+        profile = profile or self.profile
+        reason = ""
+        if required is None:
+            required = self.REQUIRED.get(profile, ())
+            reason = " for the {} profile".format(profile)
+        for name in required:
+            if values.get(name) in (None, ""):
+                errors.append("{} is required{}".format(
+                    settings[name].key, reason))
+        if errors:
+            raise ValueError(
+                "Invalid configuration:\n  " + "\n  ".join(errors))
+        return values
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Env settings are read only")
+
+    def __repr__(self):
+        return "Env(profile={!r})".format(self.profile)
@@ -0,0 +1,402 @@
+"""Stand-ins for the Azure ML SDK classes the pipeline step scripts use,
+backed by a LocalRegistry.
+
+Local pipeline steps run with ml_service/util/local_aml_shim first on
+PYTHONPATH, so `from azureml.core import Run` in train_aml.py,
+evaluate_model.py and register_model.py resolves to the classes below. Only
+the part of the SDK those scripts call is implemented. The registry and the
+current run are taken from the LOCAL_AML_REGISTRY and LOCAL_AML_RUN_ID
+environment variables, which the local executor sets for each step.
+
+AMLRequest, AMLResponse and rawhttp stand in for the web service request
+classes, so the scoring entry script can be called without a scoring
+container, e.g. by ml_service/util/benchmark.py.
+"""
+import glob
+import io
+import os
+import shutil
+from typing import Iterator, List
+
+from ml_service.util.local_registry import DEFAULT_DATASTORE, LocalRegistry
+
+REGISTRY_VARIABLE = "LOCAL_AML_REGISTRY"
+RUN_ID_VARIABLE = "LOCAL_AML_RUN_ID"
+
+
+def get_registry() -> LocalRegistry:
+    root = os.environ.get(REGISTRY_VARIABLE)
+    if root is None:
+        raise RuntimeError(
+            "{} is not set, local AML objects are only available in steps "
+            "run by ml_service.util.local_pipeline".format(REGISTRY_VARIABLE))
+    return LocalRegistry(root)
+
+
+class Workspace:
+    """Local workspace, there is one per registry"""
+
+    name = "local"
+
+    def __init__(self, *args, **kwargs):
+        self._registry = get_registry()
+
+    @classmethod
+    def get(cls, *args, **kwargs) -> "Workspace":
+        return cls()
+
+    @property
+    def datasets(self) -> dict:
+        return {name: Dataset.get_by_name(self, name)
+                for name in self._registry.dataset_names()}
+
+    @property
+    def datastores(self) -> dict:
+        root = self._registry.datastore_path()
+        return {name: Datastore(self, name)
+                for name in os.listdir(os.path.dirname(root))}
+
+    def get_default_datastore(self) -> "Datastore":
+        return Datastore(self, DEFAULT_DATASTORE)
+
+
+class Experiment:
+    def __init__(self, workspace: Workspace, name: str):
+        self.workspace = workspace
+        self.name = name
+
+
+class Datastore:
+    def __init__(self, workspace: Workspace, name: str = DEFAULT_DATASTORE):
+        self.workspace = workspace
+        self.name = name
+        self.path = workspace._registry.datastore_path(name)
+
+    @classmethod
+    def get(cls, workspace: Workspace, datastore_name: str) -> "Datastore":
+        return cls(workspace, datastore_name)
+
+    def upload_files(self, files: List[str], target_path: str = None,
+                     overwrite: bool = False, show_progress: bool = True):
+        paths = self.workspace._registry.upload_files(
+            files, target_path, self.name)
+        return [(self, p) for p in paths]
+
+
+def _resolve_paths(workspace: Workspace, path) -> List[tuple]:
+    # Accepts (datastore, path) tuples, lists of them, or local file paths
+    if isinstance(path, (str, tuple)):
+        path = [path]
+    resolved = []
+    for p in path:
+        if isinstance(p, str):
+            resolved.append((None, os.path.abspath(p)))
+        else:
+            resolved.append((p[0].name, p[1]))
+    return resolved
+
+
+class _Dataset:
+    """Registered or unregistered file or tabular dataset"""
+
+    def __init__(self, workspace: Workspace, paths: List[tuple],
+                 kind: str, record: dict = None):
+        self._workspace = workspace
+        self._paths = paths
+        self._kind = kind
+        record = record or {}
+        self.id = record.get("id")
+        self.name = record.get("name")
+        self.version = record.get("version")
+        self.tags = record.get("tags", {})
+        self.description = record.get("description")
+
+    def _files(self) -> List[str]:
+        files = []
+        for (datastore, path) in self._paths:
+            if datastore is not None:
+                path = os.path.join(
+                    self._workspace._registry.datastore_path(datastore), path)
+            files.extend(sorted(glob.glob(path)) or [path])
+        return files
+
+    def register(self, workspace: Workspace, name: str,
+                 description: str = None, tags: dict = None,
+                 create_new_version: bool = False) -> "_Dataset":
+        registry = workspace._registry
+        datastores = {d for (d, _) in self._paths}
+        if datastores == {None}:
+            # Local files are uploaded like the SDK does for local paths
+            paths = registry.upload_files(self._files(), "datasets/" + name)
+            datastore = DEFAULT_DATASTORE
+        elif len(datastores) == 1:
+            paths = [p for (_, p) in self._paths]
+            datastore = datastores.pop()
+        else:
+            raise ValueError("A dataset must reference a single datastore")
+        record = registry.register_dataset(
+            name, paths, datastore, tags, description, self._kind)
+        return _from_record(workspace, record)
+
+    def as_named_input(self, name: str) -> "_Dataset":
+        return self
+
+    def to_pandas_dataframe(self):
+        import pandas as pd
+
+        return pd.concat(
+            [pd.read_csv(f) for f in self._files()], ignore_index=True)
+
+    def download(self, target_path: str = None,
+                 overwrite: bool = False) -> List[str]:
+        target_path = target_path or os.getcwd()
+        os.makedirs(target_path, exist_ok=True)
+        downloaded = []
+        for f in self._files():
+            dest = os.path.join(target_path, os.path.basename(f))
+            if overwrite or not os.path.exists(dest):
+                shutil.copyfile(f, dest)
+            downloaded.append(dest)
+        return downloaded
+
+
+def _from_record(workspace: Workspace, record: dict) -> _Dataset:
+    paths = [(record["datastore"], p) for p in record["paths"]]
+    return _Dataset(workspace, paths, record["kind"], record)
+
+
+class _TabularDatasetFactory:
+    @staticmethod
+    def from_delimited_files(path, **kwargs) -> _Dataset:
+        ws = Workspace()
+        return _Dataset(ws, _resolve_paths(ws, path), "tabular")
+
+
+class _FileDatasetFactory:
+    @staticmethod
+    def from_files(path, **kwargs) -> _Dataset:
+        ws = Workspace()
+        return _Dataset(ws, _resolve_paths(ws, path), "file")
+
+
+class Dataset:
+    Tabular = _TabularDatasetFactory
+    File = _FileDatasetFactory
+
+    @staticmethod
+    def get_by_name(workspace: Workspace, name: str,
+                    version="latest") -> _Dataset:
+        return _from_record(
+            workspace, workspace._registry.get_dataset(name, version))
+
+    @staticmethod
+    def get_by_id(workspace: Workspace, id: str) -> _Dataset:
+        return _from_record(
+            workspace, workspace._registry.get_dataset_by_id(id))
+
+
+class Run:
+    """Run of a local pipeline or one of its steps"""
+
+    def __init__(self, run_id: str, registry: LocalRegistry = None):
+        self.id = run_id
+        self._registry = registry or get_registry()
+        self.input_datasets = {}
+
+    @classmethod
+    def get_context(cls, allow_offline: bool = True) -> "Run":
+        run_id = os.environ.get(RUN_ID_VARIABLE)
+        if run_id is None:
+            raise RuntimeError(
+                "{} is not set, the script is not run by "
+                "ml_service.util.local_pipeline".format(RUN_ID_VARIABLE))
+        return cls(run_id)
+
+    @classmethod
+    def list(cls, experiment: Experiment, properties: dict = None,
+             tags: dict = None, status: str = None,
+             include_children: bool = False) -> Iterator["Run"]:
+        registry = experiment.workspace._registry
+        for record in registry.list_runs(experiment=experiment.name):
+            if record["parent_id"] is not None and not include_children:
+                continue
+            if status is not None and record["status"] != status:
+                continue
+            if any(record["properties"].get(k) != v
+                   for (k, v) in (properties or {}).items()):
+                continue
+            if any(record["tags"].get(k) != v
+                   for (k, v) in (tags or {}).items()):
+                continue
+            yield cls(record["id"], registry)
+
+    def _record(self) -> dict:
+        return self._registry.get_run(self.id)
+
+    @property
+    def parent(self) -> "Run":
+        parent_id = self._record()["parent_id"]
+        return Run(parent_id, self._registry) if parent_id else None
+
+    @property
+    def experiment(self) -> Experiment:
+        return Experiment(Workspace(), self._record()["experiment"])
+
+    @property
+    def tags(self) -> dict:
+        return self._record()["tags"]
+
+    @property
+    def properties(self) -> dict:
+        return self._record()["properties"]
+
+    def get_status(self) -> str:
+        return self._record()["status"]
+
+    def get_tags(self) -> dict:
+        return self.tags
+
+    def get_metrics(self) -> dict:
+        return self._record()["metrics"]
+
+    def log(self, name: str, value, description: str = ""):
+        self._registry.log_metric(self.id, name, value)
+
+    def tag(self, key: str, value=None):
+        self._registry.update_run(
+            self.id, lambda r: r["tags"].__setitem__(key, value))
+
+    def add_properties(self, properties: dict):
+        self._registry.update_run(
+            self.id, lambda r: r["properties"].update(properties))
+
+    def download_file(self, name: str, output_file_path: str = None):
+        source = os.path.join(self._registry.run_dir(self.id), name)
+        shutil.copyfile(source, output_file_path or os.path.basename(name))
+
+    def complete(self):
+        self._registry.set_status(self.id, "Completed")
+
+    def cancel(self):
+        self._registry.set_status(self.id, "Canceled")
+
+    def fail(self, error_details=None):
+        self._registry.set_status(self.id, "Failed")
+
+
+class Model:
+    """Registered model version"""
+
+    def __init__(self, workspace: Workspace, name: str = None,
+                 id: str = None, tags=None, version: int = None,
+                 _record: dict = None):
+        if _record is None:
+            if id is not None:
+                name, version = id.split(":")
+            models = [
+                m for m in workspace._registry.list_models(name, tags)
+                if version is None or m["version"] == int(version)
+            ]
+            if not models:
+                raise KeyError("Model {} version {} not found".format(
+                    name, version))
+            _record = models[0]
+        self.workspace = workspace
+        self.name = _record["name"]
+        self.version = _record["version"]
+        self.id = "{}:{}".format(self.name, self.version)
+        self.tags = _record["tags"]
+        self.run_id = _record["run_id"]
+        self.description = _record["description"]
+        self.path = _record["path"]
+
+    @staticmethod
+    def get_model_path(model_name: str, version: int = None,
+                       _workspace: Workspace = None) -> str:
+        """
+        Path of a registered model file, the latest version by default.
+        In a web service the path is under AZUREML_MODEL_DIR; locally it is
+        in the registry.
+        """
+        models = [
+            m for m in get_registry().list_models(model_name)
+            if version is None or m["version"] == int(version)
+        ]
+        if not models:
+            raise KeyError("Model {} version {} not found".format(
+                model_name, version))
+        return models[0]["path"]
+
+    @classmethod
+    def list(cls, workspace: Workspace, name: str = None, tags=None,
+             run_id: str = None, latest: bool = False) -> List["Model"]:
+        return [
+            cls(workspace, _record=r) for r in
+            workspace._registry.list_models(name, tags, run_id, latest)
+        ]
+
+    @classmethod
+    def register(cls, workspace: Workspace, model_path: str,
+                 model_name: str, tags: dict = None,
+                 description: str = None, datasets=None,
+                 **kwargs) -> "Model":
+        run_id = os.environ.get(RUN_ID_VARIABLE)
+        record = workspace._registry.register_model(
+            model_name, model_path, tags, run_id, description,
+            {scenario: d.id for (scenario, d) in datasets or []})
+        return cls(workspace, _record=record)
+
+
+class _Headers(dict):
+    # Case-insensitive, like the HTTP headers of a werkzeug request
+    def __init__(self, headers: dict = None):
+        super().__init__(
+            (k.lower(), v) for (k, v) in (headers or {}).items())
+
+    def __getitem__(self, name: str):
+        return super().__getitem__(name.lower())
+
+    def __contains__(self, name) -> bool:
+        return super().__contains__(name.lower())
+
+    def get(self, name: str, default=None):
+        return super().get(name.lower(), default)
+
+
+class AMLRequest:
+    """Web service request with a body of bytes"""
+
+    def __init__(self, body: bytes = b"", method: str = "POST",
+                 headers: dict = None):
+        self.method = method
+        self.headers = _Headers(headers)
+        self._body = body
+        self.stream = io.BytesIO(body)
+
+    def get_data(self) -> bytes:
+        return self._body
+
+
+class AMLResponse:
+    """
+    Web service response. A body given as an iterable is only consumed by
+    get_data, like a streamed response.
+    """
+
+    def __init__(self, response, status: int, headers: dict = None,
+                 json_str: bool = False):
+        self.response = response
+        self.status_code = status
+        self.headers = _Headers(headers)
+
+    def get_data(self) -> bytes:
+        parts = [self.response] \
+            if isinstance(self.response, (bytes, str)) else self.response
+        return b"".join(
+            p if isinstance(p, bytes) else p.encode("utf-8") for p in parts)
+
+
+def rawhttp(func):
+    """Marks a run function as taking the AMLRequest instead of the body"""
+    func.rawhttp = True
+    return func
@@ -0,0 +1,5 @@
+"""Local stand-in for the azureml package, see ml_service/util/local_aml.py
+
+Only put on sys.path by ml_service/util/local_pipeline.py for local steps
+and by ml_service/util/benchmark.py.
+"""
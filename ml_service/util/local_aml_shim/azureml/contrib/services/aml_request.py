@@ -0,0 +1 @@
+from ml_service.util.local_aml import AMLRequest, rawhttp  # NOQA: F401
@@ -0,0 +1 @@
+from ml_service.util.local_aml import AMLResponse  # NOQA: F401
@@ -0,0 +1,3 @@
+from ml_service.util.local_aml import (  # NOQA: F401
+    Dataset, Datastore, Experiment, Model, Run, Workspace,
+)
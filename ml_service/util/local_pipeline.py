@@ -0,0 +1,293 @@
+"""Runs a pipeline of Python script steps locally, without AML compute.
+
+LocalPythonScriptStep and LocalPipelineData take the same arguments as the
+AML PythonScriptStep and PipelineData, so a pipeline build script can
+declare its steps once and run them either in AML or locally, see
+diabetes_regression_build_train_pipeline.py --local.
+
+Each step runs on a snapshot of its source directory, like in AML, with
+the Azure ML SDK replaced by the registry-backed stand-ins of
+ml_service/util/local_aml.py. A step starts as soon as the steps it
+depends on, through run_after or by consuming their PipelineData, have
+completed, so independent steps run in parallel. When more steps are ready
+than there are workers, the steps with the longest chain of work after
+them, estimated from earlier runs, start first, and the critical path of
+every run is reported, see ml_service/util/step_graph.py. Steps normally
+run as subprocesses; in_process runs them in this interpreter, one at a time,
+which is slower but lets a debugger step into the scripts.
+"""
+import contextlib
+import importlib.util
+import os
+import runpy
+import shutil
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List, Tuple
+
+from ml_service.util.local_aml import REGISTRY_VARIABLE, RUN_ID_VARIABLE
+from ml_service.util.local_registry import LocalRegistry
+from ml_service.util.step_graph import (
+    format_critical_path, schedule, topological_order, upward_ranks)
+
+SHIM_PATH = os.path.join(os.path.dirname(__file__), "local_aml_shim")
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+
+# Serializes in-process steps, which share cwd, argv and sys.modules
+_in_process_lock = threading.Lock()
+
+
+class LocalPipelineData:
+    """Directory passed from the step producing it to the steps using it"""
+
+    def __init__(self, name: str, datastore=None, **kwargs):
+        self.name = name
+        self.path = None
+
+    def __str__(self):
+        return self.path or self.name
+
+
+class LocalPythonScriptStep:
+    """
+    Python script step. Arguments the local executor has no use for, like
+    compute_target, runconfig and allow_reuse, are accepted and ignored.
+    """
+
+    def __init__(self, name: str, script_name: str, source_directory: str,
+                 arguments: list = None, inputs: list = None,
+                 outputs: list = None, **kwargs):
+        self.name = name.strip()
+        self.script_name = script_name
+        self.source_directory = source_directory
+        self.arguments = list(arguments or [])
+        self.inputs = list(inputs or [])
+        self.outputs = list(outputs or [])
+        self.predecessors = []
+
+    def run_after(self, step: "LocalPythonScriptStep"):
+        self.predecessors.append(step)
+
+
+def get_dependencies(
+    steps: List[LocalPythonScriptStep]
+) -> Dict[str, List[str]]:
+    """
+    Returns the names of the steps each step waits for.
+
+    :raises: ValueError for steps depending on steps outside the pipeline,
+        or depending on each other in a cycle
+    """
+    producers = {id(o): s.name for s in steps for o in s.outputs}
+    names = {s.name for s in steps}
+    dependencies = {}
+    for step in steps:
+        deps = [p.name for p in step.predecessors]
+        for i in step.inputs:
+            if id(i) not in producers:
+                raise ValueError("No step produces input {} of {}".format(
+                    i.name, step.name))
+            deps.append(producers[id(i)])
+        unknown = set(deps) - names
+        if unknown:
+            raise ValueError("{} runs after steps not in the pipeline: "
+                             "{}".format(step.name, sorted(unknown)))
+        dependencies[step.name] = sorted(set(deps))
+    topological_order(dependencies)
+    return dependencies
+
+
+def load_script(name: str, path: str, source_directory: str = None):
+    """
+    Imports a step or entry script as module name, with its source
+    directory and the stand-ins for the Azure ML SDK first on sys.path, so
+    its functions can be called in this process, e.g. the init and run
+    functions of a scoring script.
+
+    :param source_directory: Directory the script imports its modules
+        from, the directory of the script by default
+    """
+    source_directory = source_directory or os.path.dirname(
+        os.path.abspath(path))
+    for p in (source_directory, SHIM_PATH):
+        if p not in sys.path:
+            sys.path.insert(0, p)
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _snapshot(source_directory: str, dest: str):
+    shutil.copytree(source_directory, dest, ignore=shutil.ignore_patterns(
+        "__pycache__", "*.pyc", "outputs", ".pytest_cache"))
+
+
+@contextlib.contextmanager
+def _process_state(cwd: str, argv: List[str], env: Dict[str, str]):
+    # Swaps in the working directory, argv, environment and import state of
+    # a step and restores them, dropping every module the step imported
+    saved = (os.getcwd(), sys.argv, list(sys.path), dict(os.environ),
+             set(sys.modules))
+    os.chdir(cwd)
+    sys.argv = argv
+    sys.path[:0] = [os.path.dirname(os.path.abspath(argv[0])), SHIM_PATH,
+                    cwd]
+    os.environ.update(env)
+    sdk_modules = {m: sys.modules.pop(m) for m in list(sys.modules)
+                   if m == "azureml" or m.startswith("azureml.")}
+    try:
+        yield
+    finally:
+        os.chdir(saved[0])
+        sys.argv = saved[1]
+        sys.path[:] = saved[2]
+        os.environ.clear()
+        os.environ.update(saved[3])
+        for name in set(sys.modules) - saved[4]:
+            del sys.modules[name]
+        sys.modules.update(sdk_modules)
+
+
+class LocalPipeline:
+    """
+    Pipeline of LocalPythonScriptSteps, run against a LocalRegistry.
+    """
+
+    def __init__(self, steps: List[LocalPythonScriptStep],
+                 registry: LocalRegistry, in_process: bool = False,
+                 max_workers: int = None):
+        self.steps = {s.name: s for s in steps}
+        if len(self.steps) != len(steps):
+            raise ValueError("Step names must be unique")
+        self.dependencies = get_dependencies(steps)
+        self.registry = registry
+        self.in_process = in_process
+        # In-process steps take turns, so more workers would only wait
+        self.max_workers = 1 if in_process else \
+            max_workers or min(len(steps), os.cpu_count())
+
+    def _arguments(self, step: LocalPythonScriptStep) -> List[str]:
+        # Options whose value is None are left out, so the script default
+        # applies, like for an unset pipeline parameter in AML
+        args = []
+        for arg in step.arguments:
+            if arg is None:
+                if args and str(args[-1]).startswith("--"):
+                    args.pop()
+                continue
+            args.append(str(arg))
+        return args
+
+    def _estimate_durations(self, experiment: str) -> Dict[str, float]:
+        # Median duration of the last completed runs of each step
+        durations = {}
+        for record in self.registry.list_runs(experiment=experiment):
+            name = record["name"]
+            if (record["parent_id"] is None or name not in self.steps
+                    or record["status"] != "Completed"
+                    or "duration_seconds" not in record["properties"]):
+                continue
+            durations.setdefault(name, [])
+            if len(durations[name]) < 5:
+                durations[name].append(
+                    record["properties"]["duration_seconds"])
+        return {n: statistics.median(d) for (n, d) in durations.items()}
+
+    def _run_step(self, step: LocalPythonScriptStep, parent_id: str,
+                  experiment: str) -> Tuple[str, float, float]:
+        run_id = self.registry.create_run(
+            experiment, parent_id=parent_id, name=step.name)
+        run_dir = self.registry.run_dir(run_id)
+        snapshot = os.path.join(run_dir, "snapshot")
+        _snapshot(step.source_directory, snapshot)
+        os.makedirs(os.path.join(run_dir, "logs"), exist_ok=True)
+        log_path = os.path.join(run_dir, "logs", "std_log.txt")
+        argv = [os.path.join(snapshot, step.script_name)] + \
+            self._arguments(step)
+        env = {REGISTRY_VARIABLE: self.registry.root, RUN_ID_VARIABLE: run_id}
+
+        start = time.monotonic()
+        if self.in_process:
+            returncode = self._run_in_process(snapshot, argv, env)
+        else:
+            pythonpath = [SHIM_PATH, snapshot, REPO_ROOT]
+            if os.environ.get("PYTHONPATH"):
+                pythonpath.append(os.environ["PYTHONPATH"])
+            env["PYTHONPATH"] = os.pathsep.join(pythonpath)
+            with open(log_path, "w") as log:
+                returncode = subprocess.call(
+                    [sys.executable] + argv, cwd=snapshot,
+                    env=dict(os.environ, **env),
+                    stdout=log, stderr=subprocess.STDOUT)
+
+        # Files written to ./outputs are kept with the run, like in AML
+        if os.path.isdir(os.path.join(snapshot, "outputs")):
+            shutil.move(os.path.join(snapshot, "outputs"),
+                        os.path.join(run_dir, "outputs"))
+        shutil.rmtree(snapshot, ignore_errors=True)
+        end = time.monotonic()
+        self.registry.update_run(run_id, lambda r: r["properties"].update(
+            duration_seconds=end - start))
+        status = self.registry.set_status(
+            run_id, "Completed" if returncode == 0 else "Failed")
+        print("{} {} after {:.1f}s, run {}".format(
+            step.name, status.lower(), end - start, run_id))
+        if status == "Failed" and not self.in_process:
+            print("  see {}".format(log_path))
+        return (status, start, end)
+
+    def _run_in_process(self, snapshot: str, argv: List[str],
+                        env: Dict[str, str]) -> int:
+        with _in_process_lock, _process_state(snapshot, argv, env):
+            try:
+                runpy.run_path(argv[0], run_name="__main__")
+            except SystemExit as e:
+                return 0 if e.code in (None, 0) else 1
+            except Exception:
+                import traceback
+
+                traceback.print_exc()
+                return 1
+        return 0
+
+    def run(self, experiment: str, tags: dict = None) -> Dict[str, str]:
+        """
+        Runs every step once the steps it depends on have completed. Steps
+        depending on a failed step are skipped, and no step is started
+        once a step cancels the pipeline run. Ready steps start in order of
+        upward rank, the longest expected chain of work after them.
+
+        :returns: Status of each step, and of the pipeline run under the
+            key "pipeline"
+        """
+        parent_id = self.registry.create_run(experiment, tags=tags)
+        parent_dir = self.registry.run_dir(parent_id)
+        for step in self.steps.values():
+            for output in step.outputs:
+                output.path = os.path.join(parent_dir, "data", output.name)
+                os.makedirs(output.path, exist_ok=True)
+        print("Running {} steps locally, pipeline run {}".format(
+            len(self.steps), parent_id))
+
+        ranks = upward_ranks(
+            self.dependencies, self._estimate_durations(experiment))
+        (statuses, times, worker_from) = schedule(
+            self.dependencies,
+            lambda name: self._run_step(
+                self.steps[name], parent_id, experiment),
+            self.max_workers,
+            ranks,
+            lambda: self.registry.get_run(parent_id)["status"] == "Canceled")
+
+        print(format_critical_path(self.dependencies, times, worker_from))
+        failed = any(s == "Failed" for s in statuses.values())
+        statuses["pipeline"] = self.registry.set_status(
+            parent_id, "Failed" if failed else "Completed")
+        print("Pipeline run {} {}".format(
+            parent_id, statuses["pipeline"].lower()))
+        return statuses
@@ -0,0 +1,337 @@
+"""Filesystem-backed registry of runs, models and datasets for local
+pipeline runs.
+
+The registry stands in for the workspace when the training pipeline runs
+locally, see ml_service/util/local_pipeline.py. Everything is kept as JSON
+and plain files under one root directory:
+
+    runs/<run id>/run.json          status, metrics, tags and properties
+    runs/<run id>/outputs/          files the step wrote to ./outputs
+    runs/<run id>/logs/             step output
+    models/<name>/<version>/        registered model files and model.json
+    datasets/<name>/<version>.json  registered datasets
+    datastores/<name>/              datastore content
+
+Steps run in parallel processes, so every update of a record takes a lock
+file and replaces the record atomically.
+"""
+import contextlib
+import json
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterator, List
+
+DEFAULT_DATASTORE = "workspaceblobstore"
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _read_json(path: str):
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_json(path: str, value):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = "{}.{}.tmp".format(path, uuid.uuid4().hex)
+    with open(tmp, "w") as f:
+        json.dump(value, f, indent=2, sort_keys=True, default=str)
+    os.replace(tmp, path)
+
+
+@contextlib.contextmanager
+def _locked(path: str, timeout_seconds: float = 30):
+    lock = path + ".lock"
+    os.makedirs(os.path.dirname(lock), exist_ok=True)
+    deadline = time.monotonic() + timeout_seconds
+    while True:
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            if time.monotonic() > deadline:
+                raise TimeoutError("Could not lock {}".format(path))
+            time.sleep(0.01)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        os.remove(lock)
+
+
+def _matches_tags(tags: dict, filters) -> bool:
+    # filters follow the AML SDK: a list of [name] or [name, value]
+    for f in filters or []:
+        if f[0] not in tags:
+            return False
+        if len(f) > 1 and str(tags[f[0]]) != str(f[1]):
+            return False
+    return True
+
+
+class LocalRegistry:
+    """
+    Runs, models and datasets of local pipeline runs, stored under root.
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+
+    def _path(self, *parts: str) -> str:
+        return os.path.join(self.root, *parts)
+
+    # Runs
+
+    def run_dir(self, run_id: str) -> str:
+        return self._path("runs", run_id)
+
+    def create_run(self, experiment: str, parent_id: str = None,
+                   name: str = None, tags: dict = None) -> str:
+        """
+        Starts a run of experiment, a step run when parent_id is given.
+
+        :returns: Id of the new run
+        """
+        run_id = "{}_{}".format(name or experiment, uuid.uuid4().hex[:12])
+        run_id = run_id.replace(" ", "_")
+        _write_json(os.path.join(self.run_dir(run_id), "run.json"), {
+            "id": run_id,
+            "experiment": experiment,
+            "parent_id": parent_id,
+            "name": name or experiment,
+            "status": "Running",
+            "start_time": _now(),
+            "end_time": None,
+            "metrics": {},
+            "tags": dict(tags or {}),
+            "properties": {},
+        })
+        return run_id
+
+    def get_run(self, run_id: str) -> dict:
+        path = os.path.join(self.run_dir(run_id), "run.json")
+        if not os.path.exists(path):
+            raise KeyError("Run {} not found".format(run_id))
+        return _read_json(path)
+
+    def update_run(self, run_id: str, update: Callable[[dict], None]) -> dict:
+        """
+        Applies update to the run record in place, under the run lock.
+        """
+        path = os.path.join(self.run_dir(run_id), "run.json")
+        with _locked(path):
+            record = _read_json(path)
+            update(record)
+            _write_json(path, record)
+        return record
+
+    def log_metric(self, run_id: str, name: str, value):
+        # Like the AML SDK a metric logged more than once becomes a list
+        def update(record):
+            metrics = record["metrics"]
+            if name not in metrics:
+                metrics[name] = value
+            elif isinstance(metrics[name], list):
+                metrics[name].append(value)
+            else:
+                metrics[name] = [metrics[name], value]
+        self.update_run(run_id, update)
+
+    def set_status(self, run_id: str, status: str, final: bool = True):
+        """
+        Sets the status of a run. A Canceled or Failed run keeps its status.
+        """
+        def update(record):
+            if record["status"] in ("Canceled", "Failed"):
+                return
+            record["status"] = status
+            if final:
+                record["end_time"] = _now()
+        return self.update_run(run_id, update)["status"]
+
+    def list_runs(self, experiment: str = None,
+                  parent_id: str = None) -> Iterator[dict]:
+        """
+        Yields the runs of experiment, or the children of parent_id,
+        newest first.
+        """
+        runs_dir = self._path("runs")
+        if not os.path.isdir(runs_dir):
+            return
+        records = []
+        for run_id in os.listdir(runs_dir):
+            path = os.path.join(runs_dir, run_id, "run.json")
+            if not os.path.exists(path):
+                continue
+            record = _read_json(path)
+            if experiment is not None and record["experiment"] != experiment:
+                continue
+            if parent_id is not None and record["parent_id"] != parent_id:
+                continue
+            records.append(record)
+        yield from sorted(records, key=lambda r: r["start_time"],
+                          reverse=True)
+
+    # Datastores
+
+    def datastore_path(self, name: str = DEFAULT_DATASTORE) -> str:
+        path = self._path("datastores", name)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def upload_files(self, files: List[str], target_path: str = "",
+                     datastore: str = DEFAULT_DATASTORE) -> List[str]:
+        """
+        Copies files to target_path on a datastore.
+
+        :returns: Paths of the copies, relative to the datastore
+        """
+        paths = []
+        for f in files:
+            path = os.path.join(target_path or "", os.path.basename(f))
+            dest = os.path.join(self.datastore_path(datastore), path)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            shutil.copyfile(f, dest)
+            paths.append(path)
+        return paths
+
+    # Datasets
+
+    def _dataset_versions(self, name: str) -> List[int]:
+        path = self._path("datasets", name)
+        if not os.path.isdir(path):
+            return []
+        return sorted(int(f[:-len(".json")]) for f in os.listdir(path)
+                      if f.endswith(".json"))
+
+    def dataset_names(self) -> List[str]:
+        path = self._path("datasets")
+        if not os.path.isdir(path):
+            return []
+        return sorted(n for n in os.listdir(path) if self._dataset_versions(n))
+
+    def register_dataset(self, name: str, paths: List[str],
+                         datastore: str = DEFAULT_DATASTORE,
+                         tags: dict = None, description: str = None,
+                         kind: str = "tabular") -> dict:
+        """
+        Registers a new version of a dataset over files on a datastore.
+
+        :param paths: File paths relative to the datastore
+        """
+        dataset_dir = self._path("datasets", name)
+        with _locked(dataset_dir):
+            versions = self._dataset_versions(name)
+            version = versions[-1] + 1 if versions else 1
+            record = {
+                "id": uuid.uuid4().hex,
+                "name": name,
+                "version": version,
+                "kind": kind,
+                "datastore": datastore,
+                "paths": list(paths),
+                "tags": dict(tags or {}),
+                "description": description,
+                "created_time": _now(),
+            }
+            _write_json(
+                os.path.join(dataset_dir, "{}.json".format(version)), record)
+        return record
+
+    def get_dataset(self, name: str, version=None) -> dict:
+        """
+        Returns a dataset version, the latest when version is None or
+        "latest".
+        """
+        versions = self._dataset_versions(name)
+        if not versions:
+            raise KeyError("Dataset {} not found".format(name))
+        if version in (None, "latest"):
+            version = versions[-1]
+        path = self._path("datasets", name, "{}.json".format(int(version)))
+        if not os.path.exists(path):
+            raise KeyError("Dataset {} version {} not found".format(
+                name, version))
+        return _read_json(path)
+
+    def get_dataset_by_id(self, dataset_id: str) -> dict:
+        for name in self.dataset_names():
+            for version in self._dataset_versions(name):
+                record = self.get_dataset(name, version)
+                if record["id"] == dataset_id:
+                    return record
+        raise KeyError("Dataset {} not found".format(dataset_id))
+
+    # Models
+
+    def _model_versions(self, name: str) -> List[int]:
+        path = self._path("models", name)
+        if not os.path.isdir(path):
+            return []
+        return sorted(int(v) for v in os.listdir(path) if v.isdigit())
+
+    def register_model(self, name: str, model_path: str, tags: dict = None,
+                       run_id: str = None, description: str = None,
+                       datasets: Dict[str, str] = None) -> dict:
+        """
+        Registers a new version of a model, copying the model file or
+        directory into the registry.
+
+        :param datasets: Ids of the datasets the model was trained on, by
+            scenario, e.g. {"training data": id}
+        """
+        model_dir = self._path("models", name)
+        with _locked(model_dir):
+            versions = self._model_versions(name)
+            version = versions[-1] + 1 if versions else 1
+            version_dir = os.path.join(model_dir, str(version))
+            dest = os.path.join(version_dir, os.path.basename(model_path))
+            if os.path.isdir(model_path):
+                shutil.copytree(model_path, dest)
+            else:
+                os.makedirs(version_dir)
+                shutil.copyfile(model_path, dest)
+            record = {
+                "name": name,
+                "version": version,
+                "tags": dict(tags or {}),
+                "run_id": run_id,
+                "description": description,
+                "datasets": dict(datasets or {}),
+                "path": dest,
+                "created_time": _now(),
+            }
+            _write_json(os.path.join(version_dir, "model.json"), record)
+        return record
+
+    def list_models(self, name: str = None, tags=None, run_id: str = None,
+                    latest: bool = False) -> List[dict]:
+        """
+        Lists registered models, newest version first.
+
+        :param tags: Filters in the AML SDK format, a list of [name] or
+            [name, value]
+        :param latest: Only return the latest version of each model
+        """
+        models_dir = self._path("models")
+        if not os.path.isdir(models_dir):
+            return []
+        names = [name] if name is not None else sorted(os.listdir(models_dir))
+        models = []
+        for n in names:
+            for version in reversed(self._model_versions(n)):
+                record = _read_json(os.path.join(
+                    models_dir, n, str(version), "model.json"))
+                if run_id is not None and record["run_id"] != run_id:
+                    continue
+                if not _matches_tags(record["tags"], tags):
+                    continue
+                models.append(record)
+                if latest:
+                    break
+        return models
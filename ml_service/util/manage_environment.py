@@ -1,40 +1,141 @@
-
+import hashlib
+import json
 import os
+import re
+import tempfile
+import threading
 import traceback
-from azureml.core import Workspace, Environment
 from ml_service.util.env_variables import Env
-from azureml.core.runconfig import DEFAULT_CPU_IMAGE, DEFAULT_GPU_IMAGE
+
+# A comment starts a line or follows whitespace, so pip requirements such as
+# git+https://...#egg=name keep their fragment
+COMMENT = re.compile(r"(^|\s)#.*$")
+
+# Environments are provisioned concurrently by the pipeline builders, and
+# every update rewrites the whole index
+_index_lock = threading.Lock()
+
+
+def get_environment_hash(conda_dependencies_path: str, base_image: str = None):
+    """
+    Hashes the content of a conda file, ignoring comments, blank lines and
+    trailing whitespace, together with the docker base image.
+
+    :param conda_dependencies_path: Path of the conda file
+    :param base_image: Docker base image, None when docker is not configured
+
+    :returns: Hex digest identifying the environment content
+    """
+    sha = hashlib.sha256()
+    with open(conda_dependencies_path) as f:
+        for line in f:
+            line = COMMENT.sub("", line.rstrip("\n")).rstrip()
+            if line.strip():
+                sha.update((line + "\n").encode("utf-8"))
+    sha.update("base_image={}".format(base_image).encode("utf-8"))
+    return sha.hexdigest()
+
+
+def read_environment_index(index_path: str) -> dict:
+    if not os.path.exists(index_path):
+        return {}
+    with open(index_path) as f:
+        return json.load(f)
+
+
+def write_environment_index(index_path: str, index: dict):
+    index_dir = os.path.dirname(os.path.abspath(index_path))
+    os.makedirs(index_dir, exist_ok=True)
+    # A temporary file of its own, so concurrent writers never replace the
+    # index with each other's half written files
+    (fd, tmp_path) = tempfile.mkstemp(
+        dir=index_dir, prefix=os.path.basename(index_path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(index, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, index_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def update_environment_index(index_path: str, key: str, entry: dict):
+    """
+    Adds or replaces an entry of the index, keeping the entries other
+    threads add at the same time.
+    """
+    with _index_lock:
+        index = read_environment_index(index_path)
+        index[key] = entry
+        write_environment_index(index_path, index)
 
 
 def get_environment(
-    workspace: Workspace,
+    workspace,
     environment_name: str,
     conda_dependencies_file: str,
     create_new: bool = False,
     enable_docker: bool = None,
     use_gpu: bool = False
 ):
+    from azureml.core import Environment
+    from azureml.core.runconfig import DEFAULT_CPU_IMAGE, DEFAULT_GPU_IMAGE
+
     try:
         e = Env()
-        environments = Environment.list(workspace=workspace)
+        conda_dependencies_path = os.path.join(
+            e.sources_directory_train, conda_dependencies_file)
+        base_image = None
+        if enable_docker is not None:
+            base_image = DEFAULT_GPU_IMAGE if use_gpu else DEFAULT_CPU_IMAGE
+
+        # Environments are named after their content, so an environment is
+        # only registered, and its image only built, when the conda file or
+        # base image change. Environments already registered from this
+        # machine are kept in a local index.
+        content_hash = get_environment_hash(
+            conda_dependencies_path, base_image)
+        hashed_name = "{}-{}".format(environment_name, content_hash[:12])
+        index = read_environment_index(e.aml_env_index_path)
+        key = "{}:{}".format(workspace.name, content_hash)
+
         restored_environment = None
-        for env in environments:
-            if env == environment_name:
-                restored_environment = environments[environment_name]
+        if not create_new:
+            entry = index.get(key)
+            try:
+                if entry is not None:
+                    restored_environment = Environment.get(
+                        workspace, name=entry["name"],
+                        version=entry["version"])
+                else:
+                    # Look the environment up by name rather than listing
+                    # them all
+                    restored_environment = Environment.get(
+                        workspace, name=hashed_name)
+            except Exception:
+                restored_environment = None
+            if restored_environment is not None:
+                print("Reusing environment {} version {} for {}".format(
+                    restored_environment.name, restored_environment.version,
+                    conda_dependencies_file))
 
-        if restored_environment is None or create_new:
+        if restored_environment is None:
             new_env = Environment.from_conda_specification(
-                environment_name,
-                os.path.join(e.sources_directory_train, conda_dependencies_file),  # NOQA: E501
-            )  # NOQA: E501
-            restored_environment = new_env
+                hashed_name, conda_dependencies_path)
             if enable_docker is not None:
-                restored_environment.docker.enabled = enable_docker
-                restored_environment.docker.base_image = DEFAULT_GPU_IMAGE if use_gpu else DEFAULT_CPU_IMAGE  # NOQA: E501
-            restored_environment.register(workspace)
+                new_env.docker.enabled = enable_docker
+                new_env.docker.base_image = base_image
+            restored_environment = new_env.register(workspace)
+
+        update_environment_index(e.aml_env_index_path, key, {
+            "name": restored_environment.name,
+            "version": restored_environment.version,
+            "environment_name": environment_name,
+            "conda_dependencies_file": conda_dependencies_file,
+            "base_image": base_image,
+        })
 
-        if restored_environment is not None:
-            print(restored_environment)
+        print(restored_environment)
         return restored_environment
     except Exception:
         traceback.print_exc()
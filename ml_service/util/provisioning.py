@@ -0,0 +1,43 @@
+"""Provisions the compute targets, environments and data a pipeline needs
+concurrently.
+
+Creating a compute target can take minutes, and registering an environment
+or uploading input data are separate blocking SDK calls. Each task runs on
+the default thread pool, so a pipeline build script waits once, for the
+slowest of them, instead of for each in turn.
+"""
+import asyncio
+import time
+from typing import Callable, Dict
+
+from ml_service.util.run_monitor import call_blocking
+
+
+async def _timed(name: str, fn: Callable):
+    start = time.monotonic()
+    result = await call_blocking(fn)
+    print("{} ready after {:.0f}s".format(name, time.monotonic() - start))
+    return result
+
+
+def provision(**tasks: Callable) -> Dict[str, object]:
+    """
+    Runs each blocking task concurrently and waits for all of them.
+
+    :param tasks: Functions taking no arguments, by name. Use
+        functools.partial to bind arguments.
+
+    :returns: Result of each task, by name
+
+    :raises: The first exception raised by a task
+    """
+    async def provision_all():
+        results = await asyncio.gather(
+            *(_timed(name, fn) for (name, fn) in tasks.items()))
+        return dict(zip(tasks, results))
+
+    start = time.monotonic()
+    results = asyncio.run(provision_all())
+    print("Provisioned {} in {:.0f}s".format(
+        ", ".join(tasks), time.monotonic() - start))
+    return results
@@ -0,0 +1,118 @@
+"""Replays captured requests against a scoring service.
+
+Requests captured by the scoring service (CAPTURE_DIR, see
+diabetes_regression/util/request_capture.py) are sent again with the same
+bodies and headers, at their original rate, at a multiple of it, or as fast
+as the workers can send them, either to a running service over HTTP or to
+a scoring script loaded in this process. The latency percentiles, error
+rate and throughput of the replay are printed, so a change to the service
+can be checked against production-shaped traffic before it is deployed.
+Only JSON requests are captured, so bulk scoring traffic is not replayed.
+"""
+import argparse
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+from typing import Dict
+
+from diabetes_regression.util.request_capture import read_trace
+from ml_service.util.canary import (
+    SOURCE_DIRECTORY, Router, ScriptBackend, replay, summarize)
+
+
+class HttpBackend:
+    """
+    Scoring service at a URL. Responses with a status below 500 count as
+    successful, client errors are the request's, not the service's, fault.
+    """
+
+    def __init__(self, url: str, timeout: float = 30.0,
+                 api_key: str = None):
+        self.url = url
+        self.timeout = timeout
+        self.api_key = api_key
+
+    def __call__(self, body: str, headers: Dict[str, str]) -> bool:
+        headers = dict(headers)
+        headers.setdefault("Content-Type", "application/json")
+        if self.api_key:
+            headers["Authorization"] = "Bearer " + self.api_key
+        request = urllib.request.Request(
+            self.url, data=body.encode("utf-8"), headers=headers,
+            method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as r:
+                r.read()
+                return True
+        except urllib.error.HTTPError as e:
+            return e.code < 500
+        except (urllib.error.URLError, OSError):
+            return False
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        "replay_requests",
+        description="Replays captured requests against a scoring service")
+    parser.add_argument("trace", type=str,
+                        help="Capture file or directory")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", type=str,
+                        help="Scoring URL, e.g. http://localhost:5001/score")
+    target.add_argument("--script", type=str,
+                        help="Scoring script to load in this process, e.g. "
+                        "scoring/score.py, with models from the local "
+                        "registry (LOCAL_AML_REGISTRY)")
+    parser.add_argument("--model_dir", type=str, default=None,
+                        help="AZUREML_MODEL_DIR of the script, e.g. "
+                        "azureml-models/diabetes_model/1")
+    parser.add_argument("--api_key", type=str, default=None)
+    rate = parser.add_mutually_exclusive_group()
+    rate.add_argument("--speed", type=float, default=1.0,
+                      help="Multiple of the original rate, 1 by default")
+    rate.add_argument("--max_rate", action="store_true",
+                      help="Send the requests as fast as possible")
+    parser.add_argument("--workers", type=int, default=8,
+                        help="Requests in flight, at most")
+    parser.add_argument("--limit", type=int, default=None,
+                        help="Replay only the first requests")
+    parser.add_argument("--output", type=str, default=None,
+                        help="JSON file to write the summary to")
+    args = parser.parse_args()
+
+    trace = read_trace(args.trace)[:args.limit]
+    if not trace:
+        parser.error("No requests captured in {}".format(args.trace))
+    if args.url:
+        backend = HttpBackend(args.url, api_key=args.api_key)
+    else:
+        # Relative to the sources directory, like SCORE_SCRIPT
+        script = args.script if os.path.exists(args.script) \
+            else os.path.join(SOURCE_DIRECTORY, args.script)
+        env = {"AZUREML_MODEL_DIR": args.model_dir} if args.model_dir else {}
+        backend = ScriptBackend("replay", script, env=env)
+
+    speed = 0.0 if args.max_rate else args.speed
+    print("Replaying {} requests captured over {:.1f}s at {}".format(
+        len(trace), trace[-1]["t"] - trace[0]["t"],
+        "maximum rate" if speed == 0 else "{}x speed".format(speed)))
+    start = time.perf_counter()
+    records = replay(trace, Router({"service": 100}), {"service": backend},
+                     speed, args.workers)
+    elapsed = time.perf_counter() - start
+    summary = dict(summarize(records)["service"],
+                   seconds=elapsed, requests_per_second=len(records) / elapsed)
+    print("{} requests in {:.1f}s, {:.1f} requests/s, errors {:.1%}".format(
+        summary["requests"], elapsed, summary["requests_per_second"],
+        summary["error_rate"]))
+    print("Latency p50 {:.1f}ms p95 {:.1f}ms p99 {:.1f}ms".format(
+        summary["p50_ms"], summary["p95_ms"], summary["p99_ms"]))
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Asyncio helpers to submit and monitor AML runs and web services.
+
+The AML SDK and requests calls are blocking, so each call is made on the
+default thread pool while the event loop waits between polls. A single
+driver process can then track many runs or services at once, polling each
+with exponential backoff instead of blocking on them one after another.
+"""
+import asyncio
+import functools
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, Optional, Tuple, Type
+
+TERMINAL_STATUSES = (
+    "Finished", "Completed", "Failed", "Canceled", "NotResponding"
+)
+
+
+@dataclass(frozen=True)
+class Backoff:
+    """Exponential backoff schedule with an optional overall timeout"""
+
+    initial_seconds: float = 5
+    max_seconds: float = 60
+    factor: float = 2
+    timeout_seconds: Optional[float] = None
+
+    def delays(self) -> Iterator[float]:
+        delay = self.initial_seconds
+        while True:
+            yield delay
+            delay = min(delay * self.factor, self.max_seconds)
+
+
+async def call_blocking(fn: Callable, *args, **kwargs):
+    """
+    Runs a blocking function on the default executor.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None, functools.partial(fn, *args, **kwargs))
+
+
+async def retry_with_backoff(
+    fn: Callable,
+    backoff: Backoff = Backoff(),
+    retry_on: Tuple[Type[BaseException], ...] = (Exception,),
+):
+    """
+    Calls fn until it returns without raising one of retry_on, sleeping
+    between attempts according to backoff. The last error is raised once
+    the backoff timeout is exceeded.
+
+    :param fn: Blocking function to call
+    :param backoff: Delay schedule and timeout
+    :param retry_on: Exception types that trigger a retry
+
+    :returns: Result of fn
+    """
+    start = time.monotonic()
+    for delay in backoff.delays():
+        try:
+            return await call_blocking(fn)
+        except retry_on as e:
+            elapsed = time.monotonic() - start
+            if (backoff.timeout_seconds is not None
+                    and elapsed + delay > backoff.timeout_seconds):
+                raise e
+            print(e)
+            print("Retrying in {:.0f}s...".format(delay))
+            await asyncio.sleep(delay)
+
+
+async def wait_for_run(run, backoff: Backoff = Backoff()) -> str:
+    """
+    Polls a run until it reaches a terminal status.
+
+    :param run: AML Run or PipelineRun
+    :param backoff: Delay schedule between polls and timeout
+
+    :returns: Terminal status of the run
+
+    :raises: TimeoutError
+    """
+    start = time.monotonic()
+    last_status = None
+    for delay in backoff.delays():
+        status = await call_blocking(run.get_status)
+        if status != last_status:
+            print("Run {}: {}".format(run.id, status))
+            last_status = status
+        if status in TERMINAL_STATUSES:
+            return status
+        if (backoff.timeout_seconds is not None
+                and time.monotonic() - start > backoff.timeout_seconds):
+            raise TimeoutError(
+                "Run {} did not complete in {}s".format(
+                    run.id, backoff.timeout_seconds))
+        await asyncio.sleep(delay)
+
+
+class RunMonitor:
+    """
+    Tracks several runs concurrently and calls a completion callback for
+    each when it finishes. Callbacks receive (run, status) and may be
+    plain functions, which are run on the executor, or coroutines.
+    """
+
+    def __init__(self, backoff: Backoff = Backoff()):
+        self.backoff = backoff
+        self._tasks: Dict[str, asyncio.Future] = {}
+
+    def track(self, name: str, run, on_complete: Callable = None):
+        self._tasks[name] = asyncio.ensure_future(
+            self._watch(run, on_complete))
+
+    async def submit(
+        self,
+        name: str,
+        experiment,
+        pipeline,
+        on_complete: Callable = None,
+        **submit_args
+    ):
+        """
+        Submits pipeline to experiment without blocking and tracks the run.
+
+        :returns: The submitted run
+        """
+        run = await call_blocking(experiment.submit, pipeline, **submit_args)
+        print("{}: submitted run {}".format(name, run.id))
+        self.track(name, run, on_complete)
+        return run
+
+    async def _watch(self, run, on_complete: Callable) -> str:
+        status = await wait_for_run(run, self.backoff)
+        if on_complete is not None:
+            if asyncio.iscoroutinefunction(on_complete):
+                await on_complete(run, status)
+            else:
+                await call_blocking(on_complete, run, status)
+        return status
+
+    async def wait(self) -> Dict[str, object]:
+        """
+        Waits for every tracked run and its callback.
+
+        :returns: Terminal status, or the exception raised, for each run
+        """
+        names = list(self._tasks)
+        results = await asyncio.gather(
+            *self._tasks.values(), return_exceptions=True)
+        return dict(zip(names, results))
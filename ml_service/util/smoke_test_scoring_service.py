@@ -1,9 +1,7 @@
 import argparse
-import requests
-import time
-from azureml.core import Workspace
-from azureml.core.webservice import AksWebservice, AciWebservice
+import asyncio
 from ml_service.util.env_variables import Env
+from ml_service.util.run_monitor import Backoff, retry_with_backoff
 import secrets
 
 
@@ -13,6 +11,9 @@ output_len = 2
 
 
 def call_web_service(e, service_type, service_name):
+    from azureml.core import Workspace
+    from azureml.core.webservice import AksWebservice, AciWebservice
+
     aml_workspace = Workspace.get(
         name=e.workspace_name,
         subscription_id=e.subscription_id,
@@ -35,25 +36,26 @@ def call_web_service(e, service_type, service_name):
 
 
 def call_web_app(url, headers):
+    # Imported here so that --help works without requests installed, like
+    # the SDK in the other entry points
+    import requests
 
     # Generate an HTTP 'traceparent' distributed tracing header
     # (per the W3C Trace Context proposed specification).
     headers['traceparent'] = "00-{0}-{1}-00".format(
         secrets.token_hex(16), secrets.token_hex(8))
 
-    retries = 600
-    for i in range(retries):
-        try:
-            response = requests.post(
-                url, json=input, headers=headers)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.HTTPError as e:
-            if i == retries - 1:
-                raise e
-            print(e)
-            print("Retrying...")
-            time.sleep(1)
+    def post():
+        response = requests.post(url, json=input, headers=headers)
+        response.raise_for_status()
+        return response.json()
+
+    # The service may still be starting, so retry HTTP errors with
+    # exponential backoff for up to 10 minutes
+    return asyncio.run(retry_with_backoff(
+        post,
+        Backoff(initial_seconds=1, max_seconds=30, timeout_seconds=600),
+        retry_on=(requests.exceptions.HTTPError,)))
 
 
 def main():
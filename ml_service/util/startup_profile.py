@@ -0,0 +1,116 @@
+"""Measures the startup time of the ml_service command line entry points.
+
+Each entry point is started with `python -X importtime -m <module> <args>`
+(by default `--help`) and the import time report on stderr is broken down
+by top-level package, so a slow start can be traced to the package that
+causes it, e.g. azureml. The breakdown is printed and can be written to a
+JSON file for comparison between commits.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+ENTRY_POINTS = [
+    "ml_service.pipelines.diabetes_regression_build_train_pipeline",
+    "ml_service.pipelines.diabetes_regression_build_train_pipeline_with_r",
+    "ml_service.pipelines.diabetes_regression_build_train_pipeline_with_r_on_dbricks",  # NOQA: E501
+    "ml_service.pipelines.diabetes_regression_build_parallel_batchscore_pipeline",  # NOQA: E501
+    "ml_service.pipelines.run_train_pipeline",
+    "ml_service.pipelines.run_parallel_batchscore_pipeline",
+    "ml_service.util.create_scoring_image",
+    "ml_service.util.smoke_test_scoring_service",
+    "ml_service.util.batchscore_tuner",
+]
+
+_IMPORT_TIME = re.compile(
+    r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)\s*$")
+
+
+def parse_importtime(stderr: str) -> Dict[str, object]:
+    """
+    Parses the output of -X importtime.
+
+    :param stderr: stderr of the profiled process
+
+    :returns: Total import time and self time per top-level package, in ms
+    """
+    total_us = 0
+    packages = defaultdict(int)
+    for line in stderr.splitlines():
+        match = _IMPORT_TIME.match(line)
+        if match is None:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        packages[name.split(".")[0]] += int(self_us)
+        if len(indent) == 1:
+            total_us += int(cumulative_us)
+    return {
+        "import_ms": total_us / 1000,
+        "packages_ms": {
+            k: v / 1000 for (k, v) in
+            sorted(packages.items(), key=lambda kv: -kv[1])
+        },
+    }
+
+
+def profile_entry_point(module: str, args: List[str]) -> Dict[str, object]:
+    """
+    Starts an entry point with import time profiling and measures its wall
+    clock time.
+
+    :returns: Wall clock and import time breakdown of the process
+    """
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", module] + args,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        cwd=os.getcwd(),
+    )
+    result = {
+        "module": module,
+        "args": args,
+        "returncode": completed.returncode,
+        "wall_ms": (time.perf_counter() - start) * 1000,
+    }
+    result.update(parse_importtime(completed.stderr))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser("startup_profile")
+    parser.add_argument("--modules", nargs="*", default=ENTRY_POINTS,
+                        help="Entry point modules to profile")
+    parser.add_argument("--args", type=str, default="--help",
+                        help="Arguments passed to every entry point")
+    parser.add_argument("--top", type=int, default=5,
+                        help="Packages listed per entry point")
+    parser.add_argument("--output", type=str, default=None,
+                        help="JSON file to write the results to")
+    args = parser.parse_args()
+
+    results = []
+    for module in args.modules:
+        result = profile_entry_point(module, args.args.split())
+        results.append(result)
+        top = ", ".join(
+            "{} {:.0f}ms".format(k, v) for (k, v) in
+            list(result["packages_ms"].items())[:args.top])
+        print("{:>8.0f}ms wall {:>8.0f}ms imports  exit {}  {}\n    {}".format(
+            result["wall_ms"], result["import_ms"], result["returncode"],
+            module, top))
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump({"entry_points": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
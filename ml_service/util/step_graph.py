@@ -0,0 +1,190 @@
+"""Dependency graph of pipeline steps: ordering, scheduling and critical
+path.
+
+A graph is a dict of step name to the names of the steps it waits for. The
+critical path is the chain of steps that determines the wall clock time of
+a pipeline run; shortening any other step does not make the run finish
+sooner. A step waits either for the steps it depends on or, when more
+steps are ready than there are workers, for a step to free a worker, so
+both are followed when the critical path is traced back.
+"""
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Tuple
+
+Graph = Dict[str, List[str]]
+
+
+def topological_order(dependencies: Graph) -> List[str]:
+    """
+    Orders the steps so every step comes after the steps it depends on.
+
+    :raises: ValueError if steps depend on each other in a cycle
+    """
+    order = []
+    state = {}
+
+    def visit(name, path):
+        if state.get(name) == "done":
+            return
+        if state.get(name) == "visiting":
+            raise ValueError("Steps depend on each other: {}".format(
+                " -> ".join(path + [name])))
+        state[name] = "visiting"
+        for dep in dependencies[name]:
+            visit(dep, path + [name])
+        state[name] = "done"
+        order.append(name)
+
+    for name in dependencies:
+        visit(name, [])
+    return order
+
+
+def upward_ranks(
+    dependencies: Graph, durations: Dict[str, float]
+) -> Dict[str, float]:
+    """
+    Returns, for every step, the length of the longest chain of steps from
+    its start to the end of the pipeline. Starting the ready step with the
+    highest rank first keeps the critical path moving when there are more
+    ready steps than workers.
+
+    :param durations: Expected duration of each step, 1 if unknown
+    """
+    dependents = {name: [] for name in dependencies}
+    for (name, deps) in dependencies.items():
+        for dep in deps:
+            dependents[dep].append(name)
+    ranks = {}
+    for name in reversed(topological_order(dependencies)):
+        ranks[name] = durations.get(name, 1.0) + max(
+            (ranks[d] for d in dependents[name]), default=0.0)
+    return ranks
+
+
+def schedule(
+    dependencies: Graph,
+    run_step: Callable[[str], Tuple[str, float, float]],
+    max_workers: int,
+    ranks: Dict[str, float] = None,
+    canceled: Callable[[], bool] = lambda: False,
+) -> Tuple[Dict[str, str], Dict[str, Tuple[float, float]],
+           Dict[str, str]]:
+    """
+    Runs every step on at most max_workers threads, once the steps it
+    depends on have completed. Steps depending on a step that did not
+    complete are skipped, and no step is started once canceled() returns
+    true. Ready steps start in order of rank, highest first.
+
+    :param run_step: Runs a step by name and returns its status, start and
+        end time; the step completed if the status is "Completed"
+    :param ranks: Priority of each step, e.g. upward_ranks()
+
+    :returns: Status of each step, start and end time of each step that
+        ran, and for each step that started on a worker freed by another
+        step, the name of that step
+    """
+    ranks = ranks or {}
+    statuses = {}
+    times = {}
+    worker_from = {}
+    # Workers in the order they were freed, by the step that freed them
+    free: List[Optional[str]] = [None] * max_workers
+    pending = set(dependencies)
+    running = {}
+    with ThreadPoolExecutor(max_workers) as pool:
+        while pending or running:
+            is_canceled = canceled()
+            for name in sorted(pending, key=lambda n: (-ranks.get(n, 0), n)):
+                deps = [statuses.get(d) for d in dependencies[name]]
+                if is_canceled:
+                    statuses[name] = "Canceled"
+                elif any(s not in (None, "Completed") for s in deps):
+                    statuses[name] = "Skipped"
+                elif all(s == "Completed" for s in deps) and free:
+                    # The worker freed first, the one the step waited for
+                    # least
+                    previous = free.pop(0)
+                    if previous is not None:
+                        worker_from[name] = previous
+                    running[pool.submit(run_step, name)] = name
+                else:
+                    continue
+                pending.discard(name)
+                if name in statuses:
+                    print("{} {}".format(name, statuses[name].lower()))
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            finished = [(running.pop(f),) + f.result() for f in done]
+            for (name, status, start, end) in sorted(
+                    finished, key=lambda f: f[3]):
+                statuses[name] = status
+                times[name] = (start, end)
+                free.append(name)
+    return (statuses, times, worker_from)
+
+
+def critical_path(
+    dependencies: Graph,
+    times: Dict[str, Tuple[float, float]],
+    worker_from: Dict[str, str] = None,
+) -> List[str]:
+    """
+    Returns the critical path of a completed pipeline run: starting from
+    the step that finished last, each step is preceded by the step it
+    waited for, the one that finished last of its dependencies and the
+    step that freed its worker.
+
+    :param times: Start and end time of each step that ran
+    :param worker_from: Step that freed the worker of each step that
+        started on one, see schedule()
+    """
+    if not times:
+        return []
+    worker_from = worker_from or {}
+    name = max(times, key=lambda n: times[n][1])
+    path = [name]
+    while True:
+        # Dependencies first, so they win ties with the worker
+        waited_for = [d for d in dependencies[name] if d in times]
+        if worker_from.get(name) in times:
+            waited_for.append(worker_from[name])
+        if not waited_for:
+            break
+        name = max(waited_for, key=lambda d: times[d][1])
+        path.append(name)
+    return list(reversed(path))
+
+
+def format_critical_path(
+    dependencies: Graph,
+    times: Dict[str, Tuple[float, float]],
+    worker_from: Dict[str, str] = None,
+) -> str:
+    """
+    Describes the critical path of a run, with the time each step on it
+    ran and waited, and how much the steps overlapped. Steps that waited
+    for a worker rather than for their dependencies are marked.
+    """
+    path = critical_path(dependencies, times, worker_from)
+    if not path:
+        return "No steps ran"
+    start = min(s for (s, _) in times.values())
+    wall = max(e for (_, e) in times.values()) - start
+    busy = sum(e - s for (s, e) in times.values())
+    parallelism = busy / wall if wall else 1.0
+    lines = ["Critical path, {:.1f}s wall clock, {:.1f}s of steps "
+             "({:.1f}x parallelism):".format(wall, busy, parallelism)]
+    ready = start
+    previous = None
+    for name in path:
+        (step_start, step_end) = times[name]
+        line = "  {:<24} {:>7.1f}s  waited {:.1f}s".format(
+            name, step_end - step_start, step_start - ready)
+        if previous is not None and previous not in dependencies[name]:
+            line += " for the worker of {}".format(previous)
+        lines.append(line)
+        ready = step_end
+        previous = name
+    return "\n".join(lines)
@@ -0,0 +1,68 @@
+import pytest
+from ml_service.util.batchscore_tuner import (
+    BatchScoringPlan, ScoringProfile, plan_batch_scoring, simulate_plan)
+
+# 1ms per row, 100ms per mini-batch, 1KB of memory and 100B of input per row
+PROFILE = ScoringProfile(
+    seconds_per_row=0.001,
+    seconds_per_batch=0.1,
+    memory_bytes_per_row=1000.0,
+    input_bytes_per_row=100.0,
+)
+
+
+def test_plan_uses_enough_workers_for_the_target():
+    # 100s of scoring in 30s needs 4 workers, 4 mini-batches each
+    plan = plan_batch_scoring(PROFILE, 100000, 30, max_nodes=4,
+                              cores_per_node=2, memory_bytes_per_node=1e9)
+
+    assert (plan.process_count_per_node, plan.node_count) == (2, 2)
+    assert plan.mini_batch_rows == 6250
+    assert plan.mini_batch_size == "611KB"
+    assert plan.estimated_seconds == pytest.approx(25.4)
+
+
+def test_plan_fits_mini_batches_in_memory():
+    # Half of 8MB shared by 2 processes leaves room for 2000 rows
+    plan = plan_batch_scoring(PROFILE, 100000, 30, max_nodes=4,
+                              cores_per_node=2, memory_bytes_per_node=8e6)
+
+    assert plan.mini_batch_rows == 2000
+    assert plan.estimated_seconds == pytest.approx(27.3)
+
+
+def test_plan_is_capped_by_the_cluster():
+    plan = plan_batch_scoring(PROFILE, 1000000, 30, max_nodes=4,
+                              cores_per_node=2, memory_bytes_per_node=1e9)
+    result = simulate_plan(plan, PROFILE, 1000000, 30)
+
+    assert (plan.process_count_per_node, plan.node_count) == (2, 4)
+    assert result.wall_clock_seconds == pytest.approx(plan.estimated_seconds)
+    assert not result.meets_target
+
+
+def test_simulated_plan_matches_the_estimate():
+    plan = plan_batch_scoring(PROFILE, 100000, 30, max_nodes=4,
+                              cores_per_node=2, memory_bytes_per_node=1e9)
+
+    result = simulate_plan(plan, PROFILE, 100000, 30)
+
+    assert result.mini_batches == 16
+    assert result.max_batch_seconds == pytest.approx(6.35)
+    assert result.wall_clock_seconds == pytest.approx(25.4)
+    assert result.peak_batch_memory_bytes == 6250 * 1000.0
+    assert result.meets_target
+
+
+def test_simulation_gives_batches_to_the_first_free_worker():
+    plan = BatchScoringPlan(
+        mini_batch_rows=300, mini_batch_size="30KB",
+        process_count_per_node=2, node_count=1, estimated_seconds=0.0)
+
+    # Batches of 300, 300, 300 and 100 rows after 0.5s of node startup
+    result = simulate_plan(plan, PROFILE, 1000, 1.0, node_startup_seconds=0.5)
+
+    assert result.mini_batches == 4
+    assert result.max_batch_seconds == pytest.approx(0.4)
+    assert result.wall_clock_seconds == pytest.approx(1.3)
+    assert not result.meets_target
@@ -0,0 +1,41 @@
+from ml_service.util.benchmark import choose_baseline, find_regressions
+
+BASELINE = {
+    "train_model[10000]": {"rows_per_second": 1000.0, "p95_ms": 10.0},
+    "score.run[1]": {"rows_per_second": 500.0, "p95_ms": 2.0},
+}
+
+
+def test_changes_within_the_threshold_are_not_regressions():
+    current = {
+        "train_model[10000]": {"rows_per_second": 900.0, "p95_ms": 11.0},
+        "score.run[1]": {"rows_per_second": 600.0, "p95_ms": 1.0},
+    }
+
+    assert find_regressions(current, BASELINE, 0.15) == []
+
+
+def test_throughput_drops_and_latency_rises_are_regressions():
+    current = {
+        "train_model[10000]": {"rows_per_second": 800.0, "p95_ms": 10.0},
+        "score.run[1]": {"rows_per_second": 500.0, "p95_ms": 2.5},
+        # Not in the baseline
+        "split_data[10000]": {"rows_per_second": 1.0, "p95_ms": 1000.0},
+    }
+
+    regressions = find_regressions(current, BASELINE, 0.15)
+
+    assert len(regressions) == 2
+    assert regressions[0].startswith(
+        "train_model[10000]: throughput 800 rows/s, 80% of 1000")
+    assert regressions[1].startswith("score.run[1]: p95 latency 2.500ms")
+
+
+def test_choose_baseline_prefers_the_parent_commit():
+    runs = {"a": {}, "b": {}, "c": {}}
+
+    assert choose_baseline(runs, "c", "a") == "a"
+    # The parent was not benchmarked
+    assert choose_baseline(runs, "c", "d") == "b"
+    assert choose_baseline(runs, "d", None) == "c"
+    assert choose_baseline({"c": {}}, "c", "b") is None
@@ -0,0 +1,83 @@
+from collections import Counter
+
+import pytest
+from ml_service.util.canary import (
+    CanaryController, Router, run_canary, synthetic_trace)
+
+STABLE = {"requests": 100, "error_rate": 0.0, "p50_ms": 8.0,
+          "p95_ms": 10.0, "p99_ms": 12.0}
+
+
+def window(requests=50, error_rate=0.0, p95_ms=10.0):
+    return {"requests": requests, "error_rate": error_rate,
+            "p50_ms": p95_ms * 0.8, "p95_ms": p95_ms, "p99_ms": p95_ms * 1.2}
+
+
+def test_router_routes_by_header_whatever_its_case():
+    router = Router({"blue": 0, "green": 100})
+
+    assert router.route({"X-API-Version": "blue"}) == "blue"
+    assert router.route({"x-api-version": "green"}) == "green"
+    # Unknown versions are routed by weight
+    assert router.route({"x-api-version": "red"}) == "green"
+
+
+def test_router_splits_by_weight_the_same_way_for_a_seed():
+    def routes(seed):
+        router = Router({"blue": 10, "green": 90}, seed=seed)
+        return [router.route({}) for _ in range(2000)]
+
+    assert routes(3) == routes(3)
+    assert routes(3) != routes(4)
+    assert Counter(routes(3))["blue"] == pytest.approx(200, abs=50)
+
+
+def test_violations():
+    controller = CanaryController(latency_slo_ms=50.0)
+
+    assert controller.violations(window(), STABLE) == []
+    assert controller.violations(window(p95_ms=60.0)) == [
+        "p95_ms 60.0ms above the 50.0ms SLO"]
+    assert controller.violations(window(error_rate=0.05)) == [
+        "error rate 5.0% above 1.0%"]
+    # Within the 5ms margin over stable, though 40% slower
+    assert controller.violations(window(p95_ms=14.0), STABLE) == []
+    assert controller.violations(window(p95_ms=16.0), STABLE) == [
+        "p95_ms 16.0ms above the 15.0ms allowed by stable 10.0ms"]
+    # Too few stable requests to compare with
+    assert controller.violations(
+        window(p95_ms=16.0), dict(STABLE, requests=5)) == []
+
+
+def test_decide_promotes_holds_and_rolls_back():
+    controller = CanaryController(latency_slo_ms=50.0, min_requests=20)
+
+    assert controller.decide(10, window(), STABLE) == ("promote", 25, [])
+    assert controller.decide(50, window(), STABLE) == ("promote", 100, [])
+    assert controller.decide(10, window(requests=19), STABLE) == (
+        "hold", 10, ["19 canary requests, 20 needed"])
+    assert controller.decide(10, None, STABLE)[:2] == ("hold", 10)
+    (decision, weight, reasons) = controller.decide(
+        25, window(error_rate=0.5), STABLE)
+    assert (decision, weight) == ("rollback", 0)
+    assert reasons == ["error rate 50.0% above 1.0%"]
+
+
+def test_run_canary_keeps_the_requests_of_held_windows():
+    backends = {"blue": lambda body, headers: True,
+                "green": lambda body, headers: True}
+    trace = synthetic_trace(400, rate=1000.0)
+    controller = CanaryController(latency_slo_ms=1000.0, min_requests=20)
+
+    result = run_canary(trace, backends, controller, "blue", "green",
+                        window=50, speed=0, workers=2)
+
+    # About 5 canary requests per window at weight 10
+    first = result["windows"][0]
+    assert first["decision"] == "hold"
+    assert result["windows"][1]["summary"]["blue"]["requests"] > \
+        first["summary"]["blue"]["requests"]
+    promoted = next(w for w in result["windows"] if w["decision"] != "hold")
+    assert promoted["decision"] == "promote"
+    assert promoted["weight"] == 10
+    assert promoted["summary"]["blue"]["requests"] >= 20
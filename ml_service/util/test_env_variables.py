@@ -0,0 +1,174 @@
+import pytest
+from ml_service.util.env_variables import Env
+
+# Key and default of every setting Env had before it was typed
+ORIGINAL_SETTINGS = {
+    "workspace_name": ("WORKSPACE_NAME", None),
+    "resource_group": ("RESOURCE_GROUP", None),
+    "subscription_id": ("SUBSCRIPTION_ID", None),
+    "tenant_id": ("TENANT_ID", None),
+    "app_id": ("SP_APP_ID", None),
+    "app_secret": ("SP_APP_SECRET", None),
+    "vm_size": ("AML_COMPUTE_CLUSTER_CPU_SKU", None),
+    "compute_name": ("AML_COMPUTE_CLUSTER_NAME", None),
+    "vm_priority": ("AML_CLUSTER_PRIORITY", "lowpriority"),
+    "min_nodes": ("AML_CLUSTER_MIN_NODES", 0),
+    "max_nodes": ("AML_CLUSTER_MAX_NODES", 4),
+    "build_id": ("BUILD_BUILDID", None),
+    "pipeline_name": ("TRAINING_PIPELINE_NAME", None),
+    "sources_directory_train": ("SOURCES_DIR_TRAIN", None),
+    "train_script_path": ("TRAIN_SCRIPT_PATH", None),
+    "evaluate_script_path": ("EVALUATE_SCRIPT_PATH", None),
+    "register_script_path": ("REGISTER_SCRIPT_PATH", None),
+    "model_name": ("MODEL_NAME", None),
+    "experiment_name": ("EXPERIMENT_NAME", None),
+    "model_version": ("MODEL_VERSION", None),
+    "image_name": ("IMAGE_NAME", None),
+    "db_cluster_id": ("DB_CLUSTER_ID", None),
+    "score_script": ("SCORE_SCRIPT", None),
+    "build_uri": ("BUILD_URI", None),
+    "dataset_name": ("DATASET_NAME", None),
+    "datastore_name": ("DATASTORE_NAME", None),
+    "dataset_version": ("DATASET_VERSION", None),
+    "run_evaluation": ("RUN_EVALUATION", "true"),
+    "allow_run_cancel": ("ALLOW_RUN_CANCEL", "true"),
+    "aml_env_name": ("AML_ENV_NAME", None),
+    "aml_env_train_conda_dep_file": (
+        "AML_ENV_TRAIN_CONDA_DEP_FILE", "conda_dependencies.yml"),
+    "rebuild_env": ("AML_REBUILD_ENVIRONMENT", False),
+    "use_gpu_for_scoring": ("USE_GPU_FOR_SCORING", False),
+    "aml_env_score_conda_dep_file": (
+        "AML_ENV_SCORE_CONDA_DEP_FILE", "conda_dependencies_scoring.yml"),
+    "aml_env_scorecopy_conda_dep_file": (
+        "AML_ENV_SCORECOPY_CONDA_DEP_FILE",
+        "conda_dependencies_scorecopy.yml"),
+    "vm_size_scoring": ("AML_COMPUTE_CLUSTER_CPU_SKU_SCORING", None),
+    "compute_name_scoring": ("AML_COMPUTE_CLUSTER_NAME_SCORING", None),
+    "vm_priority_scoring": ("AML_CLUSTER_PRIORITY_SCORING", "lowpriority"),
+    "min_nodes_scoring": ("AML_CLUSTER_MIN_NODES_SCORING", 0),
+    "max_nodes_scoring": ("AML_CLUSTER_MAX_NODES_SCORING", 4),
+    "rebuild_env_scoring": ("AML_REBUILD_ENVIRONMENT_SCORING", False),
+    "scoring_datastore_storage_name": (
+        "SCORING_DATASTORE_STORAGE_NAME", None),
+    "scoring_datastore_access_key": ("SCORING_DATASTORE_ACCESS_KEY", None),
+    "scoring_datastore_input_container": (
+        "SCORING_DATASTORE_INPUT_CONTAINER", None),
+    "scoring_datastore_input_filename": (
+        "SCORING_DATASTORE_INPUT_FILENAME", None),
+    "scoring_datastore_output_container": (
+        "SCORING_DATASTORE_OUTPUT_CONTAINER", None),
+    "scoring_datastore_output_filename": (
+        "SCORING_DATASTORE_OUTPUT_FILENAME", None),
+    "scoring_dataset_name": ("SCORING_DATASET_NAME", None),
+    "scoring_pipeline_name": ("SCORING_PIPELINE_NAME", None),
+    "aml_env_name_scoring": ("AML_ENV_NAME_SCORING", None),
+    "aml_env_name_score_copy": ("AML_ENV_NAME_SCORE_COPY", None),
+    "batchscore_script_path": ("BATCHSCORE_SCRIPT_PATH", None),
+    "batchscore_copy_script_path": ("BATCHSCORE_COPY_SCRIPT_PATH", None),
+}
+
+
+def test_defaults_match_the_original_settings():
+    env = Env(environ={})
+    settings = Env.settings()
+
+    for (name, (key, default)) in ORIGINAL_SETTINGS.items():
+        assert settings[name].key == key
+        assert getattr(env, name) == default, name
+
+
+def test_values_are_parsed_by_type():
+    env = Env(environ={
+        "AML_CLUSTER_MAX_NODES": "8",
+        "AML_REBUILD_ENVIRONMENT": " True ",
+        "USE_GPU_FOR_SCORING": "no",
+        "SCORING_PREDICTION_CACHE_TTL_SECONDS": "2.5",
+        "SCORING_OUTPUT_LAYOUT": "Sharded",
+        "MODEL_NAME": "diabetes_model",
+    })
+
+    assert env.max_nodes == 8
+    assert env.rebuild_env is True
+    assert env.use_gpu_for_scoring is False
+    assert env.scoring_prediction_cache_ttl_seconds == 2.5
+    assert env.scoring_output_layout == "sharded"
+    assert env.model_name == "diabetes_model"
+
+
+def test_invalid_values_name_the_variable():
+    env = Env(environ={
+        "SCORING_OUTPUT_FORMAT": "xml", "AML_CLUSTER_MIN_NODES": "two"})
+
+    with pytest.raises(ValueError, match="SCORING_OUTPUT_FORMAT='xml'"):
+        env.scoring_output_format
+    with pytest.raises(ValueError, match="AML_CLUSTER_MIN_NODES='two'"):
+        env.min_nodes
+
+
+def test_profile_overrides():
+    environ = {
+        "AML_COMPUTE_CLUSTER_NAME": "train-cluster",
+        "AML_COMPUTE_CLUSTER_NAME__SCORING": "score-cluster",
+    }
+
+    assert Env(environ=environ).compute_name == "train-cluster"
+    assert Env("train", environ).compute_name == "train-cluster"
+    assert Env("scoring", environ).compute_name == "score-cluster"
+    assert Env(environ=dict(
+        environ, ENV_PROFILE="SCORING")).compute_name == "score-cluster"
+    with pytest.raises(ValueError, match="Unknown profile"):
+        Env("production", environ)
+
+
+def test_validate_reports_every_error_at_once():
+    env = Env("scoring", {
+        "WORKSPACE_NAME": "ws",
+        "RESOURCE_GROUP": "rg",
+        "SUBSCRIPTION_ID": "sub",
+        "AML_COMPUTE_CLUSTER_NAME_SCORING": "score-cluster",
+        "AML_COMPUTE_CLUSTER_CPU_SKU_SCORING": "",
+        "SOURCES_DIR_TRAIN": "src",
+        "BATCHSCORE_SCRIPT_PATH": "scoring/parallel_batchscore.py",
+        "SCORING_OUTPUT_FORMAT": "xml",
+    })
+
+    with pytest.raises(ValueError) as e:
+        env.validate()
+
+    errors = str(e.value).splitlines()
+    assert errors[0] == "Invalid configuration:"
+    assert sorted(line.strip() for line in errors[1:]) == [
+        "AML_COMPUTE_CLUSTER_CPU_SKU_SCORING is required for the scoring "
+        "profile",
+        "MODEL_NAME is required for the scoring profile",
+        "SCORING_OUTPUT_FORMAT='xml': expected one of txt, csv, jsonl, "
+        "parquet",
+    ]
+
+
+def test_validate_returns_every_value():
+    env = Env("local", {
+        "MODEL_NAME": "diabetes_model",
+        "DATASET_NAME": "diabetes_ds",
+        "SOURCES_DIR_TRAIN": "src",
+        "TRAIN_SCRIPT_PATH": "training/train_aml.py",
+        "EVALUATE_SCRIPT_PATH": "evaluate/evaluate_model.py",
+        "REGISTER_SCRIPT_PATH": "register/register_model.py",
+    })
+
+    values = env.validate()
+
+    assert set(values) == set(Env.settings())
+    assert values["model_name"] == "diabetes_model"
+    # The local profile does not require the train compute
+    with pytest.raises(ValueError, match="AML_COMPUTE_CLUSTER_NAME is"):
+        env.validate("train")
+
+
+def test_validate_checks_only_the_required_settings_given():
+    env = Env("train", {"TRAINING_PIPELINE_NAME": "training-pipeline"})
+
+    assert env.validate(required=["pipeline_name"])["pipeline_name"] \
+        == "training-pipeline"
+    with pytest.raises(ValueError, match="  BUILD_BUILDID is required\n"):
+        env.validate(required=["build_id", "pipeline_name", "model_name"])
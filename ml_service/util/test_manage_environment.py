@@ -0,0 +1,60 @@
+import os
+import threading
+
+from ml_service.util.manage_environment import (
+    get_environment_hash, read_environment_index, update_environment_index)
+
+CONDA_FILE = """name: scoring
+dependencies:
+  - python=3.7.*
+  - pip:
+      - scikit-learn==0.22.1
+      - git+https://github.com/org/repo.git#egg=repo
+"""
+
+
+def hash_of(tmp_path, content, base_image=None):
+    path = tmp_path / "conda_dependencies.yml"
+    path.write_text(content)
+    return get_environment_hash(str(path), base_image)
+
+
+def test_environment_hash_ignores_comments_and_whitespace(tmp_path):
+    reformatted = ("# Scoring environment\n\n" + CONDA_FILE.replace(
+        "  - python=3.7.*", "  - python=3.7.*   # pinned  "))
+
+    assert hash_of(tmp_path, reformatted) == hash_of(tmp_path, CONDA_FILE)
+
+
+def test_environment_hash_tracks_content_and_base_image(tmp_path):
+    original = hash_of(tmp_path, CONDA_FILE)
+
+    assert hash_of(tmp_path, CONDA_FILE.replace("0.22.1", "0.23.1")) \
+        != original
+    assert hash_of(tmp_path, CONDA_FILE, "mcr.microsoft.com/base") \
+        != original
+
+
+def test_environment_hash_keeps_egg_fragments(tmp_path):
+    renamed = CONDA_FILE.replace("#egg=repo", "#egg=other")
+
+    assert hash_of(tmp_path, renamed) != hash_of(tmp_path, CONDA_FILE)
+
+
+def test_concurrent_index_updates_keep_every_entry(tmp_path):
+    index_path = str(tmp_path / "index" / "environments.json")
+
+    def provision(worker):
+        for i in range(50):
+            update_environment_index(
+                index_path, "ws:{}-{}".format(worker, i), {"version": i})
+
+    threads = [threading.Thread(target=provision, args=(w,))
+               for w in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(read_environment_index(index_path)) == 200
+    assert os.listdir(os.path.dirname(index_path)) == ["environments.json"]
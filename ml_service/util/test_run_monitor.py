@@ -0,0 +1,135 @@
+import asyncio
+import itertools
+
+import pytest
+from ml_service.util import run_monitor
+from ml_service.util.run_monitor import (
+    Backoff, RunMonitor, retry_with_backoff, wait_for_run)
+
+
+class FakeClock:
+    """monotonic() and asyncio.sleep() that advance a clock instantly"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+        self._sleep = asyncio.sleep
+
+    def monotonic(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+        await self._sleep(0)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(run_monitor.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(run_monitor.asyncio, "sleep", clock.sleep)
+    return clock
+
+
+class FakeRun:
+    def __init__(self, run_id, statuses):
+        self.id = run_id
+        self._statuses = iter(statuses)
+
+    def get_status(self):
+        status = next(self._statuses)
+        if isinstance(status, Exception):
+            raise status
+        return status
+
+
+def test_backoff_delays_are_capped():
+    delays = Backoff(initial_seconds=1, max_seconds=3, factor=2).delays()
+
+    assert list(itertools.islice(delays, 5)) == [1, 2, 3, 3, 3]
+
+
+def test_retry_with_backoff_retries_until_success(clock):
+    attempts = []
+
+    def flaky():
+        attempts.append(clock.now)
+        if len(attempts) < 3:
+            raise ConnectionError("busy")
+        return "ok"
+
+    result = asyncio.run(retry_with_backoff(
+        flaky, Backoff(initial_seconds=1, max_seconds=10)))
+
+    assert result == "ok"
+    assert len(attempts) == 3
+    assert clock.sleeps == [1, 2]
+
+
+def test_retry_with_backoff_gives_up_at_the_timeout(clock):
+    attempts = []
+
+    def failing():
+        attempts.append(clock.now)
+        raise ConnectionError("down")
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(retry_with_backoff(failing, Backoff(
+            initial_seconds=1, max_seconds=4, timeout_seconds=10)))
+
+    # A fourth delay of 4s would end after 11s
+    assert attempts == [0, 1, 3, 7]
+    assert clock.sleeps == [1, 2, 4]
+
+
+def test_retry_with_backoff_raises_other_errors(clock):
+    def failing():
+        raise KeyError("missing")
+
+    with pytest.raises(KeyError):
+        asyncio.run(retry_with_backoff(
+            failing, retry_on=(ConnectionError,)))
+    assert clock.sleeps == []
+
+
+def test_wait_for_run_returns_terminal_status(clock):
+    run = FakeRun("r1", ["Queued", "Running", "Running", "Failed"])
+
+    status = asyncio.run(wait_for_run(run, Backoff(initial_seconds=1)))
+
+    assert status == "Failed"
+    assert clock.sleeps == [1, 2, 4]
+
+
+def test_wait_for_run_times_out(clock):
+    run = FakeRun("r1", itertools.repeat("Running"))
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(wait_for_run(run, Backoff(
+            initial_seconds=1, max_seconds=1, timeout_seconds=5)))
+    # Polled every second until more than 5s have passed
+    assert clock.now == 6
+
+
+def test_run_monitor_waits_for_every_run(clock):
+    completed = []
+
+    async def on_complete_async(run, status):
+        completed.append((run.id, status))
+
+    async def monitor():
+        monitor = RunMonitor(Backoff(initial_seconds=1))
+        monitor.track("train", FakeRun("r1", ["Running", "Completed"]),
+                      lambda run, status: completed.append((run.id, status)))
+        monitor.track("score", FakeRun("r2", ["Running", "Canceled"]),
+                      on_complete_async)
+        monitor.track("broken", FakeRun("r3", [RuntimeError("lost")]))
+        return await monitor.wait()
+
+    results = asyncio.run(monitor())
+
+    assert results["train"] == "Completed"
+    assert results["score"] == "Canceled"
+    assert isinstance(results["broken"], RuntimeError)
+    assert sorted(completed) == [("r1", "Completed"), ("r2", "Canceled")]
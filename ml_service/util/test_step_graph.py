@@ -0,0 +1,131 @@
+import threading
+import time
+
+import pytest
+from ml_service.util.step_graph import (
+    critical_path, format_critical_path, schedule, topological_order,
+    upward_ranks)
+
+TRAIN_PIPELINE = {
+    "Train": [],
+    "Validate Data": [],
+    "Evaluate": ["Train"],
+    "Register": ["Evaluate", "Validate Data"],
+}
+DURATIONS = {"Train": 1.9, "Validate Data": 0.6, "Evaluate": 0.1,
+             "Register": 0.1}
+
+
+class SerialSteps:
+    """Steps taking DURATIONS on a clock that only one step can advance"""
+
+    def __init__(self, failing=()):
+        self.now = 0.0
+        self.order = []
+        self.failing = failing
+
+    def __call__(self, name):
+        start = self.now
+        self.now += DURATIONS[name]
+        self.order.append(name)
+        status = "Failed" if name in self.failing else "Completed"
+        return (status, start, self.now)
+
+
+def test_topological_order_and_cycles():
+    order = topological_order(TRAIN_PIPELINE)
+
+    assert order.index("Train") < order.index("Evaluate") \
+        < order.index("Register")
+    assert order.index("Validate Data") < order.index("Register")
+    with pytest.raises(ValueError, match="a -> b -> a"):
+        topological_order({"a": ["b"], "b": ["a"]})
+
+
+def test_upward_ranks_are_the_longest_chain_after_a_step():
+    ranks = upward_ranks(TRAIN_PIPELINE, DURATIONS)
+
+    assert ranks["Register"] == pytest.approx(0.1)
+    assert ranks["Train"] == pytest.approx(2.1)
+    assert ranks["Validate Data"] == pytest.approx(0.7)
+
+
+def test_schedule_starts_the_highest_rank_first():
+    steps = SerialSteps()
+
+    (statuses, times, _) = schedule(
+        TRAIN_PIPELINE, steps, 1, upward_ranks(TRAIN_PIPELINE, DURATIONS))
+
+    assert steps.order == ["Train", "Validate Data", "Evaluate", "Register"]
+    assert set(statuses.values()) == {"Completed"}
+    assert times["Register"] == pytest.approx((2.6, 2.7))
+
+
+def test_schedule_skips_the_dependents_of_failed_steps():
+    steps = SerialSteps(failing=("Train",))
+
+    (statuses, times, _) = schedule(TRAIN_PIPELINE, steps, 2)
+
+    assert statuses == {"Train": "Failed", "Validate Data": "Completed",
+                        "Evaluate": "Skipped", "Register": "Skipped"}
+    assert set(times) == {"Train", "Validate Data"}
+
+
+def test_schedule_starts_nothing_once_canceled():
+    steps = SerialSteps()
+
+    (statuses, _, _) = schedule(
+        TRAIN_PIPELINE, steps, 1, canceled=lambda: len(steps.order) > 0)
+
+    assert steps.order == ["Train"]
+    assert statuses["Train"] == "Completed"
+    assert {statuses[n] for n in ("Validate Data", "Evaluate", "Register")} \
+        == {"Canceled"}
+
+
+def test_schedule_runs_at_most_max_workers_steps():
+    lock = threading.Lock()
+    running = []
+    most = []
+
+    def run_step(name):
+        start = time.monotonic()
+        with lock:
+            running.append(name)
+            most.append(len(running))
+        time.sleep(0.01)
+        with lock:
+            running.remove(name)
+        return ("Completed", start, time.monotonic())
+
+    (statuses, _, worker_from) = schedule(
+        {str(i): [] for i in range(6)}, run_step, 2)
+
+    assert len(statuses) == 6
+    assert max(most) == 2
+    # Four steps waited for one of the first two to free a worker
+    assert len(worker_from) == 4
+
+
+def test_critical_path_follows_the_dependency_that_finished_last():
+    times = {"Train": (0.0, 1.9), "Validate Data": (0.0, 0.6),
+             "Evaluate": (1.9, 2.0), "Register": (2.0, 2.1)}
+
+    assert critical_path(TRAIN_PIPELINE, times) == [
+        "Train", "Evaluate", "Register"]
+
+
+def test_critical_path_follows_the_step_that_freed_the_worker():
+    # On one worker, Validate Data waited for Evaluate to finish, not for
+    # any dependency
+    steps = SerialSteps()
+    (_, times, worker_from) = schedule(TRAIN_PIPELINE, steps, 1)
+    assert steps.order == ["Train", "Evaluate", "Validate Data", "Register"]
+
+    assert critical_path(TRAIN_PIPELINE, times) == [
+        "Validate Data", "Register"]
+    assert critical_path(TRAIN_PIPELINE, times, worker_from) == [
+        "Train", "Evaluate", "Validate Data", "Register"]
+    report = format_critical_path(TRAIN_PIPELINE, times, worker_from)
+    assert "Validate Data" in report
+    assert "waited 0.0s for the worker of Evaluate" in report